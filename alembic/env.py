@@ -1,6 +1,7 @@
 """Alembic's env.py file."""
 
 import os
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config, pool
@@ -30,6 +31,23 @@ target_metadata = Base.metadata
 
 config.set_main_option("sqlalchemy.url", os.environ["DB_URL"])
 
+# Objects made by migrations, or by the database, that are not in the models,
+# so autogenerate should not drop them:
+# - the monthly and default partitions of api_request, see write/partitions.py
+# - the site name trigram index, which is only made if pg_trgm is available
+API_REQUEST_PARTITION = re.compile(r"^api_request_(y\d{4}m\d{2}|default)$")
+UNMODELLED_INDEXES = {"ix_locations_client_location_name_trgm"}
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Leave out the objects that are in the database but deliberately not in the models."""
+    if type_ == "table" and reflected and API_REQUEST_PARTITION.match(name):
+        return False
+    if type_ == "index" and reflected and compare_to is None:
+        if name in UNMODELLED_INDEXES or API_REQUEST_PARTITION.match(object.table.name):
+            return False
+    return True
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -49,6 +67,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         compare_server_default=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -71,7 +90,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, compare_server_default=True
+            connection=connection,
+            target_metadata=target_metadata,
+            compare_server_default=True,
+            include_object=include_object,
         )
         # compare_server_default=True is used to compare the
         # server default values in the database with the ones in the model
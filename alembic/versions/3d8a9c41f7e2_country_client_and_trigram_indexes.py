@@ -0,0 +1,62 @@
+"""country client and trigram indexes
+
+Revision ID: 3d8a9c41f7e2
+Revises: c6d1e5b3a0f2
+Create Date: 2026-10-19 13:48:12.604127
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+from psycopg2.errors import InsufficientPrivilege
+
+
+# revision identifiers, used by Alembic.
+revision = "3d8a9c41f7e2"
+down_revision = "c6d1e5b3a0f2"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_locations_country_client_uuid",
+        "locations",
+        ["country", "client_uuid"],
+    )
+
+    # The trigram index is only for substring searches of site names, so if the database
+    # does not have pg_trgm, or the migration user can't make it, carry on without it
+    connection = op.get_bind()
+    available = connection.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first()
+    if available is None:
+        logger.warning("pg_trgm is not available, so not making the site name trigram index")
+        return
+
+    # in a savepoint, so a failure doesn't abort the rest of the migration
+    try:
+        with connection.begin_nested():
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.create_index(
+                "ix_locations_client_location_name_trgm",
+                "locations",
+                ["client_location_name"],
+                postgresql_using="gin",
+                postgresql_ops={"client_location_name": "gin_trgm_ops"},
+            )
+    except sa.exc.ProgrammingError as e:
+        if not isinstance(e.orig, InsufficientPrivilege):
+            raise
+        logger.warning(
+            f"Not allowed to make pg_trgm, so not making the site name trigram index: {e.orig}"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_locations_client_location_name_trgm")
+    op.drop_index("ix_locations_country_client_uuid", table_name="locations")
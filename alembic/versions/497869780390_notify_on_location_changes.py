@@ -0,0 +1,81 @@
+"""notify on location changes
+
+Revision ID: 497869780390
+Revises: b09e80d7dddd
+Create Date: 2026-10-19 11:20:05.771914
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "497869780390"
+down_revision = "b09e80d7dddd"
+branch_labels = None
+depends_on = None
+
+
+def log_location_changes(notify: bool) -> str:
+    """Make the log_location_changes function, optionally with a pg_notify on the change.
+
+    The notification is sent on the 'location_changes' channel, with the location uuid as the
+    payload, and is only delivered when the transaction commits.
+    """
+    notify_new = "PERFORM pg_notify('location_changes', NEW.location_uuid::text);" if notify else ""
+    notify_old = "PERFORM pg_notify('location_changes', OLD.location_uuid::text);" if notify else ""
+
+    return f"""CREATE OR REPLACE FUNCTION log_location_changes()
+RETURNS TRIGGER AS $$
+DECLARE
+    user_uuid UUID;
+BEGIN
+    user_uuid := nullif(current_setting('pvsite_datamodel.current_user_uuid', true), '')::UUID;
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+        INSERT INTO locations_history (
+            location_history_uuid,
+            location_uuid,
+            location_data,
+            changed_by,
+            operation_type,
+            created_utc
+        ) VALUES (
+            gen_random_uuid(),
+            NEW.location_uuid,
+            to_jsonb(NEW),
+            user_uuid,
+            TG_OP,
+            NOW()
+        );
+        {notify_new}
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO locations_history (
+            location_history_uuid,
+            location_uuid,
+            location_data,
+            changed_by,
+            operation_type,
+            created_utc
+        ) VALUES (
+            gen_random_uuid(),
+            OLD.location_uuid,
+            to_jsonb(OLD),
+            user_uuid,
+            'DELETE',
+            NOW()
+        );
+        {notify_old}
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""  # noqa #S608
+
+
+def upgrade() -> None:
+    op.execute(log_location_changes(notify=True))
+
+
+def downgrade() -> None:
+    op.execute(log_location_changes(notify=False))
@@ -0,0 +1,55 @@
+"""dno and gsp id columns
+
+Revision ID: 5f0b27c8d6a1
+Revises: e2b7f0c93d14
+Create Date: 2026-10-19 16:02:37.918254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5f0b27c8d6a1"
+down_revision = "e2b7f0c93d14"
+branch_labels = None
+depends_on = None
+
+
+def _json_id_expression(column: str, key: str) -> str:
+    """The same expression as in sqlmodels, copied so this migration does not change."""
+    pattern = rf'"{key}"\s*:\s*"?([0-9]{{1,9}})(?![0-9])'
+    return f"CAST(substring({column} from '{pattern}') AS INTEGER)"
+
+
+def upgrade() -> None:
+    # generated columns are filled in for the existing rows when they are added
+    op.add_column(
+        "locations",
+        sa.Column(
+            "dno_id",
+            sa.Integer(),
+            sa.Computed(_json_id_expression("dno", "dno_id")),
+            nullable=True,
+            comment="The id of the Distribution Node Operator, from the dno column",
+        ),
+    )
+    op.add_column(
+        "locations",
+        sa.Column(
+            "gsp_id",
+            sa.Integer(),
+            sa.Computed(_json_id_expression("gsp", "gsp_id")),
+            nullable=True,
+            comment="The id of the Grid Supply Point, from the gsp column",
+        ),
+    )
+    op.create_index(op.f("ix_locations_dno_id"), "locations", ["dno_id"], unique=False)
+    op.create_index(op.f("ix_locations_gsp_id"), "locations", ["gsp_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_locations_gsp_id"), table_name="locations")
+    op.drop_index(op.f("ix_locations_dno_id"), table_name="locations")
+    op.drop_column("locations", "gsp_id")
+    op.drop_column("locations", "dno_id")
@@ -0,0 +1,29 @@
+"""location metadata gin index
+
+Revision ID: 8c4e91a2b3f7
+Revises: 5f0b27c8d6a1
+Create Date: 2026-10-19 16:41:05.226811
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "8c4e91a2b3f7"
+down_revision = "5f0b27c8d6a1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_locations_location_metadata",
+        "locations",
+        ["location_metadata"],
+        postgresql_using="gin",
+        postgresql_ops={"location_metadata": "jsonb_path_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_locations_location_metadata", table_name="locations")
@@ -0,0 +1,154 @@
+"""partition api_request by month
+
+The partitioned table replaces api_request straight away, so API requests keep being
+logged, and the old rows are then copied into it in batches, each in its own transaction.
+Until the copy finishes, old requests are missing from api_request. If the copy fails,
+api_request_old is left with the rows not yet copied, and the revision is not stamped, so
+finish the copy by hand before running the upgrade again.
+
+The downgrade copies the rows back in one transaction, so API request logging is blocked
+while it runs.
+
+Requests saved without a time are given created_utc = 'epoch', so they go in the default
+partition. They are deleted by the first run of scripts/api_request_retention.py, which
+logs how many.
+
+Revision ID: a71d3e5c9b20
+Revises: 8c4e91a2b3f7
+Create Date: 2026-10-19 17:24:51.730164
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a71d3e5c9b20"
+down_revision = "8c4e91a2b3f7"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+COPY_BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    # Postgres can't partition an existing table, so make a new partitioned table
+    # and copy the rows into it
+    op.execute("ALTER TABLE api_request RENAME TO api_request_old")
+    op.execute(
+        "ALTER TABLE api_request_old "
+        "RENAME CONSTRAINT api_request_pkey TO api_request_old_pkey"
+    )
+    op.execute("ALTER INDEX ix_api_request_user_uuid RENAME TO ix_api_request_old_user_uuid")
+
+    # the partition key has to be in the primary key, so created_utc can't be null
+    op.execute(
+        """
+        CREATE TABLE api_request (
+            created_utc TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            uuid UUID NOT NULL DEFAULT gen_random_uuid(),
+            url VARCHAR,
+            user_uuid UUID REFERENCES users (user_uuid),
+            CONSTRAINT api_request_pkey PRIMARY KEY (uuid, created_utc)
+        ) PARTITION BY RANGE (created_utc)
+        """
+    )
+    op.execute("CREATE TABLE api_request_default PARTITION OF api_request DEFAULT")
+
+    # one partition per month, from the first request to two months from now.
+    # After this, scripts/api_request_retention.py makes new months and drops old ones.
+    # created_utc is UTC, so the months are UTC months whatever the server time zone is
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            now_utc timestamp := now() AT TIME ZONE 'UTC';
+            month_start timestamp;
+        BEGIN
+            month_start := date_trunc(
+                'month', coalesce((SELECT min(created_utc) FROM api_request_old), now_utc)
+            );
+            WHILE month_start < date_trunc('month', now_utc) + interval '3 months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF api_request FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month_start, '"api_request_y"YYYY"m"MM'),
+                    month_start,
+                    month_start + interval '1 month'
+                );
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END
+        $$
+        """
+    )
+
+    op.execute(
+        "CREATE INDEX ix_api_request_user_uuid_created_utc "
+        "ON api_request (user_uuid, created_utc DESC)"
+    )
+
+    # copy the old rows in batches, each committed, so the copy doesn't hold locks or
+    # one huge transaction. Requests with no time go in the default partition
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        n_no_time = connection.execute(
+            sa.text("SELECT count(*) FROM api_request_old WHERE created_utc IS NULL")
+        ).scalar()
+        if n_no_time:
+            logger.warning(
+                f"{n_no_time} API requests have no time. They are saved with created_utc = "
+                "'epoch' in api_request_default, and the retention job will delete them"
+            )
+
+        copy_batch = sa.text(
+            """
+            WITH batch AS (
+                SELECT created_utc, uuid, url, user_uuid FROM api_request_old
+                WHERE uuid > :last_uuid ORDER BY uuid LIMIT :batch_size
+            ), copied AS (
+                INSERT INTO api_request (created_utc, uuid, url, user_uuid)
+                SELECT coalesce(created_utc, 'epoch'), uuid, url, user_uuid FROM batch
+            )
+            SELECT uuid FROM batch ORDER BY uuid DESC LIMIT 1
+            """
+        )
+        last_uuid = "00000000-0000-0000-0000-000000000000"
+        while True:
+            last_uuid = connection.execute(
+                copy_batch, {"last_uuid": last_uuid, "batch_size": COPY_BATCH_SIZE}
+            ).scalar()
+            if last_uuid is None:
+                break
+
+        op.execute("DROP TABLE api_request_old")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE api_request RENAME TO api_request_partitioned")
+    op.execute(
+        """
+        CREATE TABLE api_request (
+            created_utc TIMESTAMP WITHOUT TIME ZONE,
+            uuid UUID NOT NULL DEFAULT gen_random_uuid(),
+            url VARCHAR,
+            user_uuid UUID REFERENCES users (user_uuid),
+            CONSTRAINT api_request_pkey_unpartitioned PRIMARY KEY (uuid)
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO api_request (created_utc, uuid, url, user_uuid)
+        SELECT created_utc, uuid, url, user_uuid FROM api_request_partitioned
+        """
+    )
+    op.execute("DROP TABLE api_request_partitioned")
+    op.execute(
+        "ALTER TABLE api_request "
+        "RENAME CONSTRAINT api_request_pkey_unpartitioned TO api_request_pkey"
+    )
+    op.execute("CREATE INDEX ix_api_request_user_uuid ON api_request (user_uuid)")
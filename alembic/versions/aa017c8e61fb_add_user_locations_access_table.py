@@ -0,0 +1,124 @@
+"""add user_locations access table
+
+Revision ID: aa017c8e61fb
+Revises: 6aa3e123ea5a
+Create Date: 2026-10-19 09:12:41.184202
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "aa017c8e61fb"
+down_revision = "6aa3e123ea5a"
+branch_labels = None
+depends_on = None
+
+
+# keep user_locations in step with location_group_locations
+SYNC_FROM_LOCATION_GROUP_LOCATIONS = """
+CREATE OR REPLACE FUNCTION sync_user_locations_from_location_group_locations()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') THEN
+        DELETE FROM user_locations ul
+        USING users u
+        WHERE ul.user_uuid = u.user_uuid
+          AND u.location_group_uuid = OLD.location_group_uuid
+          AND ul.location_uuid = OLD.location_uuid;
+    END IF;
+
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+        INSERT INTO user_locations (user_uuid, location_uuid)
+        SELECT u.user_uuid, NEW.location_uuid
+        FROM users u
+        WHERE u.location_group_uuid = NEW.location_group_uuid
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER location_group_locations_user_locations_trigger
+AFTER INSERT OR UPDATE OR DELETE ON location_group_locations
+FOR EACH ROW EXECUTE FUNCTION sync_user_locations_from_location_group_locations();
+"""
+
+# keep user_locations in step with a user's location group.
+# Deleting a user is handled by the ON DELETE CASCADE foreign key.
+SYNC_FROM_USERS = """
+CREATE OR REPLACE FUNCTION sync_user_locations_from_users()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'UPDATE') THEN
+        IF (NEW.location_group_uuid IS NOT DISTINCT FROM OLD.location_group_uuid) THEN
+            RETURN NULL;
+        END IF;
+        DELETE FROM user_locations WHERE user_uuid = OLD.user_uuid;
+    END IF;
+
+    INSERT INTO user_locations (user_uuid, location_uuid)
+    SELECT NEW.user_uuid, lgl.location_uuid
+    FROM location_group_locations lgl
+    WHERE lgl.location_group_uuid = NEW.location_group_uuid
+    ON CONFLICT DO NOTHING;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_user_locations_trigger
+AFTER INSERT OR UPDATE OF location_group_uuid ON users
+FOR EACH ROW EXECUTE FUNCTION sync_user_locations_from_users();
+"""
+
+BACKFILL = """
+INSERT INTO user_locations (user_uuid, location_uuid)
+SELECT u.user_uuid, lgl.location_uuid
+FROM users u
+JOIN location_group_locations lgl ON lgl.location_group_uuid = u.location_group_uuid
+ON CONFLICT DO NOTHING;
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_locations",
+        sa.Column(
+            "user_uuid",
+            sa.UUID(),
+            nullable=False,
+            comment="The user who can access the location",
+        ),
+        sa.Column(
+            "location_uuid",
+            sa.UUID(),
+            nullable=False,
+            comment="The location the user can access",
+        ),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["location_uuid"], ["locations.location_uuid"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("user_uuid", "location_uuid"),
+    )
+    op.create_index(
+        op.f("ix_user_locations_location_uuid"), "user_locations", ["location_uuid"], unique=False
+    )
+    op.execute(SYNC_FROM_LOCATION_GROUP_LOCATIONS)
+    op.execute(SYNC_FROM_USERS)
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS users_user_locations_trigger ON users;")
+    op.execute("DROP FUNCTION IF EXISTS sync_user_locations_from_users;")
+    op.execute(
+        "DROP TRIGGER IF EXISTS location_group_locations_user_locations_trigger "
+        "ON location_group_locations;"
+    )
+    op.execute("DROP FUNCTION IF EXISTS sync_user_locations_from_location_group_locations;")
+    op.drop_index(op.f("ix_user_locations_location_uuid"), table_name="user_locations")
+    op.drop_table("user_locations")
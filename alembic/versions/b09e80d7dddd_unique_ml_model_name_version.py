@@ -0,0 +1,63 @@
+"""unique ml_model name and version
+
+Revision ID: b09e80d7dddd
+Revises: aa017c8e61fb
+Create Date: 2026-10-19 10:03:17.520331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b09e80d7dddd"
+down_revision = "aa017c8e61fb"
+branch_labels = None
+depends_on = None
+
+
+# map each duplicate model to the first one created with the same name and version
+DUPLICATE_MODELS = """
+SELECT model_uuid, keep_model_uuid FROM (
+    SELECT
+        model_uuid,
+        first_value(model_uuid) OVER (
+            PARTITION BY name, coalesce(version, '')
+            ORDER BY created_utc, model_uuid
+        ) AS keep_model_uuid
+    FROM ml_model
+) AS m
+WHERE model_uuid != keep_model_uuid
+"""
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Concurrent writers could previously create the same model twice,
+    # so point any references at one of them and remove the rest
+    duplicates = connection.execute(sa.text(DUPLICATE_MODELS)).all()
+    for model_uuid, keep_model_uuid in duplicates:
+        params = {"model_uuid": model_uuid, "keep_model_uuid": keep_model_uuid}
+        for table in ["forecast_values", "locations"]:
+            connection.execute(
+                sa.text(
+                    f"UPDATE {table} SET ml_model_uuid = :keep_model_uuid "  # noqa: S608
+                    "WHERE ml_model_uuid = :model_uuid"
+                ),
+                params,
+            )
+        connection.execute(
+            sa.text("DELETE FROM ml_model WHERE model_uuid = :model_uuid"), params
+        )
+
+    op.create_index(
+        "ix_ml_model_name_version",
+        "ml_model",
+        ["name", sa.text("coalesce(version, '')")],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ml_model_name_version", table_name="ml_model")
@@ -0,0 +1,93 @@
+"""user last api request table
+
+Revision ID: c3f8d2a6e4b1
+Revises: a71d3e5c9b20
+Create Date: 2026-10-19 18:06:12.480395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "c3f8d2a6e4b1"
+down_revision = "a71d3e5c9b20"
+branch_labels = None
+depends_on = None
+
+# A statement level trigger, so a batch insert of requests is one upsert, not one per row.
+# Transition tables are allowed on partitioned tables, for statement level triggers
+SYNC_USER_LAST_API_REQUEST = """
+CREATE OR REPLACE FUNCTION sync_user_last_api_request()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_last_api_request (user_uuid, api_request_uuid, created_utc, url)
+    SELECT DISTINCT ON (user_uuid) user_uuid, uuid, created_utc, url
+    FROM new_api_requests
+    WHERE user_uuid IS NOT NULL
+    ORDER BY user_uuid, created_utc DESC
+    ON CONFLICT (user_uuid) DO UPDATE
+    SET api_request_uuid = EXCLUDED.api_request_uuid,
+        created_utc = EXCLUDED.created_utc,
+        url = EXCLUDED.url
+    WHERE EXCLUDED.created_utc >= user_last_api_request.created_utc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_request_user_last_api_request_trigger
+AFTER INSERT ON api_request
+REFERENCING NEW TABLE AS new_api_requests
+FOR EACH STATEMENT EXECUTE FUNCTION sync_user_last_api_request();
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_last_api_request",
+        sa.Column("user_uuid", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "api_request_uuid",
+            postgresql.UUID(as_uuid=True),
+            nullable=False,
+            comment="The uuid of the last request in api_request",
+        ),
+        sa.Column(
+            "created_utc", sa.DateTime(), nullable=False, comment="The time of the last request"
+        ),
+        sa.Column("url", sa.String(), nullable=True, comment="The url of the last request"),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_uuid"),
+    )
+    op.create_index(
+        op.f("ix_user_last_api_request_created_utc"),
+        "user_last_api_request",
+        ["created_utc"],
+        unique=False,
+    )
+
+    op.execute(SYNC_USER_LAST_API_REQUEST)
+
+    # backfill from the existing requests, after making the trigger so none are missed
+    op.execute(
+        """
+        INSERT INTO user_last_api_request (user_uuid, api_request_uuid, created_utc, url)
+        SELECT DISTINCT ON (user_uuid) user_uuid, uuid, created_utc, url
+        FROM api_request
+        WHERE user_uuid IS NOT NULL
+        ORDER BY user_uuid, created_utc DESC
+        ON CONFLICT (user_uuid) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS api_request_user_last_api_request_trigger ON api_request;"
+    )
+    op.execute("DROP FUNCTION IF EXISTS sync_user_last_api_request;")
+    op.drop_index(
+        op.f("ix_user_last_api_request_created_utc"), table_name="user_last_api_request"
+    )
+    op.drop_table("user_last_api_request")
@@ -0,0 +1,29 @@
+"""location point index
+
+Revision ID: c6d1e5b3a0f2
+Revises: fb3f093c2541
+Create Date: 2026-10-19 13:05:41.226310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c6d1e5b3a0f2"
+down_revision = "fb3f093c2541"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_locations_point",
+        "locations",
+        [sa.text("point(longitude, latitude)")],
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_locations_point", table_name="locations")
@@ -0,0 +1,60 @@
+"""horizon minutes are null until computed
+
+Revision ID: d4e6a2c81f37
+Revises: c3f8d2a6e4b1
+Create Date: 2026-10-19 19:31:08.562140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d4e6a2c81f37"
+down_revision = "c3f8d2a6e4b1"
+branch_labels = None
+depends_on = None
+
+COMMENT = (
+    "The time difference between the creation time of the forecast value "
+    "and the start of the time interval it applies for"
+)
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "forecast_values",
+        "horizon_minutes",
+        existing_type=sa.INTEGER(),
+        server_default=None,
+        nullable=True,
+        existing_comment=COMMENT,
+    )
+
+    # -1 was the default for values saved without a horizon, but is also a real horizon.
+    # The rows are not rewritten here, as forecast_values is large. Instead the index covers
+    # them, and scripts/backfill_horizon_minutes.py computes them again in small transactions
+    op.create_index(
+        "ix_forecast_values_forecast_uuid_horizon_minutes_missing",
+        "forecast_values",
+        ["forecast_uuid"],
+        unique=False,
+        postgresql_where=sa.text("horizon_minutes IS NULL OR horizon_minutes = -1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_forecast_values_forecast_uuid_horizon_minutes_missing",
+        table_name="forecast_values",
+        postgresql_where=sa.text("horizon_minutes IS NULL OR horizon_minutes = -1"),
+    )
+    op.execute("UPDATE forecast_values SET horizon_minutes = -1 WHERE horizon_minutes IS NULL")
+    op.alter_column(
+        "forecast_values",
+        "horizon_minutes",
+        existing_type=sa.INTEGER(),
+        server_default=sa.text("-1"),
+        nullable=False,
+        existing_comment=COMMENT,
+    )
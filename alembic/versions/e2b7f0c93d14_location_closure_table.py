@@ -0,0 +1,149 @@
+"""add location_closure table
+
+Revision ID: e2b7f0c93d14
+Revises: 3d8a9c41f7e2
+Create Date: 2026-10-19 14:22:37.918245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e2b7f0c93d14"
+down_revision = "3d8a9c41f7e2"
+branch_labels = None
+depends_on = None
+
+
+# Note the LocationSQL.child_locations relationship, which makes the location_locations
+# rows, stores the parent in location_child_uuid and the child in location_parent_uuid.
+# The hierarchy is read the same way here, so it matches child_locations/parent_locations.
+
+# Recompute the closure rows of a location and everything under it, as those are the
+# only rows that change when the location gains or loses a parent.
+# Walks are limited to 100 levels, so a cycle in location_locations can not loop forever.
+REFRESH_LOCATION_CLOSURE = """
+CREATE OR REPLACE FUNCTION refresh_location_closure(child_uuid UUID)
+RETURNS void AS $$
+DECLARE
+    affected UUID[];
+BEGIN
+    affected := ARRAY(
+        WITH RECURSIVE below(location_uuid, depth) AS (
+            SELECT child_uuid, 0
+            UNION
+            SELECT ll.location_parent_uuid, b.depth + 1
+            FROM location_locations ll
+            JOIN below b ON ll.location_child_uuid = b.location_uuid
+            WHERE b.depth < 100
+        )
+        SELECT DISTINCT location_uuid FROM below
+    );
+
+    DELETE FROM location_closure WHERE descendant_uuid = ANY(affected);
+
+    INSERT INTO location_closure (ancestor_uuid, descendant_uuid, depth)
+    WITH RECURSIVE paths(ancestor_uuid, descendant_uuid, depth) AS (
+        SELECT ll.location_child_uuid, ll.location_parent_uuid, 1
+        FROM location_locations ll
+        WHERE ll.location_parent_uuid = ANY(affected)
+        UNION
+        SELECT ll.location_child_uuid, p.descendant_uuid, p.depth + 1
+        FROM paths p
+        JOIN location_locations ll ON ll.location_parent_uuid = p.ancestor_uuid
+        WHERE p.depth < 100
+    )
+    SELECT ancestor_uuid, descendant_uuid, min(depth)
+    FROM paths
+    WHERE ancestor_uuid != descendant_uuid
+    GROUP BY ancestor_uuid, descendant_uuid;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_location_closure()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') THEN
+        PERFORM refresh_location_closure(OLD.location_parent_uuid);
+    END IF;
+
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+        PERFORM refresh_location_closure(NEW.location_parent_uuid);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER location_locations_location_closure_trigger
+AFTER INSERT OR UPDATE OR DELETE ON location_locations
+FOR EACH ROW EXECUTE FUNCTION sync_location_closure();
+"""
+
+BACKFILL = """
+INSERT INTO location_closure (ancestor_uuid, descendant_uuid, depth)
+WITH RECURSIVE paths(ancestor_uuid, descendant_uuid, depth) AS (
+    SELECT location_child_uuid, location_parent_uuid, 1
+    FROM location_locations
+    UNION
+    SELECT ll.location_child_uuid, p.descendant_uuid, p.depth + 1
+    FROM paths p
+    JOIN location_locations ll ON ll.location_parent_uuid = p.ancestor_uuid
+    WHERE p.depth < 100
+)
+SELECT ancestor_uuid, descendant_uuid, min(depth)
+FROM paths
+WHERE ancestor_uuid != descendant_uuid
+GROUP BY ancestor_uuid, descendant_uuid;
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "location_closure",
+        sa.Column(
+            "ancestor_uuid",
+            sa.UUID(),
+            nullable=False,
+            comment="The location higher up the hierarchy, e.g. a region",
+        ),
+        sa.Column(
+            "descendant_uuid",
+            sa.UUID(),
+            nullable=False,
+            comment="The location lower down the hierarchy, e.g. a site",
+        ),
+        sa.Column(
+            "depth",
+            sa.Integer(),
+            nullable=False,
+            comment="The number of levels between the locations, 1 for a direct child",
+        ),
+        sa.ForeignKeyConstraint(
+            ["ancestor_uuid"], ["locations.location_uuid"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["descendant_uuid"], ["locations.location_uuid"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("ancestor_uuid", "descendant_uuid"),
+    )
+    op.create_index(
+        op.f("ix_location_closure_descendant_uuid"),
+        "location_closure",
+        ["descendant_uuid"],
+        unique=False,
+    )
+    op.execute(REFRESH_LOCATION_CLOSURE)
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS location_locations_location_closure_trigger "
+        "ON location_locations;"
+    )
+    op.execute("DROP FUNCTION IF EXISTS sync_location_closure;")
+    op.execute("DROP FUNCTION IF EXISTS refresh_location_closure;")
+    op.drop_index(op.f("ix_location_closure_descendant_uuid"), table_name="location_closure")
+    op.drop_table("location_closure")
@@ -0,0 +1,43 @@
+"""back ml_id with a sequence
+
+Revision ID: fb3f093c2541
+Revises: 497869780390
+Create Date: 2026-10-19 12:41:52.093117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "fb3f093c2541"
+down_revision = "497869780390"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence("locations_ml_id_seq")))
+    op.execute("ALTER SEQUENCE locations_ml_id_seq OWNED BY locations.ml_id")
+    # start after the current max ml_id
+    op.execute(
+        "SELECT setval('locations_ml_id_seq', coalesce(max(ml_id), 0) + 1, false) FROM locations"
+    )
+    op.alter_column(
+        "locations",
+        "ml_id",
+        existing_type=sa.INTEGER(),
+        existing_nullable=False,
+        server_default=sa.text("nextval('locations_ml_id_seq')"),
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "locations",
+        "ml_id",
+        existing_type=sa.INTEGER(),
+        existing_nullable=False,
+        server_default=None,
+    )
+    op.execute(sa.schema.DropSequence(sa.Sequence("locations_ml_id_seq")))
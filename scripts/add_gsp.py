@@ -1,77 +1,45 @@
 """This script adds the relevant GSP to the sites
 
-Might need to install nowcasting_dataset
+and we want to added the gsp as {"gsp_id": gsp_id, "name": gsp_name} into the database
 
-and we want to added the gsp as {gsp_id}|{gsp_nam} into the database
-
-1. Load in metadata
-2. Load in gsp names
-3. Load all sites
-4. For each site add gsp
+1. Load all sites with no gsp
+2. Find the gsp of every site at once
+3. Update the sites
 
 """
 import json
 import os
 
-import pandas as pd
-from nowcasting_dataset.data_sources.gsp.eso import get_gsp_shape_from_eso
-from nowcasting_dataset.geospatial import lat_lon_to_osgb
-from shapely.geometry import Point
+import sqlalchemy as sa
 
 from pvsite_datamodel.connection import DatabaseConnection
-from pvsite_datamodel.sqlmodels import SiteSQL
-
-# 1. load metadata
-eso_meta = get_gsp_shape_from_eso()
-
-# 2.
-dir = ""
-print(os.getcwd())
-dir = "./scripts"
-gsp_names = pd.read_csv(f"{dir}/gsp_new_ids_and_names-edited.csv")
+from pvsite_datamodel.sqlmodels import LocationSQL
+from pvsite_datamodel.write.data.gsp import get_gsp_many
 
-
-# 3. Load all sites
 url = os.getenv("DB_URL")
 connection = DatabaseConnection(url=url)
 with connection.get_session() as session:
 
-    # get sites with no gsp
-    query = session.query(SiteSQL)
-    query = query.filter(SiteSQL.gsp == None)  # noqa
+    # 1. get sites with no gsp
+    query = session.query(LocationSQL.location_uuid, LocationSQL.latitude, LocationSQL.longitude)
+    query = query.filter(LocationSQL.gsp == None)  # noqa
     sites = query.all()
 
     print(f"Total sites are {len(sites)}")
 
-    for site in sites:
-
-        latitude = site.latitude
-        longitude = site.longitude
-
-        print(f"{latitude=}")
-        print(f"{longitude=}")
-
-        # search for point in region
-        x, y = lat_lon_to_osgb(lat=latitude, lon=longitude)
-        point = Point(x, y)
-        mask = eso_meta.contains(point)
-        gsp = eso_meta[mask]
-
-        # select region and get gsp_id and name
-        assert len(gsp) == 1  # noqa
-        gsp = gsp.iloc[0]
-        gsp_details = gsp_names[gsp_names["gsp_name"] == gsp.GSPs]
-        assert len(gsp_details) == 1  # noqa
-        gsp_id = gsp_details.index[0]
-        gsp_details = gsp_details.iloc[0]
-        name = gsp_details["region_name"]
-
-        db_gsp = {"gsp_id": str(gsp_id), "name": name}
-        print(db_gsp)
-        db_gsp = json.dumps(db_gsp)
-
-        print(db_gsp)
-
-        site.gsp = db_gsp
-
-    session.commit()
+    if len(sites) > 0:
+        # 2. search for all the points in the regions
+        location_uuids, latitudes, longitudes = zip(*sites, strict=True)
+        gsp_df = get_gsp_many(latitudes=latitudes, longitudes=longitudes)
+        print(gsp_df["gsp_id"].value_counts())
+
+        # 3. update the sites, commit at the end so all sites are updated
+        gsps = [json.dumps(gsp) for gsp in gsp_df.to_dict(orient="records")]
+        session.execute(
+            sa.update(LocationSQL),
+            [
+                {"location_uuid": location_uuid, "gsp": gsp}
+                for location_uuid, gsp in zip(location_uuids, gsps, strict=True)
+            ],
+        )
+        session.commit()
@@ -0,0 +1,42 @@
+"""Script to make new monthly api_request partitions and drop old ones
+
+Run this at least once a month, e.g. daily from cron, so the partition for each month
+exists before the month starts.
+
+Usage:
+    python scripts/api_request_retention.py [retention_months] [--dry-run]
+"""
+
+import os
+import sys
+
+from pvsite_datamodel.connection import DatabaseConnection
+from pvsite_datamodel.write.partitions import (
+    create_api_request_partitions,
+    drop_old_api_request_partitions,
+    get_api_request_partitions,
+)
+
+dry_run = "--dry-run" in sys.argv
+args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+retention_months = int(args[0]) if len(args) > 0 else 12
+
+url = os.getenv("DB_URL")
+connection = DatabaseConnection(url=url, echo=False)
+with connection.get_session() as session:
+
+    partitions = get_api_request_partitions(session=session)
+    print(f"There are {len(partitions)} api_request partitions")
+
+    if dry_run:
+        for name, month_start in partitions.items():
+            print(f"{name}: {month_start:%Y-%m}")
+    else:
+        created = create_api_request_partitions(session=session)
+        print(f"Made partitions {created}")
+
+        dropped = drop_old_api_request_partitions(
+            session=session,
+            retention_months=retention_months,
+        )
+        print(f"Dropped partitions older than {retention_months} months {dropped}")
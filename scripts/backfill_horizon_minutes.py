@@ -0,0 +1,25 @@
+"""Script to backfill horizon_minutes on forecast values saved without it
+
+Forecast values saved without horizon minutes have horizon_minutes=null, or -1 if they
+were saved before the column was nullable, which means they are missed by any query
+filtering on horizon. Run it after the d4e6a2c81f37 migration.
+The backfill runs in small transactions, so it can be run on a live database.
+
+Usage:
+    python scripts/backfill_horizon_minutes.py [batch_size]
+"""
+
+import os
+import sys
+
+from pvsite_datamodel.connection import DatabaseConnection
+from pvsite_datamodel.write.forecast import backfill_horizon_minutes
+
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+url = os.getenv("DB_URL")
+connection = DatabaseConnection(url=url, echo=False)
+with connection.get_session() as session:
+
+    n_updated = backfill_horizon_minutes(session=session, batch_size=batch_size)
+    print(f"Backfilled horizon minutes for {n_updated} forecast values")
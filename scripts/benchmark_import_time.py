@@ -0,0 +1,56 @@
+"""Benchmark how long the package takes to import
+
+Each module is imported in a new interpreter with `python -X importtime`, so nothing is
+already cached, and the cumulative import time is reported, along with any of the slow
+geodata packages it pulled in.
+
+Usage:
+    python scripts/benchmark_import_time.py [n_repeats]
+"""
+
+import statistics
+import subprocess
+import sys
+
+modules = ["pvsite_datamodel", "pvsite_datamodel.read", "pvsite_datamodel.write"]
+geodata_packages = ["geopandas", "shapely", "pyproj"]
+
+n_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+
+def import_time(module: str) -> tuple[float, list[str]]:
+    """Import a module in a new interpreter.
+
+    :return: 2-tuple of the cumulative import time in ms, and the geodata packages imported
+    """
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # lines look like "import time:   self [us] | cumulative | imported package"
+    cumulative_us = None
+    imported = []
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == module:
+            cumulative_us = int(cumulative)
+        if name in geodata_packages:
+            imported.append(name)
+
+    return cumulative_us / 1000, imported
+
+
+for module in modules:
+    times = []
+    for _ in range(n_repeats):
+        ms, imported = import_time(module)
+        times.append(ms)
+
+    print(
+        f"{module}: median {statistics.median(times):.0f} ms over {n_repeats} imports, "
+        f"geodata packages imported: {imported or 'none'}"
+    )
@@ -0,0 +1,93 @@
+"""Benchmark the per point latency of the DNO and GSP lookups
+
+Compares reading the shapefile and testing every polygon for each point,
+which is how the lookups used to work, with the cached regions and spatial index.
+Also times looking up all the points at once, with and without the region grid,
+see scripts/make_region_grids.py.
+
+Usage:
+    python scripts/benchmark_region_lookup.py [n_points]
+"""
+
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point
+
+from pvsite_datamodel.write.data.dno import dno_local_file, dno_regions
+from pvsite_datamodel.write.data.grid import RegionGrid
+from pvsite_datamodel.write.data.gsp import gsp_local_file, gsp_regions
+from pvsite_datamodel.write.data.utils import Regions, lat_lon_to_osgb
+
+n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+# random points over Great Britain
+rng = np.random.default_rng(seed=0)
+latitudes = rng.uniform(50.0, 58.5, n_points)
+longitudes = rng.uniform(-5.5, 1.5, n_points)
+
+
+def read_and_contains(latitude: float, longitude: float, local_file: str):
+    """Find the region by reading the file and testing every polygon."""
+    regions = gpd.read_file(local_file)
+    x, y = lat_lon_to_osgb(lat=latitude, lon=longitude)
+    return regions[regions.contains(Point(x, y))]
+
+
+def find(latitude: float, longitude: float, regions: Regions):
+    """Find the region with the cached regions and spatial index."""
+    return regions.find(latitude=latitude, longitude=longitude)
+
+
+def time_per_point(function, **kwargs) -> float:
+    """Time a lookup function over all the points, in milliseconds per point."""
+    start = time.perf_counter()
+    for latitude, longitude in zip(latitudes, longitudes, strict=True):
+        function(latitude, longitude, **kwargs)
+    return (time.perf_counter() - start) / n_points * 1000
+
+
+for name, local_file, regions in [
+    ("dno", dno_local_file, dno_regions),
+    ("gsp", gsp_local_file, gsp_regions),
+]:
+    if not os.path.exists(f"{local_file}/{name}.shp"):
+        print(f"{name}: no shapefile at {local_file}, skipping")
+        continue
+
+    before = time_per_point(read_and_contains, local_file=local_file)
+
+    start = time.perf_counter()
+    regions.load()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    after = time_per_point(find, regions=regions)
+
+    print(
+        f"{name}: read and contains {before:.3f} ms/point, "
+        f"cached index {after:.3f} ms/point (one off load {load_ms:.1f} ms)"
+    )
+
+    # batch lookups, with the spatial index, and then with a grid
+    n_batch = 100_000
+    batch_latitudes = rng.uniform(50.0, 58.5, n_batch)
+    batch_longitudes = rng.uniform(-5.5, 1.5, n_batch)
+
+    regions._grid = None
+    start = time.perf_counter()
+    regions.find_many(latitudes=batch_latitudes, longitudes=batch_longitudes)
+    index_us = (time.perf_counter() - start) / n_batch * 1e6
+
+    regions_df, _ = regions.load()
+    regions._grid = RegionGrid.build(regions_df, cell_size=250)
+    start = time.perf_counter()
+    regions.find_many(latitudes=batch_latitudes, longitudes=batch_longitudes)
+    grid_us = (time.perf_counter() - start) / n_batch * 1e6
+
+    print(
+        f"{name}: batch of {n_batch}, spatial index {index_us:.2f} us/point, "
+        f"250 m grid {grid_us:.2f} us/point"
+    )
@@ -0,0 +1,95 @@
+"""Benchmark get_sites_by_country on a table of 100k locations
+
+The locations are made in a transaction that is rolled back at the end, so this can be
+pointed at a development database. They are given negative ml ids, so they don't use up
+values of the ml id sequence, which are not given back when the transaction is rolled back.
+
+Compares the old LIKE '%client%' filter on the site name with the join on the clients
+table, and times the site name search.
+
+Usage:
+    DB_URL=... python scripts/benchmark_sites_by_country.py [n_locations]
+"""
+
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+
+from pvsite_datamodel.connection import DatabaseConnection
+from pvsite_datamodel.read.site import get_sites_by_country
+from pvsite_datamodel.sqlmodels import LocationSQL
+
+n_locations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+n_clients = 100
+n_repeats = 20
+
+# locations spread over clients and countries, named after their client
+MAKE_LOCATIONS = """
+INSERT INTO locations (
+    location_uuid, client_location_id, client_location_name, country, latitude, longitude,
+    capacity_kw, asset_type, location_type, active, client_uuid, created_utc, ml_id
+)
+SELECT
+    gen_random_uuid(), i, 'benchmark_client_' || (i % :n_clients) || '_site_' || i,
+    (ARRAY['uk', 'india', 'nl'])[i % 3 + 1], 51, 0,
+    1, 'pv', 'site', true, c.client_uuid, now(), -i
+FROM generate_series(1, :n_locations) AS i
+JOIN clients AS c ON c.client_name = 'benchmark_client_' || (i % :n_clients)
+"""
+
+
+def time_ms(function) -> float:
+    """Median time of a function in ms."""
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+url = os.getenv("DB_URL")
+connection = DatabaseConnection(url=url, echo=False)
+with connection.get_session() as session:
+
+    session.execute(
+        sa.text(
+            "INSERT INTO clients (client_uuid, client_name, created_utc) "
+            "SELECT gen_random_uuid(), 'benchmark_client_' || i, now() "
+            "FROM generate_series(0, :n_clients - 1) AS i"
+        ),
+        {"n_clients": n_clients},
+    )
+    session.execute(
+        sa.text(MAKE_LOCATIONS),
+        {"n_clients": n_clients, "n_locations": n_locations},
+    )
+    session.execute(sa.text("ANALYZE locations"))
+    session.execute(sa.text("ANALYZE clients"))
+
+    def like_client_name():
+        """The old filter, a LIKE on the site name."""
+        query = session.query(LocationSQL)
+        query = query.filter(LocationSQL.country == "uk")
+        query = query.filter(LocationSQL.client_location_name.like("%benchmark_client_42_%"))
+        return query.order_by(LocationSQL.location_uuid).all()
+
+    def join_client_name():
+        """The client name filter, joining the clients table."""
+        return get_sites_by_country(session, "uk", client_name="benchmark_client_42")
+
+    def search_site_name():
+        """The site name search."""
+        return get_sites_by_country(session, "uk", site_name_search="_site_4242")
+
+    print(
+        f"{n_locations} locations, {n_clients} clients, "
+        f"{len(join_client_name())} sites for the client in the uk"
+    )
+    print(f"client name, LIKE on site name: {time_ms(like_client_name):.1f} ms")
+    print(f"client name, join on clients: {time_ms(join_client_name):.1f} ms")
+    print(f"site name search: {time_ms(search_site_name):.1f} ms")
+
+    session.rollback()
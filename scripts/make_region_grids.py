@@ -0,0 +1,39 @@
+"""Make the GSP and DNO region grids from the bundled shapefiles
+
+The grids are saved as {region}_grid.npy and {region}_grid.json, and are then used by
+get_gsp, get_dno, get_gsp_many and get_dno_many. Remake them whenever the shapefiles change.
+
+The grids are too large to ship in the package, so they are saved in the directory in the
+PVSITE_REGION_GRID_DIR environment variable, e.g. a volume or a layer of the service's
+image. Set the same variable wherever sites are made, so the grids are found. Without it,
+they are saved next to the shapefiles, which only suits a source checkout.
+
+Usage:
+    PVSITE_REGION_GRID_DIR=/path/to/grids python scripts/make_region_grids.py [cell_size_meters]
+"""
+
+import os
+import sys
+
+from pvsite_datamodel.write.data.dno import dno_local_file, dno_regions
+from pvsite_datamodel.write.data.grid import BOUNDARY, RegionGrid
+from pvsite_datamodel.write.data.gsp import gsp_local_file, gsp_regions
+
+cell_size = float(sys.argv[1]) if len(sys.argv) > 1 else 250.0
+
+for name, local_file, regions in [
+    ("dno", dno_local_file, dno_regions),
+    ("gsp", gsp_local_file, gsp_regions),
+]:
+    if not os.path.exists(f"{local_file}/{name}.shp"):
+        print(f"{name}: no shapefile at {local_file}, skipping")
+        continue
+
+    regions_df, _ = regions.load()
+    grid = RegionGrid.build(regions_df, cell_size=cell_size)
+    os.makedirs(os.path.dirname(regions.grid_path), exist_ok=True)
+    grid.save(regions.grid_path)
+
+    ny, nx = grid.cells.shape
+    n_boundary = (grid.cells == BOUNDARY).sum()
+    print(f"{name}: saved {nx} x {ny} grid to {regions.grid_path}, {n_boundary} boundary cells")
@@ -0,0 +1,31 @@
+"""Script to check and rebuild the location_closure hierarchy table
+
+The table is maintained by a database trigger, so this should only be needed
+after manual data fixes.
+
+Usage:
+    python scripts/rebuild_location_closure.py [--verify-only]
+"""
+
+import os
+import sys
+
+from pvsite_datamodel.connection import DatabaseConnection
+from pvsite_datamodel.write.hierarchy import (
+    rebuild_location_closure,
+    verify_location_closure,
+)
+
+verify_only = "--verify-only" in sys.argv
+
+url = os.getenv("DB_URL")
+connection = DatabaseConnection(url=url, echo=False)
+with connection.get_session() as session:
+
+    result = verify_location_closure(session=session)
+    print(f"Missing rows: {len(result['missing'])}")
+    print(f"Extra rows: {len(result['extra'])}")
+
+    if not verify_only and (len(result["missing"]) > 0 or len(result["extra"]) > 0):
+        n_rows = rebuild_location_closure(session=session)
+        print(f"Rebuilt location_closure with {n_rows} rows")
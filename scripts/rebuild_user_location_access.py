@@ -0,0 +1,31 @@
+"""Script to check and rebuild the user_locations access table
+
+The table is maintained by database triggers, so this should only be needed
+after manual data fixes.
+
+Usage:
+    python scripts/rebuild_user_location_access.py [--verify-only]
+"""
+
+import os
+import sys
+
+from pvsite_datamodel.connection import DatabaseConnection
+from pvsite_datamodel.write.access import (
+    rebuild_user_location_access,
+    verify_user_location_access,
+)
+
+verify_only = "--verify-only" in sys.argv
+
+url = os.getenv("DB_URL")
+connection = DatabaseConnection(url=url, echo=False)
+with connection.get_session() as session:
+
+    result = verify_user_location_access(session=session)
+    print(f"Missing rows: {len(result['missing'])}")
+    print(f"Extra rows: {len(result['extra'])}")
+
+    if not verify_only and (len(result["missing"]) > 0 or len(result["extra"]) > 0):
+        n_rows = rebuild_user_location_access(session=session)
+        print(f"Rebuilt user_locations with {n_rows} rows")
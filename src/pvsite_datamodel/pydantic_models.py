@@ -3,7 +3,7 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class GenerationSum(BaseModel):
@@ -12,6 +12,15 @@ class GenerationSum(BaseModel):
     power_kw: float = Field(..., description="Summed power in kW")
     start_utc: datetime = Field(..., description="Start datetime of this power")
     name: str = Field(..., description="Name of item sums. ")
+    location_uuid: UUID | None = Field(
+        None, description="The region location, when summed by region"
+    )
+    n_sites: int | None = Field(
+        None, description="Number of sites in the sum, when summed by region"
+    )
+    capacity_kw: float | None = Field(
+        None, description="Capacity of the sites in the sum, when summed by region"
+    )
 
 
 class ForecastValueSum(BaseModel):
@@ -20,6 +29,15 @@ class ForecastValueSum(BaseModel):
     power_kw: float = Field(..., description="Summed power in kW")
     start_utc: datetime = Field(..., description="Start datetime of this power")
     name: str = Field(..., description="Name of item sums. ")
+    location_uuid: UUID | None = Field(
+        None, description="The region location, when summed by region"
+    )
+    n_sites: int | None = Field(
+        None, description="Number of sites in the sum, when summed by region"
+    )
+    capacity_kw: float | None = Field(
+        None, description="Capacity of the sites in the sum, when summed by region"
+    )
 
 
 class LatitudeLongitudeLimits(BaseModel):
@@ -31,6 +49,26 @@ class LatitudeLongitudeLimits(BaseModel):
     longitude_max: float = Field(180, description="Maximum longitude")
 
 
+class UserAccess(BaseModel):
+    """What a user can access, for authorizing requests."""
+
+    model_config = ConfigDict(frozen=True)
+
+    user_uuid: UUID = Field(..., description="The user's uuid")
+    location_group_uuid: UUID = Field(..., description="The user's site group uuid")
+    service_level: int = Field(..., description="The service level of the user's site group")
+    location_uuids: frozenset[UUID] = Field(..., description="The locations the user can access")
+
+    def can_access(self, location_uuid: UUID | str) -> bool:
+        """Check if the user can access a location.
+
+        :param location_uuid: the location uuid
+        """
+        if not isinstance(location_uuid, UUID):
+            location_uuid = UUID(str(location_uuid))
+        return location_uuid in self.location_uuids
+
+
 class PVSiteEditMetadata(BaseModel):
     """Site metadata when editing a site."""
 
@@ -6,16 +6,26 @@ from .client import get_client_by_name
 from .forecast_value import get_forecast_values_fast, get_forecast_values_day_ahead_fast
 from .generation import get_pv_generation_by_sites, get_pv_generation_by_user_uuids
 from .latest_forecast_values import get_latest_forecast_values_by_site
-from .model import get_or_create_model
+from .model import clear_model_cache, get_or_create_model, get_or_create_model_uuid
 from .site import (
     get_all_sites,
+    get_ancestor_locations,
+    get_descendant_locations,
+    get_nearest_sites,
+    get_nearest_sites_many,
+    get_nearest_sites_to_point,
     get_site_by_client_site_id,
     get_site_by_client_site_name,
     get_site_by_uuid,
     get_sites_by_client_name,
     get_sites_by_country,
+    get_sites_by_metadata,
     get_sites_from_user,
+    get_sites_in_bounding_box,
+    get_sites_within_radius,
+    stream_all_sites,
 )
+from .site_cache import SiteCache
 from .status import get_latest_status
 from .user import (
     get_all_last_api_request,
@@ -24,4 +34,7 @@ from .user import (
     get_api_requests_for_one_user,
     get_site_group_by_name,
     get_user_by_email,
+    stream_all_site_groups,
+    stream_all_users,
 )
+from .user_cache import UserCache, user_cache
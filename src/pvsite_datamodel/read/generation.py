@@ -4,16 +4,17 @@ import logging
 import uuid
 from datetime import datetime
 
+import sqlalchemy as sa
 from sqlalchemy import func
-from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.orm import Session, aliased, contains_eager
 
 from pvsite_datamodel.pydantic_models import GenerationSum
 from pvsite_datamodel.sqlmodels import (
     GenerationSQL,
-    LocationGroupLocationSQL,
-    LocationGroupSQL,
+    LocationClosureSQL,
     LocationSQL,
-    UserSQL,
+    LocationType,
+    UserLocationSQL,
 )
 
 logger = logging.getLogger(__name__)
@@ -49,10 +50,12 @@ def get_pv_generation_by_user_uuids(
         )
 
     if user_uuids is not None:
-        query = query.join(LocationGroupLocationSQL)
-        query = query.join(LocationGroupSQL)
-        query = query.join(UserSQL)
-        query = query.filter(UserSQL.user_uuid.in_(user_uuids))
+        # the user_locations table flattens users -> site groups -> sites
+        query = query.join(
+            UserLocationSQL,
+            UserLocationSQL.location_uuid == GenerationSQL.location_uuid,
+        )
+        query = query.filter(UserLocationSQL.user_uuid.in_(user_uuids))
 
     query = query.order_by(
         LocationSQL.location_uuid,
@@ -78,11 +81,13 @@ def get_pv_generation_by_sites(
     :param start_utc: search filters >= on 'datetime_utc'
     :param end_utc: search fileters < on 'datetime_utc'
     :param site_uuids: optional list of site uuids
-    :param sum_by: optional string to sum by. Must be one of ['total', 'dno', 'gsp']
+    :param sum_by: optional string to sum by. Must be one of ['total', 'dno', 'gsp', 'region'].
+        'region' sums the sites under each region location, at any depth,
+        and also gives the number of sites and their capacity
     :return: list of pv yields
     """
-    if sum_by not in ["total", "dno", "gsp", None]:
-        raise ValueError(f"sum_by must be one of ['total', 'dno', 'gsp'], not {sum_by}")
+    if sum_by not in ["total", "dno", "gsp", "region", None]:
+        raise ValueError(f"sum_by must be one of ['total', 'dno', 'gsp', 'region'], not {sum_by}")
 
     query = session.query(GenerationSQL)
     query = query.join(LocationSQL)
@@ -109,15 +114,75 @@ def get_pv_generation_by_sites(
     if sum_by is None:
         # get all results
         generations: list[GenerationSQL] = query.all()
+    elif sum_by == "region":
+        subquery = query.subquery()
+        region = aliased(LocationSQL)
+
+        # one row per site and time, so each site's capacity is only summed once
+        site_subquery = session.query(
+            subquery.c.start_utc,
+            subquery.c.location_uuid,
+            func.sum(subquery.c.generation_power_kw).label("power_kw"),
+        )
+        site_subquery = site_subquery.group_by(subquery.c.start_utc, subquery.c.location_uuid)
+        site_subquery = site_subquery.subquery()
+
+        # the closure table has one row per region and site, however many paths join them,
+        # so sites in overlapping regions are only counted once in each region
+        query = session.query(
+            site_subquery.c.start_utc,
+            region.location_uuid,
+            region.client_location_name,
+            func.sum(site_subquery.c.power_kw),
+            func.count(LocationSQL.location_uuid),
+            func.sum(LocationSQL.capacity_kw),
+        )
+        query = query.join(
+            LocationSQL, LocationSQL.location_uuid == site_subquery.c.location_uuid
+        )
+        query = query.join(
+            LocationClosureSQL,
+            LocationClosureSQL.descendant_uuid == site_subquery.c.location_uuid,
+        )
+        query = query.join(region, region.location_uuid == LocationClosureSQL.ancestor_uuid)
+        query = query.filter(
+            LocationSQL.location_type == LocationType.site,
+            region.location_type == LocationType.region,
+        )
+        query = query.group_by(
+            site_subquery.c.start_utc, region.location_uuid, region.client_location_name
+        )
+        query = query.order_by(region.location_uuid, site_subquery.c.start_utc)
+
+        generations: list[GenerationSum] = [
+            GenerationSum(
+                start_utc=start_utc,
+                power_kw=power_kw,
+                name=name or str(location_uuid),
+                location_uuid=location_uuid,
+                n_sites=n_sites,
+                capacity_kw=capacity_kw,
+            )
+            for start_utc, location_uuid, name, power_kw, n_sites, capacity_kw in query.all()
+        ]
     else:
         subquery = query.subquery()
 
+        # group on the integer ids, so sites with the same id but differently written json
+        # are in one group. One of the json strings is used as the name. Sites without an id,
+        # e.g. with text that isn't json, are grouped on their text
         group_by_variables = [subquery.c.start_utc]
+        query_variables = [subquery.c.start_utc]
         if sum_by == "dno":
-            group_by_variables.append(LocationSQL.dno)
+            group_by_variables.append(
+                func.coalesce(sa.cast(LocationSQL.dno_id, sa.String), LocationSQL.dno)
+            )
+            query_variables.append(func.min(LocationSQL.dno))
         if sum_by == "gsp":
-            group_by_variables.append(LocationSQL.gsp)
-        query_variables = group_by_variables.copy()
+            group_by_variables.append(
+                func.coalesce(sa.cast(LocationSQL.gsp_id, sa.String), LocationSQL.gsp)
+            )
+            query_variables.append(func.min(LocationSQL.gsp))
         query_variables.append(func.sum(subquery.c.generation_power_kw))
 
         query = session.query(*query_variables)
@@ -8,11 +8,19 @@ import datetime as dt
 import logging
 import uuid
 
+import sqlalchemy as sa
 from sqlalchemy import func, text
-from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.orm import Session, aliased, contains_eager
 
 from pvsite_datamodel.pydantic_models import ForecastValueSum
-from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL, LocationSQL, MLModelSQL
+from pvsite_datamodel.sqlmodels import (
+    ForecastSQL,
+    ForecastValueSQL,
+    LocationClosureSQL,
+    LocationSQL,
+    LocationType,
+    MLModelSQL,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +65,9 @@ def get_latest_forecast_values_by_site(
     :param end_utc: optional, filters on forecast values target_time < end_utc
     :param created_by: filter on forecast values created time <= created_by
     :param created_after: optional, filter on forecast values created time >= created_after
-    :param sum_by: optional, sum the forecast values by this column
+    :param sum_by: optional, sum the forecast values by this column.
+        One of ['total', 'dno', 'gsp', 'region']. 'region' sums the sites under each
+        region location, at any depth, and also gives the number of sites and their capacity
     :param forecast_horizon_minutes, optional, filter on forecast horizon minutes. We
         return any forecast with forecast horizon mintues >= this value.
         For example, for forecast_horizon_minutes==90, the latest forecast great or equal to
@@ -76,8 +86,8 @@ def get_latest_forecast_values_by_site(
         "or get_forecast_values_day_ahead_fast"
     )
 
-    if sum_by not in ["total", "dno", "gsp", None]:
-        raise ValueError(f"sum_by must be one of ['total', 'dno', 'gsp'], not {sum_by}")
+    if sum_by not in ["total", "dno", "gsp", "region", None]:
+        raise ValueError(f"sum_by must be one of ['total', 'dno', 'gsp', 'region'], not {sum_by}")
 
     if day_ahead_timezone_delta_hours is not None:
         # we use mintues and sql cant handle .5 hours (or any decimals)
@@ -179,15 +189,78 @@ def get_latest_forecast_values_by_site(
             output_dict[site_uuid] = site_latest_forecast_values
 
         return output_dict
+    elif sum_by == "region":
+        subquery = query.subquery()
+        region = aliased(LocationSQL)
+
+        # one row per site and time, so each site's capacity is only summed once
+        site_subquery = session.query(
+            subquery.c.start_utc,
+            ForecastSQL.location_uuid,
+            func.sum(subquery.c.forecast_power_kw).label("power_kw"),
+        )
+        site_subquery = site_subquery.join(
+            ForecastSQL, ForecastSQL.forecast_uuid == subquery.c.forecast_uuid
+        )
+        site_subquery = site_subquery.group_by(subquery.c.start_utc, ForecastSQL.location_uuid)
+        site_subquery = site_subquery.subquery()
+
+        # the closure table has one row per region and site, however many paths join them,
+        # so sites in overlapping regions are only counted once in each region
+        query = session.query(
+            site_subquery.c.start_utc,
+            region.location_uuid,
+            region.client_location_name,
+            func.sum(site_subquery.c.power_kw),
+            func.count(LocationSQL.location_uuid),
+            func.sum(LocationSQL.capacity_kw),
+        )
+        query = query.join(
+            LocationSQL, LocationSQL.location_uuid == site_subquery.c.location_uuid
+        )
+        query = query.join(
+            LocationClosureSQL,
+            LocationClosureSQL.descendant_uuid == site_subquery.c.location_uuid,
+        )
+        query = query.join(region, region.location_uuid == LocationClosureSQL.ancestor_uuid)
+        query = query.filter(
+            LocationSQL.location_type == LocationType.site,
+            region.location_type == LocationType.region,
+        )
+        query = query.group_by(
+            site_subquery.c.start_utc, region.location_uuid, region.client_location_name
+        )
+        query = query.order_by(region.location_uuid, site_subquery.c.start_utc)
+
+        forecasts: list[ForecastValueSum] = [
+            ForecastValueSum(
+                start_utc=start_utc,
+                power_kw=power_kw,
+                name=name or str(location_uuid),
+                location_uuid=location_uuid,
+                n_sites=n_sites,
+                capacity_kw=capacity_kw,
+            )
+            for start_utc, location_uuid, name, power_kw, n_sites, capacity_kw in query.all()
+        ]
     else:
         subquery = query.subquery()
 
+        # group on the integer ids, so sites with the same id but differently written json
+        # are in one group. One of the json strings is used as the name. Sites without an id,
+        # e.g. with text that isn't json, are grouped on their text
         group_by_variables = [subquery.c.start_utc]
+        query_variables = [subquery.c.start_utc]
         if sum_by == "dno":
-            group_by_variables.append(LocationSQL.dno)
+            group_by_variables.append(
+                func.coalesce(sa.cast(LocationSQL.dno_id, sa.String), LocationSQL.dno)
+            )
+            query_variables.append(func.min(LocationSQL.dno))
         if sum_by == "gsp":
-            group_by_variables.append(LocationSQL.gsp)
-        query_variables = group_by_variables.copy()
+            group_by_variables.append(
+                func.coalesce(sa.cast(LocationSQL.gsp_id, sa.String), LocationSQL.gsp)
+            )
+            query_variables.append(func.min(LocationSQL.gsp))
         query_variables.append(func.sum(subquery.c.forecast_power_kw))
 
         query = session.query(*query_variables)
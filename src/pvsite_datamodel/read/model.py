@@ -1,14 +1,151 @@
 """Read functions for getting ML models."""
 
 import logging
+import threading
+import uuid
 from datetime import datetime
+from functools import partial
 
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 
+from pvsite_datamodel.session_events import call_after_transaction
 from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL, LocationSQL, MLModelSQL
 
 logger = logging.getLogger(__name__)
 
+# Process level cache of (name, version) -> model_uuid.
+# Models made in a transaction are held in `session.info` and only added here once the
+# transaction commits, so a rollback never leaves a model uuid that doesn't exist.
+_model_uuid_cache: dict[tuple[str, str], uuid.UUID] = {}
+_model_uuid_cache_lock = threading.Lock()
+_PENDING_MODELS_KEY = "pvsite_datamodel_pending_models"
+
+
+def _promote_pending_models(session: Session) -> None:
+    """Add the models seen in a committed transaction to the cache."""
+    pending = session.info.pop(_PENDING_MODELS_KEY, None)
+    if pending:
+        with _model_uuid_cache_lock:
+            _model_uuid_cache.update(pending)
+
+
+def _discard_pending_models(session: Session) -> None:
+    """Forget the models seen in a rolled back transaction."""
+    session.info.pop(_PENDING_MODELS_KEY, None)
+
+
+def clear_model_cache() -> None:
+    """Empty the process level model cache."""
+    with _model_uuid_cache_lock:
+        _model_uuid_cache.clear()
+
+
+def _insert_model(
+    session: Session,
+    name: str,
+    version: str | None = None,
+    description: str | None = None,
+) -> uuid.UUID:
+    """Insert a model, or get the existing one, and return its uuid.
+
+    Uses `INSERT ... ON CONFLICT DO NOTHING` on the unique (name, version) index,
+    so concurrent writers can't make duplicate models.
+    """
+    if description is None:
+        # get last model not with this version,
+        # so that we can copy the description forward
+        description = (
+            session.query(MLModelSQL.description)
+            .filter(MLModelSQL.name == name)
+            .order_by(MLModelSQL.created_utc.desc())
+            .limit(1)
+            .scalar()
+        )
+
+    values = {"name": name, "version": version}
+    if description is not None:
+        values["description"] = description
+
+    stmt = postgresql.insert(MLModelSQL.__table__).values(**values)
+    stmt = stmt.on_conflict_do_nothing(
+        index_elements=[
+            MLModelSQL.name,
+            sa.func.coalesce(MLModelSQL.version, sa.literal_column("''")),
+        ],
+    )
+    stmt = stmt.returning(MLModelSQL.model_uuid)
+    model_uuid = session.execute(stmt).scalar()
+
+    if model_uuid is None:
+        # another writer made it first
+        model_uuid = (
+            session.query(MLModelSQL.model_uuid)
+            .filter(MLModelSQL.name == name)
+            .filter(sa.func.coalesce(MLModelSQL.version, "") == (version or ""))
+            .scalar()
+        )
+    else:
+        logger.debug(f"Model for name {name} and version {version} did not exist so added it")
+
+    return model_uuid
+
+
+def get_or_create_model_uuid(
+    session: Session,
+    name: str,
+    version: str,
+    description: str | None = None,
+) -> uuid.UUID:
+    """Get the model uuid from name and version.
+
+    A new model is made if it doesn't not exists.
+    Results are cached for the process, so after warm-up this doesn't query the database.
+
+    :param session: database session
+    :param name: name of the model
+    :param version: version of the model
+    :param description: description of the model, used if the model is made
+
+    return: Model uuid
+    """
+    key = (name, version)
+
+    model_uuid = _model_uuid_cache.get(key)
+    if model_uuid is not None:
+        return model_uuid
+
+    pending = session.info.get(_PENDING_MODELS_KEY)
+    if pending is None:
+        pending = session.info[_PENDING_MODELS_KEY] = {}
+        call_after_transaction(
+            session,
+            on_commit=partial(_promote_pending_models, session),
+            on_rollback=partial(_discard_pending_models, session),
+        )
+    model_uuid = pending.get(key)
+    if model_uuid is not None:
+        return model_uuid
+
+    model_uuid = (
+        session.query(MLModelSQL.model_uuid)
+        .filter(MLModelSQL.name == name)
+        .filter(MLModelSQL.version == version)
+        .scalar()
+    )
+    if model_uuid is None:
+        model_uuid = _insert_model(
+            session=session,
+            name=name,
+            version=version,
+            description=description,
+        )
+
+    pending[key] = model_uuid
+
+    return model_uuid
+
 
 def get_or_create_model(
     session: Session,
@@ -28,46 +165,29 @@ def get_or_create_model(
     return: Model object
 
     """
+    if version is not None:
+        model_uuid = get_or_create_model_uuid(
+            session=session,
+            name=name,
+            version=version,
+            description=description,
+        )
+        return session.get(MLModelSQL, model_uuid)
+
     # start main query
     query = session.query(MLModelSQL)
 
-    # filter on gsp_id
+    # filter on name
     query = query.filter(MLModelSQL.name == name)
-    if version is not None:
-        query = query.filter(MLModelSQL.version == version)
 
     # gets the latest version
     query = query.order_by(MLModelSQL.version.desc())
 
-    # get all results
-    models = query.all()
+    model = query.first()
 
-    if len(models) == 0:
-        logger.debug(
-            f"Model for name {name} and version {version} does not exist so going to add it",
-        )
-        model = MLModelSQL(name=name, version=version)
-
-        if description is not None:
-            model.description = description
-        else:
-            # get last model not with this version,
-            # so that we can copy the description forward
-            last_model = (
-                session.query(MLModelSQL)
-                .distinct(MLModelSQL.name)
-                .filter(MLModelSQL.name == name)
-                .order_by(MLModelSQL.name, MLModelSQL.created_utc.desc())
-                .one_or_none()
-            )
-            if last_model is not None:
-                model.description = last_model.description
-
-        session.add(model)
-        session.commit()
-
-    else:
-        model = models[0]
+    if model is None:
+        model_uuid = _insert_model(session=session, name=name, description=description)
+        model = session.get(MLModelSQL, model_uuid)
 
     return model
 
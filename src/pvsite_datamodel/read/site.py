@@ -1,20 +1,31 @@
 """Functions for reading to pvsite db."""
 
 import logging
+import math
+import uuid
+from collections.abc import Iterator
 
-from sqlalchemy.orm import Session
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONPATH, UUID
+from sqlalchemy.orm import Query, Session, selectinload
 
 from pvsite_datamodel.pydantic_models import LatitudeLongitudeLimits
 from pvsite_datamodel.sqlmodels import (
     ClientSQL,
-    LocationGroupLocationSQL,
-    LocationGroupSQL,
+    LocationAssetType,
+    LocationClosureSQL,
     LocationSQL,
+    LocationType,
+    UserLocationSQL,
     UserSQL,
 )
 
 logger = logging.getLogger(__name__)
 
+# mean radius of the earth
+EARTH_RADIUS_KM = 6371.0088
+
 
 def get_site_by_uuid(session: Session, site_uuid: str) -> LocationSQL:
     """Get site object from uuid.
@@ -94,10 +105,21 @@ def get_site_by_client_site_name(
     return site
 
 
-def get_all_sites(session: Session) -> list[LocationSQL]:
+def get_all_sites(
+    session: Session,
+    limit: int | None = None,
+    after_uuid: uuid.UUID | str | None = None,
+) -> list[LocationSQL]:
     """Get all sites from the sites table.
 
+    Use limit and after_uuid to get the sites a page at a time, e.g.
+    `get_all_sites(session, limit=100, after_uuid=sites[-1].location_uuid)` for the next page.
+    Each page is an index range scan, so later pages are as quick as the first.
+
     :param session: database session
+    :param limit: optional, the maximum number of sites to get
+    :param after_uuid: optional, only get sites after this location uuid,
+        normally the last site of the previous page
     :return: site object
     """
     logger.debug("Getting all sites")
@@ -105,9 +127,15 @@ def get_all_sites(session: Session) -> list[LocationSQL]:
     # start main query
     query = session.query(LocationSQL)
 
+    if after_uuid is not None:
+        query = query.filter(LocationSQL.location_uuid > after_uuid)
+
     # order by uuuid
     query = query.order_by(LocationSQL.location_uuid)
 
+    if limit is not None:
+        query = query.limit(limit)
+
     # get all results
     sites = query.all()
 
@@ -116,16 +144,36 @@ def get_all_sites(session: Session) -> list[LocationSQL]:
     return sites
 
 
+def stream_all_sites(session: Session, batch_size: int = 1000) -> Iterator[LocationSQL]:
+    """Get all sites from the sites table, one at a time.
+
+    The rows are read from the database in batches, so memory use does not grow with
+    the number of sites, as long as the caller does not keep them.
+
+    :param session: database session
+    :param batch_size: the number of sites to read from the database at a time
+    :return: generator of site objects, ordered by location uuid
+    """
+    query = session.query(LocationSQL)
+    query = query.order_by(LocationSQL.location_uuid)
+
+    yield from query.yield_per(batch_size)
+
+
 def get_sites_by_country(
     session: Session,
     country: str,
     client_name: str | None = None,
+    site_name_search: str | None = None,
 ) -> list[LocationSQL]:
     """Get sites for specific country from the sites table.
 
     :param session: database session
     :param country: country name
-    :param client_name: optional client string, we search this in the 'client_site_name'.
+    :param client_name: optional client name, to only get that client's sites.
+        Uses the (country, client_uuid) index.
+    :param site_name_search: optional string to search for in the 'client_location_name'.
+        Uses the trigram index, if the database has the pg_trgm extension.
     :return: site object
     """
     logger.debug(f"Getting sites by country={country}")
@@ -136,12 +184,16 @@ def get_sites_by_country(
     # filter by country
     query = query.filter(LocationSQL.country == country)
 
-    # filter by client string
-    # This could cause an issue if client_a's name is in the site of clients_b.
-    # We could make a new Client table and join it with sites
-    # https://github.com/openclimatefix/pv-site-datamodel/issues/148
+    # filter by client
     if client_name is not None:
-        query = query.filter(LocationSQL.client_location_name.like(f"%{client_name}%"))
+        query = query.join(ClientSQL, ClientSQL.client_uuid == LocationSQL.client_uuid)
+        query = query.filter(ClientSQL.client_name == client_name)
+
+    # filter by site name, with LIKE '%search%', escaping any wildcards in the search string
+    if site_name_search is not None:
+        query = query.filter(
+            LocationSQL.client_location_name.contains(site_name_search, autoescape=True),
+        )
 
     # order by uuuid
     query = query.order_by(LocationSQL.location_uuid)
@@ -154,36 +206,81 @@ def get_sites_by_country(
     return sites
 
 
+def get_sites_by_metadata(
+    session: Session,
+    metadata: dict | None = None,
+    jsonpath: str | None = None,
+) -> list[LocationSQL]:
+    """Get sites by the properties in their location_metadata.
+
+    The metadata filter uses the GIN index on location_metadata. The jsonpath filter only
+    uses it for equality predicates on a path, e.g. '$.tracking_type == "single_axis"'.
+    Other predicates, e.g. comparisons or like_regex, scan the table. If both are given,
+    sites have to match both.
+
+    :param session: database session
+    :param metadata: optional dict the metadata has to contain,
+        e.g. {"tracking_type": "single_axis"}, or {"panels": {"technology": "mono"}}
+    :param jsonpath: optional jsonpath predicate the metadata has to match,
+        e.g. '$.tracking_type == "single_axis"', or '$.panels.technology == "mono"'
+    :return: list of site objects
+    """
+    if metadata is None and jsonpath is None:
+        raise ValueError("One of metadata or jsonpath must be given")
+
+    query = session.query(LocationSQL)
+
+    # @> containment
+    if metadata is not None:
+        query = query.filter(LocationSQL.location_metadata.contains(metadata))
+
+    # @@ jsonpath predicate
+    if jsonpath is not None:
+        query = query.filter(
+            LocationSQL.location_metadata.op("@@")(sa.cast(jsonpath, JSONPATH)),
+        )
+
+    query = query.order_by(LocationSQL.location_uuid)
+
+    return query.all()
+
+
 def get_sites_from_user(
     session: Session,
     user: UserSQL,
     lat_lon_limits: LatitudeLongitudeLimits | None = None,
+    load_related: bool = False,
 ) -> list[LocationSQL]:
     """Get the sites for a user.
 
     Option to filter on latitude longitude max and min
+
+    :param session: database session
+    :param user: the user
+    :param lat_lon_limits: optional latitude longitude max and min
+    :param load_related: also load the sites' client, ML model and inverters, with one
+        query each, rather than one query per site when they are first used
+    :return: list of site objects
     """
-    # get sites and filter if required
-    if lat_lon_limits is not None:
-        # make query
-        query = session.query(LocationSQL)
+    # make query, the user_locations table gives the user's sites with one index lookup
+    query = session.query(LocationSQL)
+    query = query.join(UserLocationSQL)
+    query = query.filter(UserLocationSQL.user_uuid == user.user_uuid)
 
-        # join to Usersql through site groups
-        query = query.join(LocationGroupLocationSQL)
-        query = query.join(LocationGroupSQL)
-        query = query.join(UserSQL)
+    # filter on lat lon limits
+    if lat_lon_limits is not None:
+        query = _filter_lat_lon_limits(query, lat_lon_limits)
 
-        # filter on user on lat lon limits
-        query = query.filter(LocationSQL.latitude <= lat_lon_limits.latitude_max)
-        query = query.filter(LocationSQL.latitude >= lat_lon_limits.latitude_min)
-        query = query.filter(LocationSQL.longitude <= lat_lon_limits.longitude_max)
-        query = query.filter(LocationSQL.longitude >= lat_lon_limits.longitude_min)
+    if load_related:
+        query = query.options(
+            selectinload(LocationSQL.client),
+            selectinload(LocationSQL.ml_model),
+            selectinload(LocationSQL.inverters),
+        )
 
-        # query db
-        sites = query.all()
+    # query db
+    sites = query.order_by(LocationSQL.location_uuid).all()
 
-    else:
-        sites = user.location_group.locations
     return sites
 
 
@@ -215,3 +312,410 @@ def get_sites_by_client_name(session: Session, client_name: str) -> list[Locatio
         raise Exception(f"Could not find locations from client {client_name}")
 
     return sites
+
+
+def get_descendant_locations(
+    session: Session,
+    location_uuid: uuid.UUID | str,
+    location_type: LocationType | None = None,
+    max_depth: int | None = None,
+) -> list[LocationSQL]:
+    """Get all the locations under a location, e.g. every site in a region.
+
+    Uses the location_closure table, so the whole hierarchy is answered with one query.
+
+    :param session: database session
+    :param location_uuid: the location at the top
+    :param location_type: optional location type, e.g. LocationType.site
+    :param max_depth: optional number of levels to go down, 1 for only direct children
+    :return: list of location objects, nearest levels first
+    """
+    query = session.query(LocationSQL)
+    query = query.join(
+        LocationClosureSQL,
+        LocationClosureSQL.descendant_uuid == LocationSQL.location_uuid,
+    )
+    query = query.filter(LocationClosureSQL.ancestor_uuid == location_uuid)
+    if location_type is not None:
+        query = query.filter(LocationSQL.location_type == location_type)
+    if max_depth is not None:
+        query = query.filter(LocationClosureSQL.depth <= max_depth)
+
+    query = query.order_by(LocationClosureSQL.depth, LocationSQL.location_uuid)
+
+    return query.all()
+
+
+def get_ancestor_locations(
+    session: Session,
+    location_uuid: uuid.UUID | str,
+    location_type: LocationType | None = None,
+    max_depth: int | None = None,
+) -> list[LocationSQL]:
+    """Get all the locations a location rolls up to, e.g. every region a site is in.
+
+    Uses the location_closure table, so the whole hierarchy is answered with one query.
+
+    :param session: database session
+    :param location_uuid: the location at the bottom
+    :param location_type: optional location type, e.g. LocationType.region
+    :param max_depth: optional number of levels to go up, 1 for only direct parents
+    :return: list of location objects, nearest levels first
+    """
+    query = session.query(LocationSQL)
+    query = query.join(
+        LocationClosureSQL,
+        LocationClosureSQL.ancestor_uuid == LocationSQL.location_uuid,
+    )
+    query = query.filter(LocationClosureSQL.descendant_uuid == location_uuid)
+    if location_type is not None:
+        query = query.filter(LocationSQL.location_type == location_type)
+    if max_depth is not None:
+        query = query.filter(LocationClosureSQL.depth <= max_depth)
+
+    query = query.order_by(LocationClosureSQL.depth, LocationSQL.location_uuid)
+
+    return query.all()
+
+
+def get_sites_in_bounding_box(
+    session: Session,
+    lat_lon_limits: LatitudeLongitudeLimits,
+    user: UserSQL | None = None,
+) -> list[LocationSQL]:
+    """Get the sites in a latitude longitude box.
+
+    Uses the ix_locations_point index.
+
+    :param session: database session
+    :param lat_lon_limits: latitude and longitude max and min, inclusive
+    :param user: optional user, to only get the user's sites
+    :return: list of site objects
+    """
+    query = session.query(LocationSQL)
+    query = _filter_lat_lon_limits(query, lat_lon_limits)
+    query = _filter_user(query, user)
+
+    # order by uuuid
+    query = query.order_by(LocationSQL.location_uuid)
+
+    return query.all()
+
+
+def get_sites_within_radius(
+    session: Session,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    user: UserSQL | None = None,
+) -> list[tuple[LocationSQL, float]]:
+    """Get the sites within a distance of a point, nearest first.
+
+    The sites in a bounding box around the circle are found with the ix_locations_point
+    index, and then the great circle distance is checked exactly.
+
+    :param session: database session
+    :param latitude: latitude of the point
+    :param longitude: longitude of the point
+    :param radius_km: the distance in km
+    :param user: optional user, to only get the user's sites
+    :return: list of (site object, distance in km) tuples
+    """
+    distance = _distance_km(latitude, longitude).label("distance_km")
+
+    query = session.query(LocationSQL, distance)
+    query = _filter_lat_lon_limits(query, _bounding_box(latitude, longitude, radius_km))
+    query = query.filter(distance <= radius_km)
+    query = _filter_user(query, user)
+    query = query.order_by(distance, LocationSQL.location_uuid)
+
+    return [(site, distance_km) for site, distance_km in query.all()]
+
+
+def get_nearest_sites_to_point(
+    session: Session,
+    latitude: float,
+    longitude: float,
+    k: int,
+    user: UserSQL | None = None,
+) -> list[tuple[LocationSQL, float]]:
+    """Get the k nearest sites to a point, nearest first, see `get_nearest_sites`.
+
+    :param session: database session
+    :param latitude: latitude of the point
+    :param longitude: longitude of the point
+    :param k: the number of sites
+    :param user: optional user, to only get the user's sites
+    :return: list of (site object, distance in km) tuples
+    """
+    return get_nearest_sites(session=session, origin=(latitude, longitude), k=k, user=user)
+
+
+def get_nearest_sites(
+    session: Session,
+    origin: uuid.UUID | str | tuple[float, float],
+    k: int,
+    user: UserSQL | None = None,
+    asset_type: LocationAssetType | None = None,
+    active: bool | None = None,
+) -> list[tuple[LocationSQL, float]]:
+    """Get the k nearest sites to a site, or to a point, nearest first.
+
+    :param session: database session
+    :param origin: a site uuid, or a (latitude, longitude) tuple.
+        A site is not included in its own nearest sites.
+    :param k: the number of sites
+    :param user: optional user, to only get the user's sites
+    :param asset_type: optional asset type, to only get sites of that type
+    :param active: optional, to only get active, or inactive, sites
+    :return: list of (site object, distance in km) tuples
+    """
+    return get_nearest_sites_many(
+        session=session,
+        origins=[origin],
+        k=k,
+        user=user,
+        asset_type=asset_type,
+        active=active,
+    )[0]
+
+
+def get_nearest_sites_many(
+    session: Session,
+    origins: list[uuid.UUID | str | tuple[float, float]],
+    k: int,
+    user: UserSQL | None = None,
+    asset_type: LocationAssetType | None = None,
+    active: bool | None = None,
+) -> list[list[tuple[LocationSQL, float]]]:
+    """Get the k nearest sites to each of many sites or points, nearest first.
+
+    The ix_locations_point index orders sites by distance in degrees, which is not quite
+    the distance on the earth. So k sites are found for every origin with the index, and
+    the furthest of them gives a radius that the true k nearest sites must be in, which
+    is then searched exactly. This takes the same number of queries for any number of
+    origins.
+
+    :param session: database session
+    :param origins: list of site uuids, or (latitude, longitude) tuples.
+        A site is not included in its own nearest sites.
+    :param k: the number of sites for each origin
+    :param user: optional user, to only get the user's sites
+    :param asset_type: optional asset type, to only get sites of that type
+    :param active: optional, to only get active, or inactive, sites
+    :return: list of lists of (site object, distance in km) tuples, one list per origin
+    """
+    nearest: list[list[tuple[LocationSQL, float]]] = [[] for _ in origins]
+    points = _origin_points(session, origins)
+    points = [point for point in points if point[1] is not None and point[2] is not None]
+    if k <= 0 or len(points) == 0:
+        return nearest
+
+    filters = _site_filters(user=user, asset_type=asset_type, active=active)
+
+    # nearest k in degrees for each origin, with the index
+    origin = _unnest_origins(points)
+    distance = _distance_km(origin.c.latitude, origin.c.longitude)
+    candidates = (
+        sa.select(distance.label("distance_km"))
+        .where(*filters)
+        .where(LocationSQL.location_uuid.is_distinct_from(origin.c.exclude_uuid))
+        .order_by(
+            _location_point().op("<->")(sa.func.point(origin.c.longitude, origin.c.latitude)),
+        )
+        .limit(k)
+        .lateral()
+    )
+    query = (
+        sa.select(origin.c.origin_index, sa.func.max(candidates.c.distance_km))
+        .select_from(origin.join(candidates, sa.true()))
+        .group_by(origin.c.origin_index)
+    )
+    radius_km = dict(session.execute(query).all())
+
+    # the true k nearest are no further away than these k, so search exactly within that
+    points = [point for point in points if point[0] in radius_km]
+    if len(points) == 0:
+        return nearest
+    boxes = [
+        _bounding_box(latitude, longitude, radius_km[origin_index])
+        for origin_index, latitude, longitude, _ in points
+    ]
+
+    origin = _unnest_origins(
+        points,
+        radius_km=[radius_km[point[0]] for point in points],
+        latitude_min=[box.latitude_min for box in boxes],
+        latitude_max=[box.latitude_max for box in boxes],
+        longitude_min=[box.longitude_min for box in boxes],
+        longitude_max=[box.longitude_max for box in boxes],
+    )
+    distance = _distance_km(origin.c.latitude, origin.c.longitude)
+    box = sa.func.box(
+        sa.func.point(origin.c.longitude_min, origin.c.latitude_min),
+        sa.func.point(origin.c.longitude_max, origin.c.latitude_max),
+    )
+    sites = (
+        sa.select(LocationSQL.location_uuid, distance.label("distance_km"))
+        .where(*filters)
+        .where(LocationSQL.location_uuid.is_distinct_from(origin.c.exclude_uuid))
+        .where(_location_point().op("<@")(box))
+        .where(distance <= origin.c.radius_km)
+        .order_by(distance, LocationSQL.location_uuid)
+        .limit(k)
+        .lateral()
+    )
+    query = sa.select(origin.c.origin_index, sites.c.location_uuid, sites.c.distance_km)
+    query = query.select_from(origin.join(sites, sa.true()))
+    rows = session.execute(query).all()
+
+    # get the site objects with one query
+    location_uuids = {location_uuid for _, location_uuid, _ in rows}
+    query = session.query(LocationSQL).filter(LocationSQL.location_uuid.in_(location_uuids))
+    sites_by_uuid = {site.location_uuid: site for site in query.all()}
+
+    for origin_index, location_uuid, distance_km in rows:
+        nearest[origin_index].append((sites_by_uuid[location_uuid], distance_km))
+    for site_distances in nearest:
+        site_distances.sort(key=lambda pair: (pair[1], pair[0].location_uuid))
+
+    return nearest
+
+
+def _origin_points(
+    session: Session,
+    origins: list[uuid.UUID | str | tuple[float, float]],
+) -> list[tuple[int, float | None, float | None, uuid.UUID | None]]:
+    """Get (origin index, latitude, longitude, site uuid or None) for each origin."""
+    site_uuids = {
+        uuid.UUID(str(origin)) for origin in origins if not isinstance(origin, tuple | list)
+    }
+    lat_lons = {}
+    if len(site_uuids) > 0:
+        query = session.query(
+            LocationSQL.location_uuid,
+            LocationSQL.latitude,
+            LocationSQL.longitude,
+        )
+        query = query.filter(LocationSQL.location_uuid.in_(site_uuids))
+        lat_lons = {location_uuid: (lat, lon) for location_uuid, lat, lon in query.all()}
+
+    points = []
+    for i, origin in enumerate(origins):
+        if isinstance(origin, tuple | list):
+            latitude, longitude = origin
+            points.append((i, latitude, longitude, None))
+        else:
+            site_uuid = uuid.UUID(str(origin))
+            if site_uuid not in lat_lons:
+                raise KeyError(f"Location uuid {site_uuid} not found in locations table")
+            latitude, longitude = lat_lons[site_uuid]
+            points.append((i, latitude, longitude, site_uuid))
+
+    return points
+
+
+def _unnest_origins(points: list[tuple], **columns: list[float]):
+    """Origins, and any extra float columns, as a table valued function, one row per origin."""
+    names = ["origin_index", "latitude", "longitude", "exclude_uuid", *columns]
+    values = [
+        [int(point[0]) for point in points],
+        [float(point[1]) for point in points],
+        [float(point[2]) for point in points],
+        [point[3] for point in points],
+        *[[float(value) for value in values] for values in columns.values()],
+    ]
+    types = [sa.Integer, sa.Float, sa.Float, UUID(as_uuid=True)] + [sa.Float] * len(columns)
+
+    arrays = [
+        sa.bindparam(f"origin_{name}", value, type_=postgresql.ARRAY(type_))
+        for name, value, type_ in zip(names, values, types, strict=True)
+    ]
+    return sa.func.unnest(*arrays).table_valued(*names).render_derived()
+
+
+def _site_filters(
+    user: UserSQL | None = None,
+    asset_type: LocationAssetType | None = None,
+    active: bool | None = None,
+) -> list:
+    """Filters on the locations table, for the nearest site queries."""
+    filters = [LocationSQL.latitude.is_not(None), LocationSQL.longitude.is_not(None)]
+    if user is not None:
+        user_locations = sa.select(UserLocationSQL.location_uuid)
+        user_locations = user_locations.where(UserLocationSQL.user_uuid == user.user_uuid)
+        filters.append(LocationSQL.location_uuid.in_(user_locations))
+    if asset_type is not None:
+        filters.append(LocationSQL.asset_type == asset_type)
+    if active is not None:
+        filters.append(LocationSQL.active == active)
+    return filters
+
+
+def _location_point():
+    """Location as a point of (longitude, latitude), the ix_locations_point expression."""
+    return sa.func.point(LocationSQL.longitude, LocationSQL.latitude)
+
+
+def _filter_lat_lon_limits(query: Query, lat_lon_limits: LatitudeLongitudeLimits) -> Query:
+    """Filter a query of locations to a latitude longitude box, using the point index."""
+    box = sa.func.box(
+        sa.func.point(lat_lon_limits.longitude_min, lat_lon_limits.latitude_min),
+        sa.func.point(lat_lon_limits.longitude_max, lat_lon_limits.latitude_max),
+    )
+    return query.filter(_location_point().op("<@")(box))
+
+
+def _filter_user(query: Query, user: UserSQL | None) -> Query:
+    """Filter a query of locations to the user's sites, if there is a user."""
+    if user is None:
+        return query
+    query = query.join(UserLocationSQL, UserLocationSQL.location_uuid == LocationSQL.location_uuid)
+    return query.filter(UserLocationSQL.user_uuid == user.user_uuid)
+
+
+def _distance_km(latitude, longitude):
+    """Great circle distance from a point to the locations, in km, with the haversine formula.
+
+    The point can be floats, or columns, e.g. of a table of origins.
+    """
+    lat1, lon1 = sa.func.radians(latitude), sa.func.radians(longitude)
+    lat2, lon2 = sa.func.radians(LocationSQL.latitude), sa.func.radians(LocationSQL.longitude)
+
+    a = sa.func.power(sa.func.sin((lat2 - lat1) / 2), 2) + sa.func.cos(lat1) * sa.func.cos(
+        lat2
+    ) * sa.func.power(sa.func.sin((lon2 - lon1) / 2), 2)
+
+    # least guards against rounding taking a just over 1
+    return 2 * EARTH_RADIUS_KM * sa.func.asin(sa.func.least(1.0, sa.func.sqrt(a)))
+
+
+def _bounding_box(latitude: float, longitude: float, radius_km: float) -> LatitudeLongitudeLimits:
+    """Latitude longitude box that has all the points within a distance of a point.
+
+    See http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    delta_latitude = math.degrees(angular_radius)
+    latitude_min = latitude - delta_latitude
+    latitude_max = latitude + delta_latitude
+
+    if latitude_min <= -90.0 or latitude_max >= 90.0:
+        # the circle has a pole in, so all longitudes are in it
+        latitude_min, latitude_max = max(latitude_min, -90.0), min(latitude_max, 90.0)
+        longitude_min, longitude_max = -180.0, 180.0
+    else:
+        delta_longitude = math.degrees(
+            math.asin(math.sin(angular_radius) / math.cos(math.radians(latitude))),
+        )
+        longitude_min, longitude_max = longitude - delta_longitude, longitude + delta_longitude
+        if longitude_min < -180.0 or longitude_max > 180.0:
+            # the circle wraps around, so search all longitudes
+            longitude_min, longitude_max = -180.0, 180.0
+
+    return LatitudeLongitudeLimits(
+        latitude_min=latitude_min,
+        latitude_max=latitude_max,
+        longitude_min=longitude_min,
+        longitude_max=longitude_max,
+    )
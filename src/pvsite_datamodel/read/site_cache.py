@@ -0,0 +1,266 @@
+"""Process local cache of sites.
+
+Sites are read on almost every API request, but only change a few times a day.
+Every change to the locations table sends a notification on the 'location_changes' channel
+(see the log_location_changes trigger), so a listener thread can drop exactly the sites that
+changed, and all workers stay consistent.
+
+The listener is started before the cache is warmed, so no change is missed between the two.
+
+Example:
+    site_cache = SiteCache()
+    site_cache.start_listener(engine)
+    site_cache.wait_for_listener(timeout=10)
+    site_cache.warm(session)
+
+    site = site_cache.get_site_by_uuid(session, site_uuid)
+"""
+
+import copy
+import logging
+import select
+import threading
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from pvsite_datamodel.read.site import (
+    get_all_sites,
+    get_site_by_client_site_id,
+    get_site_by_client_site_name,
+    get_site_by_uuid,
+)
+from pvsite_datamodel.sqlmodels import LocationSQL
+
+logger = logging.getLogger(__name__)
+
+LOCATION_CHANGES_CHANNEL = "location_changes"
+
+
+class SiteCache:
+    """Cache of site column values, by location uuid and by client site id or name.
+
+    Sites are returned attached to the caller's session, without querying the database.
+    Relationships (e.g. `site.inverters`) are still lazy loaded from the database.
+    """
+
+    def __init__(self) -> None:
+        """Make an empty cache."""
+        self._lock = threading.Lock()
+        self._sites: dict[uuid.UUID, dict] = {}
+        self._uuid_by_key: dict[tuple, uuid.UUID] = {}
+        self._keys_by_uuid: dict[uuid.UUID, set[tuple]] = {}
+        # incremented by every invalidation, so a site read before one is not stored after it
+        self._generation = 0
+
+        self._listener_thread: threading.Thread | None = None
+        self._listener_stop = threading.Event()
+        self._listening = threading.Event()
+
+    def __len__(self) -> int:
+        """Number of cached sites."""
+        return len(self._sites)
+
+    def warm(self, session: Session) -> None:
+        """Load all the sites into the cache.
+
+        :param session: database session
+        """
+        generation = self._generation
+        sites = get_all_sites(session=session)
+        for site in sites:
+            self._store(site, generation=generation)
+
+        logger.info(f"Warmed site cache with {len(sites)} sites")
+
+    def get_site_by_uuid(self, session: Session, site_uuid: uuid.UUID | str) -> LocationSQL:
+        """Get site object from uuid, see `read.site.get_site_by_uuid`.
+
+        :param session: database session
+        :param site_uuid: the site uuid
+        :return: the site object
+        """
+        site_uuid = uuid.UUID(str(site_uuid))
+        site = self._get(session, site_uuid)
+        if site is None:
+            generation = self._generation
+            site = get_site_by_uuid(session=session, site_uuid=site_uuid)
+            self._store(site, generation=generation)
+        return site
+
+    def get_site_by_client_site_id(
+        self,
+        session: Session,
+        client_name: str,
+        client_site_id: int,
+    ) -> LocationSQL:
+        """Get site from client name and client site id, see `read.site`.
+
+        :param session: database session
+        :param client_name: client name
+        :param client_site_id: client's id of site
+        :return: site object
+        """
+        # `get_site_by_client_site_id` matches client_name to the site's client_location_name,
+        # so the key only depends on the site's columns, and changes to them invalidate it
+        key = ("client_site_id", client_name, client_site_id)
+        site = self._get(session, self._uuid_by_key.get(key))
+        if site is None:
+            generation = self._generation
+            site = get_site_by_client_site_id(
+                session=session,
+                client_name=client_name,
+                client_site_id=client_site_id,
+            )
+            self._store(site, generation=generation, key=key)
+        return site
+
+    def get_site_by_client_site_name(
+        self,
+        session: Session,
+        client_name: str,
+        client_site_name: str,
+    ) -> LocationSQL:
+        """Get site from client name and client site name, see `read.site`.
+
+        :param session: database session
+        :param client_name: client name
+        :param client_site_name: client's name of site
+        :return: site object
+        """
+        # `get_site_by_client_site_name` doesn't use client_name, so it isn't in the key
+        key = ("client_site_name", client_site_name)
+        site = self._get(session, self._uuid_by_key.get(key))
+        if site is None:
+            generation = self._generation
+            site = get_site_by_client_site_name(
+                session=session,
+                client_name=client_name,
+                client_site_name=client_site_name,
+            )
+            self._store(site, generation=generation, key=key)
+        return site
+
+    def invalidate(self, site_uuid: uuid.UUID | str) -> None:
+        """Remove a site from the cache.
+
+        :param site_uuid: the site uuid
+        """
+        site_uuid = uuid.UUID(str(site_uuid))
+        with self._lock:
+            self._generation += 1
+            self._sites.pop(site_uuid, None)
+            for key in self._keys_by_uuid.pop(site_uuid, set()):
+                self._uuid_by_key.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all sites from the cache."""
+        with self._lock:
+            self._generation += 1
+            self._sites.clear()
+            self._uuid_by_key.clear()
+            self._keys_by_uuid.clear()
+
+    def _store(self, site: LocationSQL, generation: int, key: tuple | None = None) -> None:
+        """Store a snapshot of the site's columns.
+
+        The site is not stored if the cache was invalidated since `generation`, as the site may
+        have been read before the change that invalidated it.
+        """
+        values = {
+            attr.key: copy.deepcopy(getattr(site, attr.key))
+            for attr in sa.inspect(LocationSQL).column_attrs
+        }
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._sites[site.location_uuid] = values
+            if key is not None:
+                self._uuid_by_key[key] = site.location_uuid
+                self._keys_by_uuid.setdefault(site.location_uuid, set()).add(key)
+
+    def _get(self, session: Session, site_uuid: uuid.UUID | None) -> LocationSQL | None:
+        """Get a cached site, attached to the session, or None if it is not cached."""
+        if site_uuid is None:
+            return None
+
+        values = self._sites.get(site_uuid)
+        if values is None:
+            return None
+
+        # make a detached site from a copy of the cached values, so changes to its json columns
+        # don't change the cache, and merge it into the session without loading it from the
+        # database
+        site = LocationSQL(**copy.deepcopy(values))
+        make_transient_to_detached(site)
+        return session.merge(site, load=False)
+
+    def start_listener(self, engine: Engine, reconnect_seconds: float = 5.0) -> None:
+        """Start a thread that invalidates sites when the database says they have changed.
+
+        :param engine: database engine, used to make a dedicated listening connection
+        :param reconnect_seconds: time to wait before reconnecting after an error
+        """
+        if self._listener_thread is not None and self._listener_thread.is_alive():
+            return
+
+        self._listener_stop.clear()
+        self._listener_thread = threading.Thread(
+            target=self._listen,
+            args=(engine, reconnect_seconds),
+            name="pvsite-site-cache-listener",
+            daemon=True,
+        )
+        self._listener_thread.start()
+
+    def wait_for_listener(self, timeout: float | None = None) -> bool:
+        """Wait until the listener thread is listening for changes.
+
+        :param timeout: how long to wait
+        :return: True if the listener is listening, False if the timeout passed first
+        """
+        return self._listening.wait(timeout=timeout)
+
+    def stop_listener(self, timeout: float | None = None) -> None:
+        """Stop the listener thread.
+
+        :param timeout: how long to wait for the thread to finish
+        """
+        self._listener_stop.set()
+        if self._listener_thread is not None:
+            self._listener_thread.join(timeout=timeout)
+            self._listener_thread = None
+
+    def _listen(self, engine: Engine, reconnect_seconds: float) -> None:
+        """Listen for location changes, reconnecting on errors."""
+        while not self._listener_stop.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                    connection.execute(sa.text(f"LISTEN {LOCATION_CHANGES_CHANNEL}"))
+                    dbapi_connection = connection.connection.dbapi_connection
+
+                    # changes may have been missed while we were not listening, including
+                    # ones made before the first LISTEN, e.g. while the cache was warmed
+                    self.clear()
+                    self._listening.set()
+
+                    while not self._listener_stop.is_set():
+                        if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                            continue
+                        dbapi_connection.poll()
+                        while dbapi_connection.notifies:
+                            notify = dbapi_connection.notifies.pop(0)
+                            logger.debug(f"Location {notify.payload} changed")
+                            self.invalidate(notify.payload)
+            except Exception:
+                logger.exception("Site cache listener failed, clearing cache and reconnecting")
+                self._listening.clear()
+                self.clear()
+                self._listener_stop.wait(reconnect_seconds)
+
+        self._listening.clear()
+
+        logger.debug("Site cache listener stopped")
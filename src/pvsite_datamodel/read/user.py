@@ -1,12 +1,19 @@
 """Functions for reading user data from the database."""
 
 import logging
+from collections.abc import Iterator
 from datetime import datetime
 
+import sqlalchemy as sa
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session, contains_eager
 
-from pvsite_datamodel.sqlmodels import APIRequestSQL, LocationGroupSQL, UserSQL
+from pvsite_datamodel.sqlmodels import (
+    APIRequestSQL,
+    LocationGroupSQL,
+    UserLastAPIRequestSQL,
+    UserSQL,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -43,20 +50,48 @@ def get_user_by_email(session: Session, email: str, make_new_user_if_none: bool
 
 
 # get all users
-def get_all_users(session: Session) -> list[UserSQL]:
+def get_all_users(
+    session: Session,
+    limit: int | None = None,
+    after_email: str | None = None,
+) -> list[UserSQL]:
     """Get all users from the database.
 
+    Use limit and after_email to get the users a page at a time.
+
     :param session: database session
+    :param limit: optional, the maximum number of users to get
+    :param after_email: optional, only get users after this email,
+        normally the last user of the previous page
     """
     query = session.query(UserSQL)
 
+    if after_email is not None:
+        query = query.filter(UserSQL.email > after_email)
+
     query = query.order_by(UserSQL.email.asc())
 
+    if limit is not None:
+        query = query.limit(limit)
+
     users = query.all()
 
     return users
 
 
+def stream_all_users(session: Session, batch_size: int = 1000) -> Iterator[UserSQL]:
+    """Get all users from the database, one at a time, reading them in batches.
+
+    :param session: database session
+    :param batch_size: the number of users to read from the database at a time
+    :return: generator of user objects, ordered by email
+    """
+    query = session.query(UserSQL)
+    query = query.order_by(UserSQL.email.asc())
+
+    yield from query.yield_per(batch_size)
+
+
 def get_site_group_by_name(
     session: Session,
     site_group_name: str,
@@ -91,20 +126,51 @@ def get_site_group_by_name(
 
 
 # get all site groups
-def get_all_site_groups(session: Session) -> list[LocationGroupSQL]:
+def get_all_site_groups(
+    session: Session,
+    limit: int | None = None,
+    after_name: str | None = None,
+) -> list[LocationGroupSQL]:
     """Get all site groups from the database.
 
+    Use limit and after_name to get the site groups a page at a time.
+
     :param session: database session
+    :param limit: optional, the maximum number of site groups to get
+    :param after_name: optional, only get site groups after this name,
+        normally the last site group of the previous page
     """
     query = session.query(LocationGroupSQL)
 
+    if after_name is not None:
+        query = query.filter(LocationGroupSQL.location_group_name > after_name)
+
     query = query.order_by(LocationGroupSQL.location_group_name.asc())
 
+    if limit is not None:
+        query = query.limit(limit)
+
     site_groups = query.all()
 
     return site_groups
 
 
+def stream_all_site_groups(
+    session: Session,
+    batch_size: int = 1000,
+) -> Iterator[LocationGroupSQL]:
+    """Get all site groups from the database, one at a time, reading them in batches.
+
+    :param session: database session
+    :param batch_size: the number of site groups to read from the database at a time
+    :return: generator of site group objects, ordered by name
+    """
+    query = session.query(LocationGroupSQL)
+    query = query.order_by(LocationGroupSQL.location_group_name.asc())
+
+    yield from query.yield_per(batch_size)
+
+
 def get_all_last_api_request(
     session: Session,
     include_in_url: str | None = None,
@@ -121,6 +187,28 @@ def get_all_last_api_request(
     :param end_datetime: only get api requests before end datetime
     :return: List of last API requests
     """
+    # the user_last_api_request table has the last request of each user, which answers
+    # this without reading api_request, unless the url or end datetime filters could
+    # pick an earlier request
+    if include_in_url is None and exclude_in_url is None and end_datetime is None:
+        query = (
+            session.query(APIRequestSQL)
+            .join(
+                UserLastAPIRequestSQL,
+                sa.and_(
+                    UserLastAPIRequestSQL.api_request_uuid == APIRequestSQL.uuid,
+                    UserLastAPIRequestSQL.created_utc == APIRequestSQL.created_utc,
+                ),
+            )
+            .join(UserSQL, UserSQL.user_uuid == APIRequestSQL.user_uuid)
+            .options(contains_eager(APIRequestSQL.user))
+            .order_by(APIRequestSQL.user_uuid)
+        )
+        if start_datetime is not None:
+            query = query.filter(UserLastAPIRequestSQL.created_utc >= start_datetime)
+
+        return query.all()
+
     query = (
         session.query(APIRequestSQL)
         .distinct(APIRequestSQL.user_uuid)
@@ -0,0 +1,184 @@
+"""Process local cache of what each user can access.
+
+Authorizing a request needs the user, their site group and the sites in it, which is
+a few queries every request. The cache keeps these by email, so checking access is a
+set lookup.
+
+Entries expire after a time limit, and the least recently used entries are dropped when the
+cache is full. The write functions that change what users can access (e.g.
+`write.user_and_site.add_site_to_site_group`) invalidate the matching entries in this
+process when their transaction commits, so the time limit only matters for changes made by
+other processes.
+
+Example:
+    user_access = user_cache.get_user_access(session, email)
+    if user_access is None or not user_access.can_access(site_uuid):
+        raise HTTPException(status_code=403)
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import array_agg
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.pydantic_models import UserAccess
+from pvsite_datamodel.session_events import call_after_transaction
+from pvsite_datamodel.sqlmodels import LocationGroupSQL, UserLocationSQL, UserSQL
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """Time limited, least recently used cache of `UserAccess`, by email."""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_size: int = 10_000) -> None:
+        """Make an empty cache.
+
+        :param ttl_seconds: how long an entry is used for before it is read again
+        :param max_size: maximum number of users in the cache
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        # email -> (expiry time, user access), least recently used first
+        self._entries: OrderedDict[str, tuple[float, UserAccess]] = OrderedDict()
+        # incremented by every invalidation, so access read before one is not stored after it
+        self._generation = 0
+
+    def __len__(self) -> int:
+        """Number of cached users."""
+        return len(self._entries)
+
+    def get_user_access(self, session: Session, email: str) -> UserAccess | None:
+        """Get what a user can access.
+
+        :param session: database session
+        :param email: email of user
+        :return: the user's access, or None if there is no user with this email
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(email)
+                return entry[1]
+            generation = self._generation
+
+        user_access = _read_user_access(session=session, email=email)
+        if user_access is None:
+            return None
+
+        with self._lock:
+            # the access may have changed while it was read
+            if generation != self._generation:
+                return user_access
+
+            self._entries[email] = (now + self.ttl_seconds, user_access)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return user_access
+
+    def invalidate(
+        self,
+        email: str | None = None,
+        user_uuid: uuid.UUID | str | None = None,
+        location_group_uuid: uuid.UUID | str | None = None,
+        location_uuid: uuid.UUID | str | None = None,
+    ) -> None:
+        """Remove the users that match any of the arguments from the cache.
+
+        :param email: email of a user
+        :param user_uuid: uuid of a user
+        :param location_group_uuid: uuid of a site group, to remove all its users
+        :param location_uuid: uuid of a site, to remove all the users that can access it
+        """
+        user_uuid = _to_uuid(user_uuid)
+        location_group_uuid = _to_uuid(location_group_uuid)
+        location_uuid = _to_uuid(location_uuid)
+
+        with self._lock:
+            self._generation += 1
+            for entry_email, (_, user_access) in list(self._entries.items()):
+                if (
+                    entry_email == email
+                    or user_access.user_uuid == user_uuid
+                    or user_access.location_group_uuid == location_group_uuid
+                    or location_uuid in user_access.location_uuids
+                ):
+                    del self._entries[entry_email]
+
+    def clear(self) -> None:
+        """Remove all users from the cache."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# the process level cache, which the write functions invalidate
+user_cache = UserCache()
+
+
+def invalidate_user_cache_on_commit(session: Session, **kwargs) -> None:
+    """Invalidate `user_cache` when the session's transaction commits.
+
+    Invalidating before the commit would let another request cache the old access again.
+
+    :param session: database session
+    :param kwargs: arguments for `UserCache.invalidate`. With none, the whole cache is cleared
+    """
+    if len(kwargs) == 0:
+        call_after_transaction(session, on_commit=user_cache.clear)
+    else:
+        call_after_transaction(session, on_commit=partial(user_cache.invalidate, **kwargs))
+
+
+def _to_uuid(value: uuid.UUID | str | None) -> uuid.UUID | None:
+    """Make a uuid from a string, leaving uuids and None as they are."""
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def _read_user_access(session: Session, email: str) -> UserAccess | None:
+    """Read a user's access from the database, with one query.
+
+    The user_locations table has the flattened user -> site group -> sites mapping.
+    """
+    query = session.query(
+        UserSQL.user_uuid,
+        UserSQL.location_group_uuid,
+        sa.func.coalesce(LocationGroupSQL.service_level, 0),
+        array_agg(UserLocationSQL.location_uuid),
+    )
+    query = query.join(
+        LocationGroupSQL,
+        LocationGroupSQL.location_group_uuid == UserSQL.location_group_uuid,
+    )
+    query = query.outerjoin(UserLocationSQL, UserLocationSQL.user_uuid == UserSQL.user_uuid)
+    query = query.filter(UserSQL.email == email)
+    query = query.group_by(
+        UserSQL.user_uuid,
+        UserSQL.location_group_uuid,
+        LocationGroupSQL.service_level,
+    )
+    row = query.first()
+
+    if row is None:
+        return None
+
+    user_uuid, location_group_uuid, service_level, location_uuids = row
+    return UserAccess(
+        user_uuid=user_uuid,
+        location_group_uuid=location_group_uuid,
+        service_level=service_level,
+        location_uuids=frozenset(u for u in location_uuids if u is not None),
+    )
@@ -0,0 +1,43 @@
+"""Run callbacks when a session's transaction commits or rolls back.
+
+The process level caches (e.g. `read.model`, `read.user_cache`) must only change once the
+transaction that changed the database commits. Rather than each cache adding its own
+listeners to every `Session` in the process, this module adds one pair of listeners, which
+only do something for sessions that have callbacks queued in `session.info`.
+"""
+
+from collections.abc import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_CALLBACKS_KEY = "pvsite_datamodel_transaction_callbacks"
+
+
+def call_after_transaction(
+    session: Session,
+    on_commit: Callable[[], None],
+    on_rollback: Callable[[], None] | None = None,
+) -> None:
+    """Call a function when the session's transaction commits, or another if it rolls back.
+
+    :param session: database session
+    :param on_commit: called after the transaction commits
+    :param on_rollback: optional, called after the transaction rolls back
+    """
+    session.info.setdefault(_CALLBACKS_KEY, []).append((on_commit, on_rollback))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    """Call the commit callbacks of a committed transaction."""
+    for on_commit, _ in session.info.pop(_CALLBACKS_KEY, []):
+        on_commit()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    """Call the rollback callbacks of a rolled back transaction."""
+    for _, on_rollback in session.info.pop(_CALLBACKS_KEY, []):
+        if on_rollback is not None:
+            on_rollback()
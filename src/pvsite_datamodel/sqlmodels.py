@@ -40,6 +40,17 @@ class MLModelSQL(Base, CreatedMixin):
 
     locations: Mapped[list[LocationSQL]] = relationship("LocationSQL", back_populates="ml_model")
 
+    __table_args__ = (
+        # One row per (name, version), this lets us create models with `ON CONFLICT DO NOTHING`.
+        # A NULL version is treated as its own value.
+        sa.Index(
+            "ix_ml_model_name_version",
+            "name",
+            sa.text("coalesce(version, '')"),
+            unique=True,
+        ),
+    )
+
 
 class UserSQL(Base, CreatedMixin):
     """Class representing the users table.
@@ -128,6 +139,95 @@ class LocationGroupLocationSQL(Base, CreatedMixin):
     )
 
 
+class UserLocationSQL(Base):
+    """Class representing the user_locations table.
+
+    Denormalized mapping of which locations each user can access, i.e. the flattened
+    `users -> location_groups -> location_group_locations` path.
+    It is maintained by database triggers on the `users` and `location_group_locations`
+    tables, so reads by user are a single index lookup.
+
+    *Approximate size: *
+    ~100 users * ~1000 locations each = ~100,000 rows
+    """
+
+    __tablename__ = "user_locations"
+
+    user_uuid = sa.Column(
+        UUID(as_uuid=True),
+        sa.ForeignKey("users.user_uuid", ondelete="CASCADE"),
+        primary_key=True,
+        comment="The user who can access the location",
+    )
+    location_uuid = sa.Column(
+        UUID(as_uuid=True),
+        sa.ForeignKey("locations.location_uuid", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+        comment="The location the user can access",
+    )
+
+
+# The triggers that fill user_locations, the same as in the aa017c8e61fb migration, so a
+# database made with `metadata.create_all` is kept in sync too. They are made once all the
+# tables exist, as they read and write tables other than the one they are on, and are
+# replaced if they exist, as create_all can be run on a database that already has them
+USER_LOCATIONS_TRIGGERS = """
+CREATE OR REPLACE FUNCTION sync_user_locations_from_location_group_locations()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') THEN
+        DELETE FROM user_locations ul
+        USING users u
+        WHERE ul.user_uuid = u.user_uuid
+          AND u.location_group_uuid = OLD.location_group_uuid
+          AND ul.location_uuid = OLD.location_uuid;
+    END IF;
+
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+        INSERT INTO user_locations (user_uuid, location_uuid)
+        SELECT u.user_uuid, NEW.location_uuid
+        FROM users u
+        WHERE u.location_group_uuid = NEW.location_group_uuid
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS location_group_locations_user_locations_trigger ON location_group_locations;
+CREATE TRIGGER location_group_locations_user_locations_trigger
+AFTER INSERT OR UPDATE OR DELETE ON location_group_locations
+FOR EACH ROW EXECUTE FUNCTION sync_user_locations_from_location_group_locations();
+CREATE OR REPLACE FUNCTION sync_user_locations_from_users()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'UPDATE') THEN
+        IF (NEW.location_group_uuid IS NOT DISTINCT FROM OLD.location_group_uuid) THEN
+            RETURN NULL;
+        END IF;
+        DELETE FROM user_locations WHERE user_uuid = OLD.user_uuid;
+    END IF;
+
+    INSERT INTO user_locations (user_uuid, location_uuid)
+    SELECT NEW.user_uuid, lgl.location_uuid
+    FROM location_group_locations lgl
+    WHERE lgl.location_group_uuid = NEW.location_group_uuid
+    ON CONFLICT DO NOTHING;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_user_locations_trigger ON users;
+CREATE TRIGGER users_user_locations_trigger
+AFTER INSERT OR UPDATE OF location_group_uuid ON users
+FOR EACH ROW EXECUTE FUNCTION sync_user_locations_from_users();
+"""
+sa.event.listen(Base.metadata, "after_create", sa.DDL(USER_LOCATIONS_TRIGGERS))
+
+
 class LocationLocationSQL(Base, CreatedMixin):
     """Class representing the location_locations table.
 
@@ -160,6 +260,101 @@ class LocationLocationSQL(Base, CreatedMixin):
     )
 
 
+class LocationClosureSQL(Base):
+    """Class representing the location_closure table.
+
+    Every (ancestor, descendant) pair of the `location_locations` hierarchy, with the
+    number of levels between them, so all the locations above or below a location can
+    be found with one index lookup. Where there are several paths, depth is the shortest.
+    It is maintained by a database trigger on the `location_locations` table.
+    """
+
+    __tablename__ = "location_closure"
+
+    ancestor_uuid = sa.Column(
+        UUID(as_uuid=True),
+        sa.ForeignKey("locations.location_uuid", ondelete="CASCADE"),
+        primary_key=True,
+        comment="The location higher up the hierarchy, e.g. a region",
+    )
+    descendant_uuid = sa.Column(
+        UUID(as_uuid=True),
+        sa.ForeignKey("locations.location_uuid", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+        comment="The location lower down the hierarchy, e.g. a site",
+    )
+    depth = sa.Column(
+        sa.Integer,
+        nullable=False,
+        comment="The number of levels between the locations, 1 for a direct child",
+    )
+
+
+# The trigger that fills location_closure, the same as in the e2b7f0c93d14 migration, so a
+# database made with `metadata.create_all` is kept in sync too. Note the child_locations
+# relationship stores the parent in location_child_uuid, and the hierarchy is read the same way
+LOCATION_CLOSURE_TRIGGER = """
+CREATE OR REPLACE FUNCTION refresh_location_closure(child_uuid UUID)
+RETURNS void AS $$
+DECLARE
+    affected UUID[];
+BEGIN
+    affected := ARRAY(
+        WITH RECURSIVE below(location_uuid, depth) AS (
+            SELECT child_uuid, 0
+            UNION
+            SELECT ll.location_parent_uuid, b.depth + 1
+            FROM location_locations ll
+            JOIN below b ON ll.location_child_uuid = b.location_uuid
+            WHERE b.depth < 100
+        )
+        SELECT DISTINCT location_uuid FROM below
+    );
+
+    DELETE FROM location_closure WHERE descendant_uuid = ANY(affected);
+
+    INSERT INTO location_closure (ancestor_uuid, descendant_uuid, depth)
+    WITH RECURSIVE paths(ancestor_uuid, descendant_uuid, depth) AS (
+        SELECT ll.location_child_uuid, ll.location_parent_uuid, 1
+        FROM location_locations ll
+        WHERE ll.location_parent_uuid = ANY(affected)
+        UNION
+        SELECT ll.location_child_uuid, p.descendant_uuid, p.depth + 1
+        FROM paths p
+        JOIN location_locations ll ON ll.location_parent_uuid = p.ancestor_uuid
+        WHERE p.depth < 100
+    )
+    SELECT ancestor_uuid, descendant_uuid, min(depth)
+    FROM paths
+    WHERE ancestor_uuid != descendant_uuid
+    GROUP BY ancestor_uuid, descendant_uuid;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_location_closure()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE' OR TG_OP = 'UPDATE') THEN
+        PERFORM refresh_location_closure(OLD.location_parent_uuid);
+    END IF;
+
+    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+        PERFORM refresh_location_closure(NEW.location_parent_uuid);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS location_locations_location_closure_trigger ON location_locations;
+CREATE TRIGGER location_locations_location_closure_trigger
+AFTER INSERT OR UPDATE OR DELETE ON location_locations
+FOR EACH ROW EXECUTE FUNCTION sync_location_closure();
+"""
+sa.event.listen(Base.metadata, "after_create", sa.DDL(LOCATION_CLOSURE_TRIGGER))
+
+
 class LocationAssetType(enum.Enum):
     """Enum type representing a location's asset type."""
 
@@ -167,6 +362,20 @@ class LocationAssetType(enum.Enum):
     wind = 2
 
 
+def _json_id_expression(column: str, key: str) -> str:
+    """Make the SQL to pull an integer id out of a json text column.
+
+    A regular expression is used rather than a json cast, so text that is not json gives
+    NULL rather than an error. Ids of more than 9 digits give NULL too, so the cast can't
+    overflow and stop the location being saved.
+
+    :param column: name of the json text column
+    :param key: the key of the id in the json
+    """
+    pattern = rf'"{key}"\s*:\s*"?([0-9]{{1,9}})(?![0-9])'
+    return f"CAST(substring({column} from '{pattern}') AS INTEGER)"
+
+
 class LocationType(enum.Enum):
     """Enum type representing a location's location type."""
 
@@ -174,6 +383,11 @@ class LocationType(enum.Enum):
     region = 2
 
 
+# Allocates location ml ids. Using a sequence means ids are never handed out twice,
+# even when several sites are made at the same time.
+ML_ID_SEQUENCE = sa.Sequence("locations_ml_id_seq", metadata=Base.metadata)
+
+
 class LocationSQL(Base, CreatedMixin):
     """Class representing the locations table.
 
@@ -187,6 +401,28 @@ class LocationSQL(Base, CreatedMixin):
     """
 
     __tablename__ = "locations"
+    __table_args__ = (
+        # GiST index of the location as a point, for bounding box, radius and nearest site
+        # queries. Postgres keeps it up to date on write, see `read/site.py`
+        sa.Index(
+            "ix_locations_point",
+            sa.text("point(longitude, latitude)"),
+            postgresql_using="gist",
+        ),
+        # sites by country and client, see `read.site.get_sites_by_country`
+        sa.Index("ix_locations_country_client_uuid", "country", "client_uuid"),
+        # GIN index of the metadata, for containment and jsonpath equality queries,
+        # see `read.site.get_sites_by_metadata`
+        sa.Index(
+            "ix_locations_location_metadata",
+            "location_metadata",
+            postgresql_using="gin",
+            postgresql_ops={"location_metadata": "jsonb_path_ops"},
+        ),
+        # There is also a trigram index, ix_locations_client_location_name_trgm, for substring
+        # searches of client_location_name. It needs the pg_trgm extension, so it is only
+        # made by the migration, and only if the extension is available.
+    )
 
     location_uuid = sa.Column(UUID(as_uuid=True), default=uuid.uuid4, primary_key=True)
     client_location_id = sa.Column(
@@ -221,7 +457,7 @@ class LocationSQL(Base, CreatedMixin):
 
     ml_id = sa.Column(
         sa.Integer,
-        autoincrement=True,
+        ML_ID_SEQUENCE,
         nullable=False,
         comment="Auto-incrementing integer ID of the location for use in ML training",
     )
@@ -271,6 +507,20 @@ class LocationSQL(Base, CreatedMixin):
         sa.String(255),
         comment="The Grid Supply Point in which the location is located",
     )
+    # the ids are pulled out of the dno and gsp json, so they can be indexed and grouped on,
+    # whatever the key order or names in the json. Postgres keeps them up to date
+    dno_id = sa.Column(
+        sa.Integer,
+        sa.Computed(_json_id_expression("dno", "dno_id")),
+        index=True,
+        comment="The id of the Distribution Node Operator, from the dno column",
+    )
+    gsp_id = sa.Column(
+        sa.Integer,
+        sa.Computed(_json_id_expression("gsp", "gsp_id")),
+        index=True,
+        comment="The id of the Grid Supply Point, from the gsp column",
+    )
     # For metadata `NULL` means "we don't know".
     orientation = sa.Column(
         sa.Float,
@@ -313,6 +563,20 @@ class LocationSQL(Base, CreatedMixin):
     )
 
 
+# The sequence is owned by ml_id and is its server default, as the migrations make it, so
+# inserts that don't go through the models get an ml_id too. It is not declared as the
+# column's server_default, as alembic reflects a column with its own sequence as a serial
+# column without a default, and autogenerate would always see it as changed
+sa.event.listen(
+    LocationSQL.__table__,
+    "after_create",
+    sa.DDL(
+        f"ALTER SEQUENCE {ML_ID_SEQUENCE.name} OWNED BY locations.ml_id; "
+        f"ALTER TABLE locations ALTER COLUMN ml_id SET DEFAULT nextval('{ML_ID_SEQUENCE.name}')"
+    ),
+)
+
+
 class LocationHistorySQL(Base, CreatedMixin):
     """Class representing the locations history table.
 
@@ -490,10 +754,11 @@ class ForecastValueSQL(Base, CreatedMixin):
 
     # This is the different between `start_utc` and the `forecast`'s `timestamp_utc`, in minutes.
     # It's useful to have it in its own column to efficiently query forecasts for a given horizon.
+    # It is null if it wasn't computed. Values saved before the column was nullable have -1
+    # instead, see `write.forecast.backfill_horizon_minutes`
     horizon_minutes = sa.Column(
         sa.Integer,
-        nullable=False,
-        server_default=sa.text("-1"),
+        nullable=True,
         comment=(
             "The time difference between the creation time of the forecast value "
             "and the start of the time interval it applies for"
@@ -533,6 +798,13 @@ class ForecastValueSQL(Base, CreatedMixin):
             "forecast_uuid",
             "horizon_minutes",
         ),
+        # the few forecasts with horizon minutes to backfill. -1 was the default before
+        # the column was nullable
+        sa.Index(
+            "ix_forecast_values_forecast_uuid_horizon_minutes_missing",
+            "forecast_uuid",
+            postgresql_where=sa.text("horizon_minutes IS NULL OR horizon_minutes = -1"),
+        ),
     )
 
 
@@ -577,12 +849,99 @@ class InverterSQL(Base, CreatedMixin):
 
 
 class APIRequestSQL(Base, CreatedMixin):
-    """Information about what API route was called."""
+    """Information about what API route was called.
+
+    The table is partitioned by month of created_utc, so old months can be dropped,
+    and queries over a time range only read those months. See `write.partitions`.
+    """
 
     __tablename__ = "api_request"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_utc)"}
 
     uuid = sa.Column(UUID, primary_key=True, server_default=sa.func.gen_random_uuid())
     url = sa.Column(sa.String)
 
-    user_uuid = sa.Column(UUID, sa.ForeignKey("users.user_uuid"), index=True)
+    # the partition key has to be in the primary key
+    created_utc = sa.Column(
+        sa.DateTime,
+        default=lambda: datetime.now(tz=timezone.utc),
+        primary_key=True,
+    )
+
+    user_uuid = sa.Column(UUID, sa.ForeignKey("users.user_uuid"))
     user = relationship("UserSQL", back_populates="api_request")
+
+
+# a user's requests, newest first, see `read.user.get_api_requests_for_one_user`
+sa.Index(
+    "ix_api_request_user_uuid_created_utc",
+    APIRequestSQL.user_uuid,
+    APIRequestSQL.created_utc.desc(),
+)
+
+# rows need a partition to go in. The migrations make the monthly partitions too, but with
+# `metadata.create_all` every row goes in the default partition until
+# `write.partitions.create_api_request_partitions` is run
+sa.event.listen(
+    APIRequestSQL.__table__,
+    "after_create",
+    sa.DDL("CREATE TABLE api_request_default PARTITION OF api_request DEFAULT"),
+)
+
+
+class UserLastAPIRequestSQL(Base):
+    """The last API request of each user.
+
+    A small summary of api_request, so the last request of every user is one row each,
+    rather than a scan of all the requests. It is maintained by a statement level trigger
+    on api_request, so a batch insert of requests is one upsert.
+    """
+
+    __tablename__ = "user_last_api_request"
+
+    user_uuid = sa.Column(
+        UUID(as_uuid=True),
+        sa.ForeignKey("users.user_uuid", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    api_request_uuid = sa.Column(
+        UUID(as_uuid=True),
+        nullable=False,
+        comment="The uuid of the last request in api_request",
+    )
+    created_utc = sa.Column(
+        sa.DateTime,
+        nullable=False,
+        index=True,
+        comment="The time of the last request",
+    )
+    url = sa.Column(sa.String, comment="The url of the last request")
+
+
+# The trigger that fills user_last_api_request, the same as in the c3f8d2a6e4b1 migration, so
+# a database made with `metadata.create_all` is kept in sync too
+USER_LAST_API_REQUEST_TRIGGER = """
+CREATE OR REPLACE FUNCTION sync_user_last_api_request()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_last_api_request (user_uuid, api_request_uuid, created_utc, url)
+    SELECT DISTINCT ON (user_uuid) user_uuid, uuid, created_utc, url
+    FROM new_api_requests
+    WHERE user_uuid IS NOT NULL
+    ORDER BY user_uuid, created_utc DESC
+    ON CONFLICT (user_uuid) DO UPDATE
+    SET api_request_uuid = EXCLUDED.api_request_uuid,
+        created_utc = EXCLUDED.created_utc,
+        url = EXCLUDED.url
+    WHERE EXCLUDED.created_utc >= user_last_api_request.created_utc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS api_request_user_last_api_request_trigger ON api_request;
+CREATE TRIGGER api_request_user_last_api_request_trigger
+AFTER INSERT ON api_request
+REFERENCING NEW TABLE AS new_api_requests
+FOR EACH STATEMENT EXECUTE FUNCTION sync_user_last_api_request();
+"""
+sa.event.listen(Base.metadata, "after_create", sa.DDL(USER_LAST_API_REQUEST_TRIGGER))
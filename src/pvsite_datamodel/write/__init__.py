@@ -2,13 +2,22 @@
 Functions for writing to the PVSite database
 """
 
+from .access import rebuild_user_location_access, verify_user_location_access
+from .api_request_logger import APIRequestLogger
+from .batch_writer import BatchWriter
 from .client import assign_site_to_client, create_client, edit_client
-from .forecast import insert_forecast_values
+from .database import rebuild_last_api_requests, save_api_call_to_db
+from .forecast import backfill_horizon_minutes, insert_forecast_values, insert_forecasts_bulk
 from .generation import insert_generation_values
+from .hierarchy import rebuild_location_closure, verify_location_closure
+from .partitions import create_api_request_partitions, drop_old_api_request_partitions
 from .user_and_site import (
     add_site_to_site_group,
     change_user_site_group,
     create_site,
+    allocate_ml_ids,
+    advance_ml_id_sequence,
+    create_sites_bulk,
     create_site_group,
     create_user,
     delete_site,
@@ -0,0 +1,67 @@
+"""Tools for maintaining the user_locations access table.
+
+The table is kept up to date by database triggers, these functions are for
+checking and repairing it, e.g. after a manual data fix.
+"""
+
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.read.user_cache import invalidate_user_cache_on_commit
+from pvsite_datamodel.sqlmodels import LocationGroupLocationSQL, UserLocationSQL, UserSQL
+
+logger = logging.getLogger(__name__)
+
+
+def _expected_user_locations() -> sa.Select:
+    """Select the (user_uuid, location_uuid) pairs derived from the site groups."""
+    return sa.select(UserSQL.user_uuid, LocationGroupLocationSQL.location_uuid).join(
+        LocationGroupLocationSQL,
+        LocationGroupLocationSQL.location_group_uuid == UserSQL.location_group_uuid,
+    )
+
+
+def verify_user_location_access(session: Session) -> dict[str, list[tuple]]:
+    """Compare the user_locations table with the site groups.
+
+    :param session: database session
+    :return: dict with "missing" and "extra" lists of (user_uuid, location_uuid) pairs
+    """
+    expected = _expected_user_locations()
+    actual = sa.select(UserLocationSQL.user_uuid, UserLocationSQL.location_uuid)
+
+    missing = session.execute(expected.except_(actual)).all()
+    extra = session.execute(actual.except_(expected)).all()
+
+    logger.info(f"Found {len(missing)} missing and {len(extra)} extra user location rows")
+
+    return {
+        "missing": [tuple(row) for row in missing],
+        "extra": [tuple(row) for row in extra],
+    }
+
+
+def rebuild_user_location_access(session: Session) -> int:
+    """Rebuild the user_locations table from the site groups.
+
+    :param session: database session
+    :return: the number of rows in the rebuilt table
+    """
+    session.execute(sa.delete(UserLocationSQL))
+
+    stmt = sa.insert(UserLocationSQL).from_select(
+        ["user_uuid", "location_uuid"],
+        _expected_user_locations(),
+    )
+    session.execute(stmt)
+
+    n_rows = session.query(UserLocationSQL).count()
+    # any user's access may have changed
+    invalidate_user_cache_on_commit(session)
+    session.commit()
+
+    logger.info(f"Rebuilt user_locations table with {n_rows} rows")
+
+    return n_rows
@@ -0,0 +1,149 @@
+"""Background logger that batches API request inserts.
+
+`save_api_call_to_db` looks up the user and commits inside every API call. The logger
+instead puts the request on an in memory queue and returns straight away, and a background
+thread writes the queued requests with one multi-row insert, when enough have built up,
+after a time limit, and when the logger is stopped.
+
+Logging API requests should never slow down or fail the request itself, so the loss is
+bounded rather than pushed back on the caller, like `BatchWriter` does. When the queue is
+full, or the logger is stopped, new requests are dropped. When a batch fails to write, e.g.
+as one request has a user that doesn't exist, it is split in half and written again, so
+only the requests that fail are dropped. Both are counted in `metrics`.
+
+Example:
+    connection = DatabaseConnection(url=url)
+    api_request_logger = APIRequestLogger(session_factory=connection.get_session)
+    api_request_logger.start()
+    api_request_logger.log(url=str(request.url), user_uuid=user.user_uuid)
+    ...
+    api_request_logger.stop()
+"""
+
+import atexit
+import logging
+import queue
+from collections.abc import Callable
+from datetime import UTC, datetime
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.read.user import get_user_by_email
+from pvsite_datamodel.sqlmodels import APIRequestSQL
+from pvsite_datamodel.write.batching import BackgroundBatcher
+
+logger = logging.getLogger(__name__)
+
+# requests with no user are saved against this user, the same as `save_api_call_to_db`
+UNKNOWN_USER_EMAIL = "unknown"
+
+
+class APIRequestLogger(BackgroundBatcher):
+    """Save API requests to the database in batches, on a background thread.
+
+    As well as the `BackgroundBatcher` metrics, `metrics` counts the requests dropped as
+    the queue was full, in "n_dropped_queue_full".
+    """
+
+    thread_name = "pvsite-api-request-logger"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue_size: int = 10_000,
+        max_batch_size: int = 500,
+        max_batch_seconds: float = 1.0,
+    ) -> None:
+        """Set up the logger.
+
+        :param session_factory: function that returns a new database session
+        :param max_queue_size: maximum number of requests waiting to be written.
+            Requests logged when the queue is full are dropped.
+        :param max_batch_size: maximum number of requests written in one insert
+        :param max_batch_seconds: maximum time to wait for a batch to fill up
+        """
+        super().__init__(
+            session_factory=session_factory,
+            max_queue_size=max_queue_size,
+            max_batch_size=max_batch_size,
+            max_batch_seconds=max_batch_seconds,
+        )
+        self._unknown_user_uuid: UUID | None = None
+        self._metrics["n_dropped_queue_full"] = 0
+
+    def start(self) -> None:
+        """Start the background thread.
+
+        The logger is also stopped when the interpreter exits, so queued requests are written.
+        """
+        super().start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Write everything still in the queue, then stop the background thread.
+
+        :param timeout: how long to wait for the thread to finish
+        """
+        super().stop(timeout=timeout)
+        atexit.unregister(self.stop)
+
+    def log(self, url: str, user_uuid: UUID | str | None = None) -> bool:
+        """Queue an API request to be saved. This never blocks.
+
+        :param url: the url that was called
+        :param user_uuid: the user that called it. None saves it against the "unknown" user
+        :return: True if the request was queued, False if it was dropped as the queue is full
+            or the logger is stopped
+        """
+        # nothing would write it
+        if self._stop_event.is_set():
+            self._count("n_dropped_stopped")
+            return False
+
+        try:
+            self._queue.put_nowait((str(url), user_uuid, datetime.now(tz=UTC)))
+        except queue.Full:
+            self._count("n_dropped_queue_full")
+            return False
+        return True
+
+    def _write_batch(self, batch: list[tuple]) -> int:
+        """Write one batch to the database, with one insert.
+
+        If the insert fails on a constraint, the batch is split in half and written again, so
+        only the bad requests are dropped.
+        """
+        rows = self._rows(batch)
+        if rows is None:
+            return 0
+        return self._write_split(_insert_api_requests, rows, split_on=sa.exc.IntegrityError)
+
+    def _rows(self, batch: list[tuple]) -> list[dict] | None:
+        """Make the rows to insert, or None if the unknown user can't be got."""
+        # the unknown user is only looked up once
+        if self._unknown_user_uuid is None and any(u is None for _, u, _ in batch):
+            session = self.session_factory()
+            try:
+                user = get_user_by_email(session=session, email=UNKNOWN_USER_EMAIL)
+                session.commit()
+                self._unknown_user_uuid = user.user_uuid
+            except Exception:
+                logger.exception("Failed to get the unknown user")
+                session.rollback()
+                return None
+            finally:
+                session.close()
+
+        rows = []
+        for url, user_uuid, created_utc in batch:
+            if user_uuid is None:
+                user_uuid = self._unknown_user_uuid
+            rows.append({"url": url, "user_uuid": user_uuid, "created_utc": created_utc})
+        return rows
+
+
+def _insert_api_requests(session: Session, rows: list[dict]) -> None:
+    """Insert API request rows with one multi-row insert."""
+    session.execute(sa.insert(APIRequestSQL), rows)
@@ -0,0 +1,137 @@
+"""Background writer that batches generation and forecast inserts.
+
+API endpoints can hand data to the writer and return straight away, rather than waiting on
+the database. The writer collects what it is given into batches, bounded by size and time,
+and writes each batch with the bulk write functions.
+
+Example:
+    connection = DatabaseConnection(url=url)
+    writer = BatchWriter(session_factory=connection.get_session)
+    writer.start()
+    writer.submit_generation(generation_df)
+    ...
+    writer.stop()
+"""
+
+from collections.abc import Callable
+from functools import partial
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.write.batching import BackgroundBatcher
+from pvsite_datamodel.write.forecast import insert_forecasts_bulk
+from pvsite_datamodel.write.generation import insert_generation_values
+
+GENERATION = "generation"
+FORECAST = "forecast"
+
+
+class BatchWriter(BackgroundBatcher):
+    """Write generation and forecasts to the database in batches, on a background thread.
+
+    The queue is bounded, so if the database falls behind, `submit_*` blocks for up to
+    `put_timeout` seconds and then raises `queue.Full`. This pushes back on the callers,
+    rather than holding an ever growing backlog in memory.
+
+    `submit_*` raise a `RuntimeError` if the writer is not running, as nothing would write
+    what they were given.
+    """
+
+    thread_name = "pvsite-batch-writer"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue_size: int = 1000,
+        max_batch_size: int = 200,
+        max_batch_seconds: float = 1.0,
+        put_timeout: float | None = 5.0,
+    ) -> None:
+        """Set up the writer.
+
+        :param session_factory: function that returns a new database session
+        :param max_queue_size: maximum number of items waiting to be written
+        :param max_batch_size: maximum number of items written in one batch
+        :param max_batch_seconds: maximum time to wait for a batch to fill up
+        :param put_timeout: how long `submit_*` waits for space in the queue.
+            None waits forever.
+        """
+        super().__init__(
+            session_factory=session_factory,
+            max_queue_size=max_queue_size,
+            max_batch_size=max_batch_size,
+            max_batch_seconds=max_batch_seconds,
+        )
+        self.put_timeout = put_timeout
+
+    def submit_generation(self, df: pd.DataFrame) -> None:
+        """Queue a dataframe of generation values, see `insert_generation_values`.
+
+        :param df: dataframe with the data to insert
+        """
+        self._put((GENERATION, df))
+
+    def submit_forecast(
+        self,
+        forecast_meta: dict,
+        forecast_values_df: pd.DataFrame,
+        ml_model_name: str | None = None,
+        ml_model_version: str | None = None,
+    ) -> None:
+        """Queue a forecast, see `insert_forecast_values`.
+
+        :param forecast_meta: Meta info about the forecast values
+        :param forecast_values_df: dataframe with the data to insert
+        :param ml_model_name: name of the ML model used to generate the forecast
+        :param ml_model_version: version of the ML model used to generate the forecast
+        """
+        item = (forecast_meta, forecast_values_df, ml_model_name, ml_model_version)
+        self._put((FORECAST, item))
+
+    def _put(self, item: tuple) -> None:
+        """Queue an item, if the writer is running."""
+        if not self.is_running():
+            self._count("n_dropped_stopped")
+            raise RuntimeError("BatchWriter is not running, call start() first")
+        self._queue.put(item, timeout=self.put_timeout)
+
+    def _write_batch(self, batch: list[tuple]) -> int:
+        """Write one batch to the database.
+
+        The generation, and the forecasts of each model, are each written in one transaction.
+        If a transaction fails, its items are split in half and written again, so a bad item
+        only drops itself, not the rest of the batch.
+        """
+        generation_dfs = [_rename_site_uuid(item) for kind, item in batch if kind == GENERATION]
+
+        # forecasts are written together if they use the same model
+        forecasts_by_model: dict[tuple, list] = {}
+        for kind, item in batch:
+            if kind == FORECAST:
+                forecast_meta, forecast_values_df, ml_model_name, ml_model_version = item
+                forecasts_by_model.setdefault((ml_model_name, ml_model_version), []).append(
+                    (forecast_meta, forecast_values_df),
+                )
+
+        n_written = self._write_split(_write_generation, generation_dfs)
+        for (ml_model_name, ml_model_version), forecasts in forecasts_by_model.items():
+            write_forecasts = partial(
+                insert_forecasts_bulk,
+                ml_model_name=ml_model_name,
+                ml_model_version=ml_model_version,
+            )
+            n_written += self._write_split(write_forecasts, forecasts)
+        return n_written
+
+
+def _rename_site_uuid(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename site_uuid to location_uuid, so generation dataframes can be joined."""
+    if "site_uuid" in df.columns and "location_uuid" not in df.columns:
+        df = df.rename(columns={"site_uuid": "location_uuid"})
+    return df
+
+
+def _write_generation(session: Session, generation_dfs: list[pd.DataFrame]) -> None:
+    """Write generation dataframes with one insert."""
+    insert_generation_values(session, pd.concat(generation_dfs, ignore_index=True))
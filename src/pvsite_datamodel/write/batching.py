@@ -0,0 +1,206 @@
+"""Base class for writers that batch up queued items and write them on a background thread.
+
+Items are put on a bounded in memory queue by the subclass, e.g. `BatchWriter.submit_*` and
+`APIRequestLogger.log`. A background thread collects them into batches, bounded by size and
+time, and hands each batch to the subclass's `_write_batch`. When stopped, everything still
+in the queue is written before the thread finishes.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundBatcher:
+    """Collect queued items into batches, and write them on a background thread.
+
+    Subclasses put items on `self._queue`, and implement `_write_batch`.
+    """
+
+    thread_name = "pvsite-background-batcher"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue_size: int,
+        max_batch_size: int,
+        max_batch_seconds: float,
+    ) -> None:
+        """Set up the queue and metrics.
+
+        :param session_factory: function that returns a new database session
+        :param max_queue_size: maximum number of items waiting to be written
+        :param max_batch_size: maximum number of items written in one batch
+        :param max_batch_seconds: maximum time to wait for a batch to fill up
+        """
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_batch_seconds = max_batch_seconds
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "n_batches": 0,
+            "n_written": 0,
+            "n_dropped_stopped": 0,
+            "n_dropped_errors": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+        }
+
+    def start(self) -> None:
+        """Start the background thread."""
+        if self.is_running():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Write everything still in the queue, then stop the background thread.
+
+        :param timeout: how long to wait for the thread to finish
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        """Whether the background thread is running, and not stopping."""
+        return (
+            self._thread is not None
+            and self._thread.is_alive()
+            and not self._stop_event.is_set()
+        )
+
+    def __enter__(self):
+        """Start the background thread."""
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stop the background thread."""
+        self.stop()
+
+    def metrics(self) -> dict:
+        """Get the metrics.
+
+        :return: dict of queue depth, number of batches, items written, items dropped as
+            they were given while stopped or failed to write, and the last and max flush
+            time in seconds. Subclasses may add more.
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue_depth"] = self._queue.qsize()
+        return metrics
+
+    def _count(self, metric: str, n: int = 1) -> None:
+        """Add to a metric."""
+        with self._metrics_lock:
+            self._metrics[metric] += n
+
+    def _write_batch(self, batch: list) -> int:
+        """Write one batch to the database.
+
+        :param batch: items from the queue
+        :return: the number of items written. The rest are counted as dropped
+        """
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        """Collect and write batches until stopped and the queue is empty."""
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if len(batch) > 0:
+                self._flush(batch)
+
+    def _collect_batch(self) -> list:
+        """Get items from the queue, until the batch is full or the time is up."""
+        batch = []
+        deadline = time.monotonic() + self.max_batch_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list) -> None:
+        """Write one batch, and record it in the metrics."""
+        start = time.monotonic()
+        try:
+            n_written = self._write_batch(batch)
+        except Exception:
+            logger.exception(f"Failed to write batch of {len(batch)} items")
+            n_written = 0
+
+        if n_written < len(batch):
+            logger.warning(f"Dropped {len(batch) - n_written} of {len(batch)} items")
+
+        flush_seconds = time.monotonic() - start
+        with self._metrics_lock:
+            self._metrics["n_batches"] += 1
+            self._metrics["n_written"] += n_written
+            self._metrics["n_dropped_errors"] += len(batch) - n_written
+            self._metrics["last_flush_seconds"] = flush_seconds
+            self._metrics["max_flush_seconds"] = max(
+                self._metrics["max_flush_seconds"],
+                flush_seconds,
+            )
+
+        logger.debug(f"Wrote batch of {len(batch)} items in {flush_seconds:.3f} seconds")
+
+    def _write_split(
+        self,
+        write: Callable[[Session, list], None],
+        items: list,
+        split_on: type[Exception] | tuple[type[Exception], ...] = Exception,
+    ) -> int:
+        """Write items in one transaction, splitting them in half if it fails.
+
+        So a bad item only drops itself, not the rest of the items.
+
+        :param write: function that writes a list of items with a session
+        :param items: the items to write
+        :param split_on: the errors to split the items on. Other errors drop all the items
+        :return: number of items written
+        """
+        if len(items) == 0:
+            return 0
+
+        session = self.session_factory()
+        try:
+            write(session, items)
+            session.commit()
+        except split_on:
+            session.rollback()
+            if len(items) == 1:
+                logger.exception("Failed to write item, dropping it")
+                return 0
+        except Exception:
+            session.rollback()
+            logger.exception(f"Failed to write {len(items)} items, dropping them")
+            return 0
+        else:
+            return len(items)
+        finally:
+            session.close()
+
+        middle = len(items) // 2
+        n_written = self._write_split(write, items[:middle], split_on)
+        n_written += self._write_split(write, items[middle:], split_on)
+        return n_written
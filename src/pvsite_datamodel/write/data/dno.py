@@ -13,17 +13,14 @@ and we want to added the gsp as {gsp_id}|{gsp_nam} into the database
 import logging
 import os
 
-from pvsite_datamodel.write.data.utils import lat_lon_to_osgb
+import pandas as pd
 
-try:
-    import geopandas as gpd
-    from shapely.geometry import Point
-except ImportError:
-    print("You might want to install geopandas")  # noqa
+from pvsite_datamodel.write.data.utils import Regions
 
 logger = logging.getLogger(__name__)
 dir_path = os.path.dirname(os.path.realpath(__file__))
 dno_local_file = f"{dir_path}/dno"
+dno_regions = Regions(dno_local_file)
 
 
 def get_dno(latitude: float, longitude: float) -> dict:
@@ -34,21 +31,11 @@ def get_dno(latitude: float, longitude: float) -> dict:
 
     :return: dno is this format {"dno_id": dno_id, "name": dno_name, "long_name": dno_long_name}=
     """
-    # load file
-    dno = gpd.read_file(dno_local_file)
-
-    # change lat lon to osgb
-    x, y = lat_lon_to_osgb(lat=latitude, lon=longitude)
-    point = Point(x, y)
-
     # select dno
-    mask = dno.contains(point)
-    dno = dno[mask]
+    dno = dno_regions.find(latitude=latitude, longitude=longitude)
 
     # format dno
-    if len(dno) == 1:
-        dno = dno.iloc[0]
-
+    if dno is not None:
         dno_id = dno["ID"]
         name = dno["Name"]
         long_name = dno["LongName"]
@@ -61,4 +48,30 @@ def get_dno(latitude: float, longitude: float) -> dict:
     return dno_dict
 
 
-#
+def get_dno_many(latitudes, longitudes) -> pd.DataFrame:
+    """Get the DNOs for many latitudes and longitudes at once.
+
+    All the points are projected at once and found with one query of the spatial index,
+    see `Regions.find_many`.
+
+    :param latitudes: list or array of latitudes
+    :param longitudes: list or array of longitudes
+
+    :return: dataframe with columns "dno_id", "name" and "long_name", one row per point,
+        in the same order. Points not in exactly one DNO get dno_id "999" and name "unknown"
+    """
+    dno, _ = dno_regions.load()
+    index = dno_regions.find_many(latitudes=latitudes, longitudes=longitudes)
+
+    # format dno
+    known = index != -1
+    dno_df = pd.DataFrame(
+        {"dno_id": "999", "name": "unknown", "long_name": "unknown"},
+        index=range(len(index)),
+    )
+    dno_details = dno.iloc[index[known]]
+    dno_df.loc[known, "dno_id"] = dno_details["ID"].astype(int).astype(str).to_numpy()
+    dno_df.loc[known, "name"] = dno_details["Name"].to_numpy()
+    dno_df.loc[known, "long_name"] = dno_details["LongName"].to_numpy()
+
+    return dno_df
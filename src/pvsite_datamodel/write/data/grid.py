@@ -0,0 +1,214 @@
+"""Precomputed raster grid of regions, for constant time region lookups.
+
+The OSGB plane is split into square cells, and each cell stores the row number of the
+region it is completely inside. Cells that cross a region boundary are marked, and points
+in them fall back to the exact polygon test, so lookups give the same answer as the
+polygons, apart from points exactly on a boundary.
+
+The grid is saved as a .npy file, with a .json file of its origin, cell size and a hash
+of the region geometries it was made from, and is memory mapped when loaded, so processes
+on the same machine share one copy.
+
+Example:
+    regions, _ = dno_regions.load()
+    grid = RegionGrid.build(regions, cell_size=250)
+    grid.save(f"{dno_local_file}_grid")
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# cell values, other than region row numbers
+OUTSIDE = -1
+BOUNDARY = -2
+
+
+def hash_regions(regions) -> str:
+    """Hash the region geometries, in order, so a grid can be checked against them.
+
+    :param regions: geodataframe of the regions
+    :return: hex sha256 of the geometries' WKB
+    """
+    import shapely
+
+    digest = hashlib.sha256()
+    for wkb in shapely.to_wkb(regions.geometry.values):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+class RegionGrid:
+    """Raster of region row numbers, on the OSGB plane."""
+
+    def __init__(
+        self,
+        cells: np.ndarray,
+        x0: float,
+        y0: float,
+        cell_size: float,
+        n_regions: int,
+        regions_hash: str | None = None,
+    ) -> None:
+        """Init.
+
+        :param cells: 2d array of region row numbers, indexed by [y, x],
+            with OUTSIDE for cells outside all regions, and BOUNDARY for cells on a boundary
+        :param x0: OSGB x of the left edge of the grid
+        :param y0: OSGB y of the bottom edge of the grid
+        :param cell_size: width and height of the cells in meters
+        :param n_regions: number of regions the grid was made from
+        :param regions_hash: `hash_regions` of the regions the grid was made from.
+            None for grids saved before it was stored
+        """
+        self.cells = cells
+        self.x0 = x0
+        self.y0 = y0
+        self.cell_size = cell_size
+        self.n_regions = n_regions
+        self.regions_hash = regions_hash
+
+    @classmethod
+    def build(
+        cls,
+        regions,
+        cell_size: float = 250.0,
+        tile_cells: int = 64,
+    ) -> "RegionGrid":
+        """Make the grid from region polygons.
+
+        Tiles of cells are classified against the polygons, and tiles that are not inside
+        one region or outside all of them are split into quarters, down to single cells.
+        Only the area near the boundaries is looked at cell by cell.
+
+        :param regions: geodataframe of the regions, in OSGB
+        :param cell_size: width and height of the cells in meters
+        :param tile_cells: width of the starting tiles, in cells. Must be a power of 2
+        :return: the grid
+        """
+        import shapely
+
+        geometries = regions.geometry.values
+        x_min, y_min, x_max, y_max = regions.total_bounds
+        nx = int(np.ceil((x_max - x_min) / cell_size))
+        ny = int(np.ceil((y_max - y_min) / cell_size))
+        cells = np.full((ny, nx), OUTSIDE, dtype=np.int16)
+
+        # the starting tiles, as the cell index of their bottom left corner
+        iy, ix = np.meshgrid(
+            np.arange(0, ny, tile_cells),
+            np.arange(0, nx, tile_cells),
+            indexing="ij",
+        )
+        iy, ix = iy.ravel(), ix.ravel()
+        size = tile_cells
+
+        while len(iy) > 0:
+            boxes = shapely.box(
+                x_min + ix * cell_size,
+                y_min + iy * cell_size,
+                x_min + (ix + size) * cell_size,
+                y_min + (iy + size) * cell_size,
+            )
+
+            # query with the regions, rather than the boxes, so each region's polygon is
+            # prepared once, which is much quicker for detailed polygons
+            box_tree = shapely.STRtree(boxes)
+            region_index, box_index = box_tree.query(geometries, predicate="contains")
+            n_within = np.bincount(box_index, minlength=len(boxes))
+            _, box_index_any = box_tree.query(geometries, predicate="intersects")
+            n_intersects = np.bincount(box_index_any, minlength=len(boxes))
+
+            value = np.full(len(boxes), BOUNDARY, dtype=np.int16)
+            value[n_intersects == 0] = OUTSIDE
+            # a box in one region, but touching others, is checked cell by cell
+            inside_one = (n_within == 1) & (n_intersects == 1)
+            value[box_index[inside_one[box_index]]] = region_index[inside_one[box_index]]
+            # inside more than one region, so never exactly one
+            value[n_within > 1] = OUTSIDE
+
+            done = value != BOUNDARY
+            if size == 1:
+                done[:] = True
+
+            for i in np.flatnonzero(done):
+                cells[iy[i] : iy[i] + size, ix[i] : ix[i] + size] = value[i]
+
+            # split the rest into quarters
+            iy, ix = iy[~done], ix[~done]
+            size //= 2
+            iy = np.concatenate([iy, iy, iy + size, iy + size])
+            ix = np.concatenate([ix, ix + size, ix, ix + size])
+            keep = (iy < ny) & (ix < nx)
+            iy, ix = iy[keep], ix[keep]
+
+        logger.debug(
+            f"Made region grid of {nx} x {ny} cells, "
+            f"{(cells == BOUNDARY).sum()} of them on a boundary"
+        )
+
+        return cls(
+            cells=cells,
+            x0=float(x_min),
+            y0=float(y_min),
+            cell_size=cell_size,
+            n_regions=len(regions),
+            regions_hash=hash_regions(regions),
+        )
+
+    def save(self, path: str) -> None:
+        """Save the grid to {path}.npy and {path}.json.
+
+        :param path: path of the files, without an extension
+        """
+        np.save(f"{path}.npy", self.cells)
+        with open(f"{path}.json", "w") as f:
+            json.dump(
+                {
+                    "x0": self.x0,
+                    "y0": self.y0,
+                    "cell_size": self.cell_size,
+                    "n_regions": self.n_regions,
+                    "regions_hash": self.regions_hash,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RegionGrid | None":
+        """Load a grid saved with `save`, memory mapping the cells.
+
+        :param path: path of the files, without an extension
+        :return: the grid, or None if there is no grid saved at the path
+        """
+        if not (os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")):
+            return None
+
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        cells = np.load(f"{path}.npy", mmap_mode="r")
+
+        return cls(cells=cells, **meta)
+
+    def lookup(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Get the cell values for OSGB coordinates.
+
+        :param x: array of OSGB x
+        :param y: array of OSGB y
+        :return: array of region row numbers, OUTSIDE or BOUNDARY
+        """
+        ny, nx = self.cells.shape
+        ix = np.floor((np.asarray(x) - self.x0) / self.cell_size)
+        iy = np.floor((np.asarray(y) - self.y0) / self.cell_size)
+
+        # nan coordinates are not in the grid either
+        in_grid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+        values = np.full(len(ix), OUTSIDE, dtype=np.int64)
+        values[in_grid] = self.cells[iy[in_grid].astype(int), ix[in_grid].astype(int)]
+        return values
@@ -2,22 +2,39 @@
 
 import logging
 import os
+import warnings
+from functools import cache
 
 import pandas as pd
 
-from pvsite_datamodel.write.data.utils import lat_lon_to_osgb
-
-try:
-    import geopandas as gpd
-    from shapely.geometry import Point
-except ImportError:
-    print("You might want to install geopandas")  # noqa
+from pvsite_datamodel.write.data.utils import Regions
 
 logger = logging.getLogger(__name__)
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 gsp_local_file = f"{dir_path}/gsp"
-gsp_names = pd.read_csv(f"{dir_path}/gsp_new_ids_and_names-edited.csv")
+gsp_regions = Regions(gsp_local_file)
+
+
+@cache
+def get_gsp_names() -> pd.DataFrame:
+    """Get the GSP ids and region names, indexed by GSP id.
+
+    The csv is read the first time it is needed, not when this module is imported.
+    """
+    return pd.read_csv(f"{dir_path}/gsp_new_ids_and_names-edited.csv")
+
+
+def __getattr__(name: str):
+    """Keep `gsp_names` working, now that the csv isn't read at import time."""
+    if name == "gsp_names":
+        warnings.warn(
+            "gsp.gsp_names is deprecated, use gsp.get_gsp_names() instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return get_gsp_names()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_gsp(latitude: float, longitude: float) -> dict:
@@ -28,20 +45,12 @@ def get_gsp(latitude: float, longitude: float) -> dict:
 
     :return: dno is this format {"dno_id": dno_id, "name": dno_name, "long_name": dno_long_name}=
     """
-    # load file
-    gsp = gpd.read_file(gsp_local_file)
-
-    # change lat lon to osgb
-    x, y = lat_lon_to_osgb(lat=latitude, lon=longitude)
-    point = Point(x, y)
-
     # select gsp
-    mask = gsp.contains(point)
-    gsp = gsp[mask]
+    gsp = gsp_regions.find(latitude=latitude, longitude=longitude)
 
     # format gsp
-    if len(gsp) == 1:
-        gsp = gsp.iloc[0]
+    if gsp is not None:
+        gsp_names = get_gsp_names()
         gsp_details = gsp_names[gsp_names["gsp_name"] == gsp.GSPs]
         gsp_id = gsp_details.index[0]
         gsp_details = gsp_details.iloc[0]
@@ -52,3 +61,31 @@ def get_gsp(latitude: float, longitude: float) -> dict:
         gsp_dict = {"gsp_id": "999", "name": "unknown"}
 
     return gsp_dict
+
+
+def get_gsp_many(latitudes, longitudes) -> pd.DataFrame:
+    """Get the GSPs for many latitudes and longitudes at once.
+
+    All the points are projected at once and found with one query of the spatial index,
+    see `Regions.find_many`.
+
+    :param latitudes: list or array of latitudes
+    :param longitudes: list or array of longitudes
+
+    :return: dataframe with columns "gsp_id" and "name", one row per point, in the same order.
+        Points not in exactly one GSP get {"gsp_id": "999", "name": "unknown"}
+    """
+    gsp, _ = gsp_regions.load()
+    index = gsp_regions.find_many(latitudes=latitudes, longitudes=longitudes)
+
+    # format gsp, using the first gsp id for each gsp name
+    gsp_details = get_gsp_names().reset_index().drop_duplicates("gsp_name").set_index("gsp_name")
+    gsp_details = gsp_details.reindex(gsp["GSPs"].to_numpy()[index])
+    gsp_details[index == -1] = None
+
+    known = gsp_details["index"].notna().to_numpy()
+    gsp_df = pd.DataFrame({"gsp_id": "999", "name": "unknown"}, index=range(len(index)))
+    gsp_df.loc[known, "gsp_id"] = gsp_details["index"][known].astype(int).astype(str).to_numpy()
+    gsp_df.loc[known, "name"] = gsp_details["region_name"][known].to_numpy()
+
+    return gsp_df
@@ -1,9 +1,23 @@
-"""Utils for GSP and DNO."""
+"""Utils for GSP and DNO.
 
-try:
-    import pyproj
-except ImportError:
-    print("You might want to install pyproj")  # noqa
+pyproj, geopandas and shapely are slow to import, and only needed when sites are
+created, so they are imported when they are first used, not when this module is.
+"""
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from pvsite_datamodel.write.data.grid import BOUNDARY, OUTSIDE, RegionGrid, hash_regions
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from shapely import STRtree
+
+logger = logging.getLogger(__name__)
 
 # OSGB is also called "OSGB 1936 / British National Grid -- United
 # Kingdom Ordnance Survey".  OSGB is used in many UK electricity
@@ -18,12 +32,18 @@ OSGB = 27700
 WGS84 = 4326
 WGS84_CRS = f"EPSG:{WGS84}"
 
+# directory of the region grids, see `Regions`. The grids are not in the package, as they
+# are large, so an installed package only has them if they are made and this is set
+REGION_GRID_DIR_ENV = "PVSITE_REGION_GRID_DIR"
+
 
-def lat_lon_to_osgb(lat: float, lon: float) -> [float, float]:
+def lat_lon_to_osgb(lat: float | np.ndarray, lon: float | np.ndarray) -> [float, float]:
     """Change lat, lon to a OSGB coordinates.
 
-    lat: latitude
-    lon: longitude
+    Arrays are projected in one call.
+
+    lat: latitude, or array of latitudes
+    lon: longitude, or array of longitudes
 
     Return: 2-tuple of x (east-west), y (north-south).
 
@@ -39,23 +59,177 @@ class Transformers:
     """
 
     def __init__(self) -> None:
-        """Init."""
+        """Init.
+
+        The transformers are made the first time they are used.
+        """
+        self._lock = threading.Lock()
         self._osgb_to_lat_lon = None
         self._lat_lon_to_osgb = None
         self._osgb_to_geostationary = None
-        self.make_transformers()
 
     def make_transformers(self) -> None:
         """Make transformers.
 
         Nice to only make these once, as it makes calling the functions below quicker
         """
+        import pyproj
+
         self._lat_lon_to_osgb = pyproj.Transformer.from_crs(crs_from=WGS84, crs_to=OSGB)
 
     @property
     def lat_lon_to_osgb(self):
         """lat-lon to OSGB property."""
+        if self._lat_lon_to_osgb is None:
+            with self._lock:
+                if self._lat_lon_to_osgb is None:
+                    self.make_transformers()
         return self._lat_lon_to_osgb
 
 
 transformers = Transformers()
+
+
+class Regions:
+    """Region polygons from a shapefile, with a spatial index.
+
+    The shapefile is only read the first time the regions are needed, and then kept,
+    so it is not parsed again for every site. Loading is thread-safe.
+
+    If a grid has been made for the regions, see `RegionGrid` and
+    `scripts/make_region_grids.py`, it is used first, and the polygons are only tested
+    for points near a boundary.
+    """
+
+    def __init__(self, path: str, grid_path: str | None = None) -> None:
+        """Init.
+
+        :param path: path of the shapefile
+        :param grid_path: path of the region grid, without an extension.
+            Defaults to {name}_grid in the directory in the PVSITE_REGION_GRID_DIR environment
+            variable, where {name} is the shapefile's name, or to {path}_grid if it isn't set.
+            The grid is not used if there are no files there.
+        """
+        self.path = path
+        self._grid_path = grid_path
+        self._lock = threading.Lock()
+        self._regions = None
+        self._tree = None
+        self._grid = None
+
+    @property
+    def grid_path(self) -> str:
+        """Path of the region grid, without an extension."""
+        if self._grid_path is not None:
+            return self._grid_path
+
+        grid_dir = os.getenv(REGION_GRID_DIR_ENV)
+        if grid_dir:
+            return os.path.join(grid_dir, f"{os.path.basename(self.path)}_grid")
+        return f"{self.path}_grid"
+
+    def load(self) -> tuple["gpd.GeoDataFrame", "STRtree"]:
+        """Get the regions and their spatial index, reading the shapefile if needed.
+
+        :return: 2-tuple of the regions geodataframe, and an STRtree of their geometries
+        """
+        if self._regions is None:
+            with self._lock:
+                if self._regions is None:
+                    import geopandas as gpd
+                    from shapely import STRtree
+
+                    regions = gpd.read_file(self.path)
+                    self._tree = STRtree(regions.geometry.values)
+                    self._grid = self._load_grid(regions)
+                    self._regions = regions
+        return self._regions, self._tree
+
+    def _load_grid(self, regions: "gpd.GeoDataFrame") -> RegionGrid | None:
+        """Load the region grid, if there is one made from these regions.
+
+        The grid's hash of the region geometries must match, so a grid made from an older
+        shapefile is not used, even if it has the same number of regions.
+        """
+        grid = RegionGrid.load(self.grid_path)
+        if grid is not None and grid.regions_hash != hash_regions(regions):
+            logger.warning(
+                f"Region grid {self.grid_path} was not made from the regions in {self.path}, "
+                "so it is not used. Remake it with scripts/make_region_grids.py"
+            )
+            return None
+        return grid
+
+    def find(self, latitude: float, longitude: float):
+        """Find the region a latitude and longitude is in.
+
+        :param latitude:
+        :param longitude:
+
+        :return: the region's row, or None if the point is not in exactly one region
+        """
+        regions, tree = self.load()
+
+        # change lat lon to osgb
+        x, y = lat_lon_to_osgb(lat=latitude, lon=longitude)
+
+        index = BOUNDARY
+        if self._grid is not None:
+            index = self._grid.lookup(np.array([x]), np.array([y]))[0]
+
+        if index == BOUNDARY:
+            from shapely.geometry import Point
+
+            # the spatial index gives the few regions whose bounding box has the point in,
+            # and only those are tested exactly
+            indexes = tree.query(Point(x, y), predicate="within")
+            index = indexes[0] if len(indexes) == 1 else OUTSIDE
+
+        if index == OUTSIDE:
+            return None
+        return regions.iloc[index]
+
+    def find_many(self, latitudes, longitudes) -> np.ndarray:
+        """Find the regions many latitudes and longitudes are in.
+
+        All the points are projected at once. They are looked up in the region grid, if
+        there is one, and the rest are matched to the regions with one query of the
+        spatial index. The spatial index gives the few regions whose bounding box has each
+        point in, and only those are tested exactly.
+
+        :param latitudes: list or array of latitudes
+        :param longitudes: list or array of longitudes
+
+        :return: array of the row number of each point's region, in the same order as the
+            points, or -1 where a point is not in exactly one region
+        """
+        _, tree = self.load()
+
+        # change lat lon to osgb
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        x, y = lat_lon_to_osgb(lat=latitudes, lon=longitudes)
+        x, y = np.atleast_1d(x), np.atleast_1d(y)
+
+        if self._grid is not None:
+            index = self._grid.lookup(x, y)
+            exact = index == BOUNDARY
+        else:
+            index = np.full(len(x), OUTSIDE, dtype=np.int64)
+            exact = np.ones(len(x), dtype=bool)
+
+        if exact.any():
+            import shapely
+
+            points = shapely.points(x[exact], y[exact])
+
+            # match points to regions, dropping points in more than one region
+            point_index, region_index = tree.query(points, predicate="within")
+            n_regions = np.bincount(point_index, minlength=len(points))
+
+            exact_index = np.full(len(points), OUTSIDE, dtype=np.int64)
+            exact_index[point_index] = region_index
+            exact_index[n_regions != 1] = OUTSIDE
+            index[exact] = exact_index
+
+        return index
@@ -2,15 +2,29 @@
 
 import logging
 
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
 from pvsite_datamodel.read.user import get_user_by_email as get_user_by_db
-from pvsite_datamodel.sqlmodels import APIRequestSQL
+from pvsite_datamodel.sqlmodels import APIRequestSQL, UserLastAPIRequestSQL
 
 logger = logging.getLogger(__name__)
 
 
-def save_api_call_to_db(url, session, user=None):
-    """Save api call to database."""
+def save_api_call_to_db(url, session, user=None, api_request_logger=None):
+    """Save api call to database.
+
+    :param url: the url that was called
+    :param session: database session
+    :param user: optional, the user that called it, otherwise the "unknown" user is used
+    :param api_request_logger: optional `APIRequestLogger`. If given, the call is queued
+        and saved in the background, rather than committed now
+    """
     url = str(url)
+    if api_request_logger is not None:
+        api_request_logger.log(url=url, user_uuid=None if user is None else user.user_uuid)
+        return
+
     if user is None:
         email = "unknown"
         user = get_user_by_db(session=session, email=email)
@@ -24,3 +38,36 @@ def save_api_call_to_db(url, session, user=None):
     # commit to database
     session.add(api_request)
     session.commit()
+
+
+def rebuild_last_api_requests(session: Session) -> int:
+    """Rebuild the user_last_api_request table from api_request.
+
+    :param session: database session
+    :return: the number of rows in the rebuilt table
+    """
+    session.execute(sa.delete(UserLastAPIRequestSQL))
+
+    last_api_requests = (
+        sa.select(
+            APIRequestSQL.user_uuid,
+            APIRequestSQL.uuid,
+            APIRequestSQL.created_utc,
+            APIRequestSQL.url,
+        )
+        .distinct(APIRequestSQL.user_uuid)
+        .where(APIRequestSQL.user_uuid.is_not(None))
+        .order_by(APIRequestSQL.user_uuid, APIRequestSQL.created_utc.desc())
+    )
+    stmt = sa.insert(UserLastAPIRequestSQL).from_select(
+        ["user_uuid", "api_request_uuid", "created_utc", "url"],
+        last_api_requests,
+    )
+    session.execute(stmt)
+
+    n_rows = session.query(UserLastAPIRequestSQL).count()
+    session.commit()
+
+    logger.info(f"Rebuilt user_last_api_request table with {n_rows} rows")
+
+    return n_rows
@@ -1,16 +1,51 @@
 """Write helpers for the Forecast and ForecastValues table."""
 
+import datetime as dt
 import logging
+import uuid
 
 import pandas as pd
+import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
-from pvsite_datamodel.read.model import get_or_create_model
+from pvsite_datamodel.read.model import get_or_create_model_uuid
 from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL
 
 _log = logging.getLogger(__name__)
 
 
+def _add_horizon_minutes(forecast_values_df: pd.DataFrame, timestamp_utc) -> pd.DataFrame:
+    """Fill in the horizon minutes of the forecast values, where they are missing.
+
+    The horizon is the number of whole minutes from the forecast's `timestamp_utc`
+    to each `start_utc`. Naive datetimes are treated as UTC.
+
+    :param forecast_values_df: dataframe of forecast values, with a `start_utc` column
+    :param timestamp_utc: the forecast's timestamp
+    :return: dataframe with a complete `horizon_minutes` column
+    """
+    if (timestamp_utc is None) or ("start_utc" not in forecast_values_df.columns):
+        return forecast_values_df
+
+    if "horizon_minutes" in forecast_values_df.columns:
+        if forecast_values_df["horizon_minutes"].notna().all():
+            return forecast_values_df
+
+    timestamp_utc = pd.Timestamp(timestamp_utc)
+    if timestamp_utc.tzinfo is None:
+        timestamp_utc = timestamp_utc.tz_localize("UTC")
+
+    start_utc = pd.to_datetime(forecast_values_df["start_utc"], utc=True)
+    horizon_minutes = (start_utc - timestamp_utc) // pd.Timedelta(minutes=1)
+
+    forecast_values_df = forecast_values_df.copy()
+    if "horizon_minutes" in forecast_values_df.columns:
+        horizon_minutes = forecast_values_df["horizon_minutes"].fillna(horizon_minutes)
+    forecast_values_df["horizon_minutes"] = horizon_minutes.astype(int)
+
+    return forecast_values_df
+
+
 def insert_forecast_values(
     session: Session,
     forecast_meta: dict,
@@ -37,11 +72,12 @@ def insert_forecast_values(
     session.flush()
 
     if (ml_model_name is not None) and (ml_model_version is not None):
-        ml_model = get_or_create_model(session, ml_model_name, ml_model_version)
-        ml_model_uuid = ml_model.model_uuid
+        ml_model_uuid = get_or_create_model_uuid(session, ml_model_name, ml_model_version)
     else:
         ml_model_uuid = None
 
+    forecast_values_df = _add_horizon_minutes(forecast_values_df, forecast.timestamp_utc)
+
     rows = forecast_values_df.to_dict("records")
     session.bulk_save_objects(
         [
@@ -54,3 +90,132 @@ def insert_forecast_values(
         ],
     )
     session.commit()
+
+
+def insert_forecasts_bulk(
+    session: Session,
+    forecasts: list[tuple[dict, pd.DataFrame]],
+    ml_model_name: str | None = None,
+    ml_model_version: str | None = None,
+):
+    """Insert many forecasts, and their forecast values, in one transaction.
+
+    Forecast uuids are made client side, so all the forecasts and all the forecast values
+    can each be written with one multi-row insert, rather than one flush and commit per forecast.
+
+    :param session: sqlalchemy session for interacting with the database
+    :param forecasts: list of (forecast_meta, forecast_values_df) tuples,
+        in the same format as `insert_forecast_values`
+    :param ml_model_name: name of the ML model used to generate the forecasts
+    :param ml_model_version: version of the ML model used to generate the forecasts
+    """
+    if len(forecasts) == 0:
+        return
+
+    # look the model up once for all the forecasts
+    if (ml_model_name is not None) and (ml_model_version is not None):
+        ml_model_uuid = get_or_create_model_uuid(session, ml_model_name, ml_model_version)
+    else:
+        ml_model_uuid = None
+
+    forecast_rows: list[dict] = []
+    forecast_values_dfs: list[pd.DataFrame] = []
+    for forecast_meta, forecast_values_df in forecasts:
+        forecast_row = dict(forecast_meta)
+        if "site_uuid" in forecast_row and "location_uuid" not in forecast_row:
+            forecast_row["location_uuid"] = forecast_row.pop("site_uuid")
+        forecast_row["forecast_uuid"] = uuid.uuid4()
+        forecast_rows.append(forecast_row)
+
+        forecast_values_df = _add_horizon_minutes(
+            forecast_values_df,
+            forecast_row.get("timestamp_utc"),
+        ).copy()
+        forecast_values_df["forecast_uuid"] = forecast_row["forecast_uuid"]
+        forecast_values_dfs.append(forecast_values_df)
+
+    forecast_values_df = pd.concat(forecast_values_dfs, ignore_index=True)
+    forecast_values_df["ml_model_uuid"] = ml_model_uuid
+
+    _log.debug(
+        f"Inserting {len(forecast_rows)} forecasts "
+        f"with {len(forecast_values_df)} forecast values",
+    )
+
+    session.execute(sa.insert(ForecastSQL), forecast_rows)
+    session.execute(sa.insert(ForecastValueSQL), forecast_values_df.to_dict("records"))
+    session.commit()
+
+
+def _missing_horizon(horizon_minutes: sa.ColumnElement) -> sa.ColumnElement:
+    """Filter for a missing horizon, matching the partial index of them."""
+    return sa.or_(horizon_minutes.is_(None), horizon_minutes == sa.literal_column("-1"))
+
+
+def backfill_horizon_minutes(
+    session: Session,
+    batch_size: int = 1000,
+    start_utc: dt.datetime | None = None,
+    end_utc: dt.datetime | None = None,
+) -> int:
+    """Set `horizon_minutes` on forecast values that were saved without it.
+
+    These are null, or -1 for values saved before the column was nullable, when -1 was its
+    default. -1 is also a real horizon, so those are computed again and left as they are if
+    they are right.
+
+    Only the forecasts that have values with a missing horizon are walked, found with the
+    partial index of them. They are walked in batches of `batch_size`, ordered by uuid, and
+    each batch is updated and committed in its own transaction.
+
+    :param session: sqlalchemy session for interacting with the database
+    :param batch_size: number of forecasts to update per transaction
+    :param start_utc: optional, only backfill forecasts with timestamp_utc >= start_utc
+    :param end_utc: optional, only backfill forecasts with timestamp_utc < end_utc
+    :return: the number of forecast values updated
+    """
+    fv = ForecastValueSQL.__table__
+    f = ForecastSQL.__table__
+
+    horizon_minutes = sa.cast(
+        sa.func.floor(sa.extract("epoch", fv.c.start_utc - f.c.timestamp_utc) / 60),
+        sa.Integer,
+    )
+    update_stmt = (
+        sa.update(fv)
+        .where(fv.c.forecast_uuid == f.c.forecast_uuid)
+        .where(fv.c.forecast_uuid.in_(sa.bindparam("forecast_uuids", expanding=True)))
+        .where(_missing_horizon(fv.c.horizon_minutes))
+        .where(fv.c.horizon_minutes.is_distinct_from(horizon_minutes))
+        .values(horizon_minutes=horizon_minutes)
+    )
+
+    n_updated = 0
+    last_forecast_uuid = None
+    while True:
+        query = session.query(ForecastValueSQL.forecast_uuid).distinct()
+        query = query.filter(_missing_horizon(ForecastValueSQL.horizon_minutes))
+        if (start_utc is not None) or (end_utc is not None):
+            query = query.join(ForecastSQL)
+        if start_utc is not None:
+            query = query.filter(ForecastSQL.timestamp_utc >= start_utc)
+        if end_utc is not None:
+            query = query.filter(ForecastSQL.timestamp_utc < end_utc)
+        if last_forecast_uuid is not None:
+            query = query.filter(ForecastValueSQL.forecast_uuid > last_forecast_uuid)
+        query = query.order_by(ForecastValueSQL.forecast_uuid).limit(batch_size)
+
+        forecast_uuids = [row.forecast_uuid for row in query.all()]
+        if len(forecast_uuids) == 0:
+            break
+
+        result = session.execute(update_stmt, {"forecast_uuids": forecast_uuids})
+        session.commit()
+
+        n_updated += result.rowcount
+        last_forecast_uuid = forecast_uuids[-1]
+        _log.debug(f"Backfilled horizon minutes up to forecast {last_forecast_uuid}")
+
+    _log.info(f"Backfilled horizon minutes for {n_updated} forecast values")
+
+    return n_updated
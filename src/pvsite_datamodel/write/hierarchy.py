@@ -0,0 +1,92 @@
+"""Tools for maintaining the location_closure hierarchy table.
+
+The table is kept up to date by a database trigger on location_locations, these functions
+are for checking and repairing it, e.g. after a manual data fix.
+"""
+
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.sqlmodels import LocationClosureSQL, LocationLocationSQL
+
+logger = logging.getLogger(__name__)
+
+# walks of the hierarchy stop after this many levels, so a cycle can not loop forever
+MAX_DEPTH = 100
+
+
+def _expected_location_closure() -> sa.Select:
+    """Select the (ancestor_uuid, descendant_uuid, depth) rows derived from location_locations.
+
+    Where there are several paths between two locations, the depth is the shortest.
+
+    The LocationSQL.child_locations relationship stores the parent in location_child_uuid
+    and the child in location_parent_uuid, so the hierarchy is read that way round here.
+    """
+    edges = LocationLocationSQL.__table__
+
+    paths = sa.select(
+        edges.c.location_child_uuid.label("ancestor_uuid"),
+        edges.c.location_parent_uuid.label("descendant_uuid"),
+        sa.literal(1).label("depth"),
+    ).cte("paths", recursive=True)
+    paths = paths.union(
+        sa.select(edges.c.location_child_uuid, paths.c.descendant_uuid, paths.c.depth + 1)
+        .join(edges, edges.c.location_parent_uuid == paths.c.ancestor_uuid)
+        .where(paths.c.depth < MAX_DEPTH),
+    )
+
+    return (
+        sa.select(paths.c.ancestor_uuid, paths.c.descendant_uuid, sa.func.min(paths.c.depth))
+        .where(paths.c.ancestor_uuid != paths.c.descendant_uuid)
+        .group_by(paths.c.ancestor_uuid, paths.c.descendant_uuid)
+    )
+
+
+def verify_location_closure(session: Session) -> dict[str, list[tuple]]:
+    """Compare the location_closure table with the location_locations hierarchy.
+
+    :param session: database session
+    :return: dict with "missing" and "extra" lists of
+        (ancestor_uuid, descendant_uuid, depth) rows
+    """
+    expected = _expected_location_closure()
+    actual = sa.select(
+        LocationClosureSQL.ancestor_uuid,
+        LocationClosureSQL.descendant_uuid,
+        LocationClosureSQL.depth,
+    )
+
+    missing = session.execute(expected.except_(actual)).all()
+    extra = session.execute(actual.except_(expected)).all()
+
+    logger.info(f"Found {len(missing)} missing and {len(extra)} extra location closure rows")
+
+    return {
+        "missing": [tuple(row) for row in missing],
+        "extra": [tuple(row) for row in extra],
+    }
+
+
+def rebuild_location_closure(session: Session) -> int:
+    """Rebuild the location_closure table from the location_locations hierarchy.
+
+    :param session: database session
+    :return: the number of rows in the rebuilt table
+    """
+    session.execute(sa.delete(LocationClosureSQL))
+
+    stmt = sa.insert(LocationClosureSQL).from_select(
+        ["ancestor_uuid", "descendant_uuid", "depth"],
+        _expected_location_closure(),
+    )
+    session.execute(stmt)
+
+    n_rows = session.query(LocationClosureSQL).count()
+    session.commit()
+
+    logger.info(f"Rebuilt location_closure table with {n_rows} rows")
+
+    return n_rows
@@ -0,0 +1,163 @@
+"""Monthly partitions of the api_request table.
+
+api_request is partitioned by range of created_utc, with one partition per month, named
+api_request_yYYYYmMM, and a default partition, api_request_default, for rows outside them.
+Partitions should be made before their month starts, and old partitions dropped to keep
+the table to a retention period. Dropping a partition is instant, unlike deleting rows.
+
+Both are run by scripts/api_request_retention.py.
+
+Requests saved without a time before api_request was partitioned have created_utc = 'epoch',
+see the a71d3e5c9b20 migration, so they are in the default partition and are deleted by the
+first retention run.
+"""
+
+import logging
+import re
+from datetime import UTC, datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+API_REQUEST_TABLE = "api_request"
+_PARTITION_NAME = re.compile(r"^api_request_y(\d{4})m(\d{2})$")
+
+
+def _month_start(year: int, month: int) -> datetime:
+    """Get the start of a month, normalising months past 12."""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+def _partition_name(month_start: datetime) -> str:
+    """Get the partition name for a month."""
+    return f"{API_REQUEST_TABLE}_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def get_api_request_partitions(session: Session) -> dict[str, datetime]:
+    """Get the monthly partitions of api_request.
+
+    :param session: database session
+    :return: dict of partition name to the start of its month, oldest first
+    """
+    names = session.execute(
+        sa.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table",
+        ),
+        {"table": API_REQUEST_TABLE},
+    ).scalars()
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match is not None:
+            partitions[name] = _month_start(int(match.group(1)), int(match.group(2)))
+
+    return dict(sorted(partitions.items(), key=lambda item: item[1]))
+
+
+def create_api_request_partitions(
+    session: Session,
+    months_ahead: int = 2,
+    now: datetime | None = None,
+) -> list[str]:
+    """Make the monthly partitions of api_request, up to a number of months ahead.
+
+    Rows already in the default partition for a new month are moved into it.
+    Commits the session.
+
+    :param session: database session
+    :param months_ahead: make partitions for this month and this many months after it
+    :param now: optional, the current time, mainly for testing
+    :return: names of the partitions that were made
+    """
+    if now is None:
+        now = datetime.now(tz=UTC)
+
+    existing = get_api_request_partitions(session=session)
+
+    created = []
+    for i in range(months_ahead + 1):
+        start = _month_start(now.year, now.month + i)
+        end = _month_start(start.year, start.month + 1)
+        name = _partition_name(start)
+        if name in existing:
+            continue
+
+        # move any rows for this month out of the default partition, so it can be attached.
+        # The table names are made from dates, not user input
+        session.execute(sa.text(f"CREATE TABLE {name} (LIKE {API_REQUEST_TABLE})"))
+        moved = (
+            "DELETE FROM api_request_default "
+            "WHERE created_utc >= :start AND created_utc < :end RETURNING *"
+        )
+        session.execute(
+            sa.text(f"WITH moved AS ({moved}) INSERT INTO {name} SELECT * FROM moved"),  # noqa: S608
+            {"start": start, "end": end},
+        )
+        session.execute(
+            sa.text(
+                f"ALTER TABLE {API_REQUEST_TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')",
+            ),
+        )
+        session.commit()
+
+        logger.info(f"Made api_request partition {name}")
+        created.append(name)
+
+    return created
+
+
+def drop_old_api_request_partitions(
+    session: Session,
+    retention_months: int = 12,
+    now: datetime | None = None,
+) -> list[str]:
+    """Drop the monthly partitions of api_request older than the retention period.
+
+    Rows in the default partition older than the retention period are deleted too, including
+    the requests that were saved without a time, and the number deleted is logged.
+    Commits the session.
+
+    :param session: database session
+    :param retention_months: number of whole months to keep, before this month
+    :param now: optional, the current time, mainly for testing
+    :return: names of the partitions that were dropped
+    """
+    if now is None:
+        now = datetime.now(tz=UTC)
+
+    cutoff = _month_start(now.year, now.month - retention_months)
+
+    dropped = []
+    for name, start in get_api_request_partitions(session=session).items():
+        if start >= cutoff:
+            break
+
+        session.execute(sa.text(f"DROP TABLE {name}"))
+        dropped.append(name)
+
+    n_deleted, n_deleted_no_time = session.execute(
+        sa.text(
+            "WITH deleted AS ("
+            "DELETE FROM api_request_default WHERE created_utc < :cutoff RETURNING created_utc"
+            ") SELECT count(*), count(*) FILTER (WHERE created_utc = 'epoch') FROM deleted",
+        ),
+        {"cutoff": cutoff},
+    ).one()
+    session.commit()
+
+    logger.info(f"Dropped api_request partitions before {cutoff:%Y-%m}: {dropped}")
+    if n_deleted > 0:
+        logger.warning(
+            f"Deleted {n_deleted} API requests before {cutoff:%Y-%m} from api_request_default, "
+            f"{n_deleted_no_time} of which were saved without a time",
+        )
+
+    return dropped
@@ -2,26 +2,30 @@
 
 import json
 import logging
+import uuid
 from datetime import UTC, datetime
 from uuid import UUID
 
+import pandas as pd
 import sqlalchemy as sa
 from sqlalchemy import text
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql.functions import func
 
 from pvsite_datamodel.pydantic_models import PVSiteEditMetadata
 from pvsite_datamodel.read import get_or_create_model, get_site_by_uuid, get_user_by_email
+from pvsite_datamodel.read.user_cache import invalidate_user_cache_on_commit
 from pvsite_datamodel.sqlmodels import (
+    ML_ID_SEQUENCE,
     ForecastSQL,
     ForecastValueSQL,
     LocationAssetType,
+    LocationGroupLocationSQL,
     LocationGroupSQL,
     LocationSQL,
     UserSQL,
 )
-from pvsite_datamodel.write.data.dno import get_dno
-from pvsite_datamodel.write.data.gsp import get_gsp
+from pvsite_datamodel.write.data.dno import get_dno, get_dno_many
+from pvsite_datamodel.write.data.gsp import get_gsp, get_gsp_many
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +45,8 @@ def make_fake_site(db_session, ml_id=1):
         created_utc=datetime.now(UTC),
         ml_id=ml_id,
     )
+    if ml_id is not None:
+        advance_ml_id_sequence(session=db_session, ml_id=ml_id)
     db_session.add(site)
     db_session.commit()
 
@@ -104,11 +110,6 @@ def create_site(
     """
     set_session_user(session, user_uuid)
 
-    max_ml_id = session.query(func.max(LocationSQL.ml_id)).scalar()
-
-    if max_ml_id is None:
-        max_ml_id = 0
-
     if country in [None, ""]:
         country = "uk"
 
@@ -142,7 +143,6 @@ def create_site(
         dno = json.dumps(dno)
 
     site = LocationSQL(
-        ml_id=ml_id if ml_id else max_ml_id + 1,
         client_location_id=client_site_id,
         client_location_name=client_site_name,
         latitude=latitude,
@@ -160,6 +160,11 @@ def create_site(
         client_uuid=client_uuid,
     )
 
+    # if not given, the ml id comes from the locations_ml_id_seq sequence
+    if ml_id:
+        site.ml_id = ml_id
+        advance_ml_id_sequence(session=session, ml_id=ml_id)
+
     session.add(site)
 
     session.commit()
@@ -172,6 +177,167 @@ def create_site(
     return site, message
 
 
+def allocate_ml_ids(session: Session, n: int) -> list[int]:
+    """Allocate a block of ml ids from the locations_ml_id_seq sequence.
+
+    The ids are allocated in one query, and are never handed out again,
+    even if the transaction is rolled back.
+
+    :param session: database session
+    :param n: number of ml ids to allocate
+    :return: list of ml ids
+    """
+    stmt = sa.select(ML_ID_SEQUENCE.next_value()).select_from(sa.func.generate_series(1, n))
+    return list(session.execute(stmt).scalars())
+
+
+def advance_ml_id_sequence(session: Session, ml_id: int) -> None:
+    """Move the locations_ml_id_seq sequence past an ml id that was given explicitly.
+
+    Then the sequence doesn't hand out the same ml id later. This may skip one id.
+
+    :param session: database session
+    :param ml_id: the ml id that was used
+    """
+    stmt = sa.select(
+        sa.func.setval(ML_ID_SEQUENCE.name, sa.func.greatest(ml_id, ML_ID_SEQUENCE.next_value())),
+    )
+    session.execute(stmt)
+
+
+def create_sites_bulk(
+    session: Session,
+    sites_df: pd.DataFrame,
+    site_group_name: str | None = None,
+    user_uuid: str | None = None,
+) -> tuple[pd.DataFrame, str]:
+    """Create many sites, and add them to the database in one transaction.
+
+    This is the bulk version of `create_site`. The sites are validated together,
+    the ml ids are allocated as one block from the sequence, the GSPs and DNOs are found
+    for all the sites with one spatial join each, and the sites are written with one
+    multi-row insert.
+
+    :param session: database session
+    :param sites_df: dataframe with one row per site. The columns are the same as the
+        arguments of `create_site`. "client_site_id", "client_site_name", "latitude",
+        "longitude" and "capacity_kw" are required, the others are optional.
+    :param site_group_name: optional, name of a site group to add all the sites to
+    :param user_uuid: the UUID of the user creating the sites
+    :return: the sites dataframe, with "location_uuid" and "ml_id" filled in, and a message
+    """
+    required_columns = [
+        "client_site_id",
+        "client_site_name",
+        "latitude",
+        "longitude",
+        "capacity_kw",
+    ]
+    missing_columns = [c for c in required_columns if c not in sites_df.columns]
+    if len(missing_columns) > 0:
+        raise ValueError(f"sites_df is missing columns {missing_columns}")
+
+    sites_df = sites_df.reset_index(drop=True).copy()
+    n_sites = len(sites_df)
+    if n_sites == 0:
+        return sites_df, "No sites to create"
+
+    # validate
+    invalid = sites_df[required_columns].isna().any(axis=1)
+    invalid |= ~sites_df["latitude"].between(-90, 90)
+    invalid |= ~sites_df["longitude"].between(-180, 180)
+    invalid |= sites_df["capacity_kw"] < 0
+    if invalid.any():
+        raise ValueError(f"Invalid sites in rows {list(sites_df.index[invalid])}")
+
+    # fill in defaults, the same as create_site
+    defaults = {
+        "country": "uk",
+        "asset_type": LocationAssetType.pv.name,
+        "orientation": 180,
+        "tilt": 35,
+        "inverter_capacity_kw": sites_df["capacity_kw"],
+        "module_capacity_kw": sites_df["capacity_kw"],
+    }
+    for column, default in defaults.items():
+        if column not in sites_df.columns:
+            sites_df[column] = default
+        else:
+            sites_df[column] = sites_df[column].replace("", None).fillna(default)
+
+    invalid = ~sites_df["asset_type"].isin(LocationAssetType.__members__)
+    if invalid.any():
+        raise ValueError(
+            f"Invalid asset_type in rows {list(sites_df.index[invalid])}, "
+            f"must one of ({', '.join(LocationAssetType.__members__)})",
+        )
+
+    # find the gsp and dno of all the sites that don't have one
+    for column, get_many in [("gsp", get_gsp_many), ("dno", get_dno_many)]:
+        if column not in sites_df.columns:
+            sites_df[column] = None
+        missing = sites_df[column].isna()
+        if missing.any():
+            regions = get_many(
+                latitudes=sites_df.loc[missing, "latitude"].to_numpy(),
+                longitudes=sites_df.loc[missing, "longitude"].to_numpy(),
+            )
+            sites_df.loc[missing, column] = [json.dumps(r) for r in regions.to_dict("records")]
+
+    # allocate ml ids in one step
+    if "ml_id" not in sites_df.columns:
+        sites_df["ml_id"] = None
+    missing = sites_df["ml_id"].isna()
+    if not missing.all():
+        advance_ml_id_sequence(session=session, ml_id=int(sites_df.loc[~missing, "ml_id"].max()))
+    if missing.any():
+        sites_df.loc[missing, "ml_id"] = allocate_ml_ids(session=session, n=int(missing.sum()))
+
+    sites_df["location_uuid"] = [uuid.uuid4() for _ in range(n_sites)]
+
+    columns = {
+        "client_site_id": "client_location_id",
+        "client_site_name": "client_location_name",
+    }
+    # only the columns create_site can set, not the generated ones or the creation time
+    location_columns = {
+        c.key
+        for c in LocationSQL.__table__.columns
+        if c.computed is None and c.key != "created_utc"
+    }
+    locations_df = sites_df.rename(columns=columns)
+    locations_df = locations_df[[c for c in locations_df.columns if c in location_columns]]
+    locations_df = locations_df.astype(object).where(locations_df.notna(), None)
+
+    set_session_user(session, user_uuid)
+
+    session.execute(sa.insert(LocationSQL), locations_df.to_dict("records"))
+
+    if site_group_name is not None:
+        site_group = (
+            session.query(LocationGroupSQL)
+            .filter(LocationGroupSQL.location_group_name == site_group_name)
+            .one()
+        )
+        session.execute(
+            sa.insert(LocationGroupLocationSQL),
+            [
+                {
+                    "location_group_uuid": site_group.location_group_uuid,
+                    "location_uuid": location_uuid,
+                }
+                for location_uuid in sites_df["location_uuid"]
+            ],
+        )
+        invalidate_user_cache_on_commit(session, location_group_uuid=site_group.location_group_uuid)
+
+    session.commit()
+
+    message = f"{n_sites} sites created successfully"
+
+    return sites_df, message
+
+
 def create_user(
     session: Session,
     email: str,
@@ -221,6 +387,7 @@ def add_site_to_site_group(
 
     if site not in site_group.locations:
         site_group.locations.append(site)
+        invalidate_user_cache_on_commit(session, location_group_uuid=site_group.location_group_uuid)
 
     session.commit()
 
@@ -250,6 +417,7 @@ def remove_site_from_site_group(
     if site in site_group.locations:
         new_sites = [site for site in site_group.locations if str(site.location_uuid) != site_uuid]
         site_group.locations = new_sites
+        invalidate_user_cache_on_commit(session, location_group_uuid=site_group.location_group_uuid)
 
     session.commit()
 
@@ -287,6 +455,7 @@ def update_user_site_group(session: Session, email: str, site_group_name: str) -
     user = session.query(UserSQL).filter(UserSQL.email == email)
 
     user = user.update({"location_group_uuid": site_group.location_group_uuid})
+    invalidate_user_cache_on_commit(session, email=email)
 
     session.commit()
 
@@ -412,6 +581,7 @@ def delete_site(
     # because it seems sensible to keep it for now
 
     session.delete(site)
+    invalidate_user_cache_on_commit(session, location_uuid=site.location_uuid)
 
     message = f"Location with location uuid {site.location_uuid} deleted successfully"
 
@@ -430,6 +600,7 @@ def delete_user(session: Session, email: str) -> str:
     user = session.query(UserSQL).filter(UserSQL.email == email).first()
 
     session.delete(user)
+    invalidate_user_cache_on_commit(session, email=email)
 
     message = (
         f"User with email {user.email} and location_group_uuid "
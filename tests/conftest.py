@@ -14,6 +14,7 @@ from testcontainers.postgres import PostgresContainer
 from alembic import command
 from alembic.config import Config
 from pvsite_datamodel import ClientSQL, GenerationSQL, LocationSQL, StatusSQL
+from pvsite_datamodel.read.model import clear_model_cache
 from pvsite_datamodel.write.user_and_site import create_site_group, create_user
 
 PROJECT_PATH = Path(__file__).parent.parent.resolve()
@@ -60,6 +61,9 @@ def db_session(engine):
         connection.close()
         session.flush()
 
+    # models made in the rolled back transaction must not be cached
+    clear_model_cache()
+
     engine.dispose()
 
 
@@ -1,11 +1,15 @@
 import datetime as dt
 
+import sqlalchemy as sa
+
 from pvsite_datamodel import APIRequestSQL
 from pvsite_datamodel.read import (
     get_all_last_api_request,
     get_api_requests_for_one_user,
     get_user_by_email,
 )
+from pvsite_datamodel.sqlmodels import UserLastAPIRequestSQL
+from pvsite_datamodel.write.database import rebuild_last_api_requests
 
 
 def test_get_all_last_api_request(db_session):
@@ -19,6 +23,41 @@ def test_get_all_last_api_request(db_session):
     assert last_requests_sql[0].user_uuid == user.user_uuid
 
 
+def test_get_all_last_api_request_summary(db_session):
+    users = [get_user_by_email(session=db_session, email=f"test{i}@test.com") for i in range(2)]
+    now = dt.datetime.now()
+    db_session.add_all(
+        [
+            APIRequestSQL(user=users[0], url="API/a", created_utc=now - dt.timedelta(hours=2)),
+            APIRequestSQL(user=users[0], url="UI/b", created_utc=now - dt.timedelta(hours=1)),
+            APIRequestSQL(user=users[1], url="API/c", created_utc=now - dt.timedelta(hours=3)),
+        ],
+    )
+    db_session.commit()
+
+    # the summary has the last request of each user
+    summary = db_session.query(UserLastAPIRequestSQL).order_by(UserLastAPIRequestSQL.url).all()
+    assert [row.url for row in summary] == ["API/c", "UI/b"]
+
+    last_requests = get_all_last_api_request(session=db_session)
+    assert sorted(r.url for r in last_requests) == ["API/c", "UI/b"]
+    assert {r.user.email for r in last_requests} == {"test0@test.com", "test1@test.com"}
+
+    last_requests = get_all_last_api_request(
+        session=db_session,
+        start_datetime=now - dt.timedelta(hours=2, minutes=30),
+    )
+    assert [r.url for r in last_requests] == ["UI/b"]
+
+    # url filters can pick an earlier request, so use api_request
+    last_requests = get_all_last_api_request(session=db_session, include_in_url="API")
+    assert sorted(r.url for r in last_requests) == ["API/a", "API/c"]
+
+    db_session.execute(sa.delete(UserLastAPIRequestSQL))
+    assert rebuild_last_api_requests(session=db_session) == 2
+    assert sorted(r.url for r in get_all_last_api_request(session=db_session)) == ["API/c", "UI/b"]
+
+
 def test_get_api_requests_for_one_user(db_session):
     user = get_user_by_email(session=db_session, email="test@test.com")
     db_session.add(APIRequestSQL(user_uuid=user.user_uuid, url="test"))
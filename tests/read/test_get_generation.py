@@ -5,7 +5,12 @@ from sqlalchemy.orm import Query
 
 from pvsite_datamodel import LocationSQL
 from pvsite_datamodel.read import get_pv_generation_by_sites, get_pv_generation_by_user_uuids
-from pvsite_datamodel.write.user_and_site import create_site_group, create_user
+from pvsite_datamodel.sqlmodels import GenerationSQL, LocationType
+from pvsite_datamodel.write.user_and_site import (
+    add_child_location_to_parent_location,
+    create_site_group,
+    create_user,
+)
 
 
 class TestGetPVGenerationByUser:
@@ -116,6 +121,43 @@ class TestGetPVGenerationBySites:
         )
         assert len(generations) == 10 * len(sites)
 
+    def test_gets_generation_for_multiple_sum_gsp_by_id(self, generations, sites, db_session):
+        # the same gsp id, written differently
+        sites[0].gsp = '{"name": "unknown", "gsp_id": "1"}'
+        sites[1].gsp = '{"gsp_id": 1, "name": "renamed"}'
+        sites[2].gsp = '{"gsp_id": "2", "name": "unknown"}'
+        sites[3].gsp = "not json"
+        db_session.commit()
+        assert [site.gsp_id for site in sites] == [1, 1, 2, None]
+
+        generations = get_pv_generation_by_sites(
+            session=db_session,
+            site_uuids=[site.location_uuid for site in sites],
+            sum_by="gsp",
+        )
+        assert len(generations) == 10 * 3
+        assert generations[0].power_kw == 2
+
+    def test_gets_generation_for_multiple_sum_gsp_without_id(self, generations, sites, db_session):
+        # sites without a gsp id are grouped on their text, e.g. the legacy {id}|{name}
+        sites[0].gsp = "1|north"
+        sites[1].gsp = "1|north"
+        sites[2].gsp = "2|south"
+        # too long to be an id
+        sites[3].gsp = '{"gsp_id": "12345678901"}'
+        db_session.commit()
+        assert [site.gsp_id for site in sites] == [None] * 4
+
+        generations = get_pv_generation_by_sites(
+            session=db_session,
+            site_uuids=[site.location_uuid for site in sites],
+            sum_by="gsp",
+        )
+        assert len(generations) == 10 * 3
+        first = [g for g in generations if g.start_utc == generations[0].start_utc]
+        power_kw = {g.name: g.power_kw for g in first}
+        assert power_kw == {"1|north": 2, "2|south": 1, '{"gsp_id": "12345678901"}': 1}
+
     def test_gets_generation_for_multiple_sum_dno(self, generations, db_session):
         query: Query = db_session.query(LocationSQL)
         sites: list[LocationSQL] = query.all()
@@ -127,6 +169,61 @@ class TestGetPVGenerationBySites:
         )
         assert len(generations) == 10 * len(sites)
 
+    def test_gets_generation_for_multiple_sum_region(self, generations, sites, db_session):
+        north = LocationSQL(client_location_name="north", location_type=LocationType.region)
+        uk = LocationSQL(client_location_name="uk", location_type=LocationType.region)
+        db_session.add_all([north, uk])
+        db_session.commit()
+
+        # site 1 is in uk directly and through north, but only counts once
+        for parent, child in [
+            (north, sites[0]),
+            (north, sites[1]),
+            (uk, north),
+            (uk, sites[1]),
+            (uk, sites[2]),
+        ]:
+            add_child_location_to_parent_location(
+                session=db_session,
+                child_location_uuid=child.location_uuid,
+                parent_location_uuid=parent.location_uuid,
+            )
+
+        # site 0 has two values at the last time, but its capacity only counts once
+        last_generation = (
+            db_session.query(GenerationSQL)
+            .filter(GenerationSQL.location_uuid == sites[0].location_uuid)
+            .order_by(GenerationSQL.start_utc.desc())
+            .first()
+        )
+        db_session.add(
+            GenerationSQL(
+                location_uuid=sites[0].location_uuid,
+                generation_power_kw=10,
+                start_utc=last_generation.start_utc,
+                end_utc=last_generation.end_utc + dt.timedelta(minutes=5),
+            )
+        )
+        db_session.commit()
+
+        generations = get_pv_generation_by_sites(
+            session=db_session,
+            site_uuids=[site.location_uuid for site in sites],
+            sum_by="region",
+        )
+        assert len(generations) == 10 * 2
+
+        by_region = {
+            name: [g for g in generations if g.name == name] for name in ["north", "uk"]
+        }
+        assert by_region["north"][-1].power_kw == 3 * 10
+        assert by_region["north"][-1].n_sites == 2
+        assert by_region["north"][-1].capacity_kw == 2 * 4
+        assert by_region["uk"][-1].power_kw == 4 * 10
+        assert by_region["uk"][-1].n_sites == 3
+        assert by_region["uk"][-1].capacity_kw == 3 * 4
+        assert by_region["uk"][0].location_uuid == uk.location_uuid
+
     def test_gets_generation_for_multiple_sum_error(self, generations, db_session):
         query: Query = db_session.query(LocationSQL)
         sites: list[LocationSQL] = query.all()
@@ -4,6 +4,8 @@ import pytest
 
 from pvsite_datamodel import ForecastSQL, ForecastValueSQL, LocationSQL
 from pvsite_datamodel.read import get_latest_forecast_values_by_site, get_or_create_model
+from pvsite_datamodel.sqlmodels import LocationType
+from pvsite_datamodel.write.user_and_site import add_child_location_to_parent_location
 
 
 def _add_forecast_value(
@@ -137,6 +139,30 @@ def test_get_latest_forecast_values(db_session, sites):
     )
     assert len(latest_forecast) == 3 + 1  # 3 from site 1, 1 from site 2
 
+    region = LocationSQL(client_location_name="region", location_type=LocationType.region)
+    db_session.add(region)
+    db_session.commit()
+    for site_uuid in site_uuids:
+        add_child_location_to_parent_location(
+            session=db_session,
+            child_location_uuid=site_uuid,
+            parent_location_uuid=region.location_uuid,
+        )
+
+    latest_forecast = get_latest_forecast_values_by_site(
+        session=db_session,
+        site_uuids=site_uuids,
+        start_utc=d1,
+        sum_by="region",
+    )
+    assert [(f.power_kw, f.n_sites, f.capacity_kw) for f in latest_forecast] == [
+        (2 + 8, 2, 8),
+        (4 + 9, 2, 8),
+        (5, 1, 4),
+        (6, 1, 4),
+    ]
+    assert {f.name for f in latest_forecast} == {"region"}
+
     latest_forecast = get_latest_forecast_values_by_site(
         session=db_session,
         site_uuids=site_uuids,
@@ -1,6 +1,9 @@
+import math
 import uuid
 
+import numpy as np
 import pytest
+import sqlalchemy as sa
 
 from pvsite_datamodel import LocationGroupSQL
 from pvsite_datamodel.pydantic_models import LatitudeLongitudeLimits
@@ -8,14 +11,26 @@ from pvsite_datamodel.read import (
     get_all_site_groups,
     get_all_sites,
     get_all_users,
+    get_nearest_sites,
+    get_nearest_sites_many,
+    get_nearest_sites_to_point,
     get_site_by_client_site_id,
     get_site_by_client_site_name,
     get_site_by_uuid,
     get_site_group_by_name,
     get_sites_by_client_name,
     get_sites_by_country,
+    get_sites_by_metadata,
     get_sites_from_user,
+    get_sites_in_bounding_box,
+    get_sites_within_radius,
+    stream_all_site_groups,
+    stream_all_sites,
+    stream_all_users,
 )
+from pvsite_datamodel.read.model import get_or_create_model
+from pvsite_datamodel.sqlmodels import InverterSQL, LocationAssetType
+from pvsite_datamodel.write.user_and_site import create_site_group, create_user, make_fake_site
 
 
 class TestGetAllSites:
@@ -39,6 +54,19 @@ class TestGetAllSites:
         assert out[2].location_uuid > out[1].location_uuid
         assert out[3].location_uuid > out[2].location_uuid
 
+    def test_returns_sites_in_pages(self, sites, db_session):
+        pages = [get_all_sites(db_session, limit=3)]
+        pages.append(get_all_sites(db_session, limit=3, after_uuid=pages[0][-1].location_uuid))
+
+        assert [len(page) for page in pages] == [3, 1]
+        assert pages[0] + pages[1] == get_all_sites(db_session)
+        assert get_all_sites(db_session, after_uuid=pages[1][-1].location_uuid) == []
+
+    def test_streams_sites(self, sites, db_session):
+        out = list(stream_all_sites(db_session, batch_size=3))
+
+        assert out == get_all_sites(db_session)
+
 
 class TestGetSitesByCountry:
     """Tests for the get_sites_by_country function."""
@@ -59,13 +87,29 @@ class TestGetSitesByCountry:
         assert len(out) == len(sites)
         assert all([o.country == country for o in out])
 
-    def test_returns_correct_client_name(self, make_sites_for_country, db_session):
+    def test_returns_correct_client_name(self, make_sites_for_country, db_session, client):
         country = "india"
         sites = make_sites_for_country(country)
+        sites[0].client_uuid = client.client_uuid
+        db_session.commit()
+
+        out = get_sites_by_country(db_session, country, client_name=client.client_name)
+        assert [o.location_uuid for o in out] == [sites[0].location_uuid]
+
         out = get_sites_by_country(db_session, country, client_name="test")
+        assert len(out) == 0
+
+    def test_returns_site_name_search(self, make_sites_for_country, db_session):
+        country = "india"
+        sites = make_sites_for_country(country)
+        out = get_sites_by_country(db_session, country, site_name_search="test")
         assert len(out) == len(sites)
 
-        out = get_sites_by_country(db_session, country, client_name="test2")
+        out = get_sites_by_country(db_session, country, site_name_search="site_2")
+        assert [o.client_location_name for o in out] == ["test_site_2"]
+
+        # wildcards are searched for, not used as wildcards
+        out = get_sites_by_country(db_session, country, site_name_search="test%")
         assert len(out) == 0
 
     def test_returns_no_sites_for_unknown_country(self, make_sites_for_country, db_session):
@@ -134,11 +178,100 @@ def test_get_all_site_groups(db_session):
     assert len(site_groups) == 0
 
 
+def test_get_users_and_site_groups_in_pages(db_session):
+    for email in ["c@test.com", "a@test.com", "b@test.com"]:
+        site_group = create_site_group(db_session=db_session, site_group_name=f"group_{email}")
+        create_user(
+            session=db_session,
+            email=email,
+            site_group_name=site_group.location_group_name,
+        )
+
+    users = get_all_users(session=db_session, limit=2)
+    assert [user.email for user in users] == ["a@test.com", "b@test.com"]
+    users = get_all_users(session=db_session, limit=2, after_email=users[-1].email)
+    assert [user.email for user in users] == ["c@test.com"]
+    assert list(stream_all_users(session=db_session, batch_size=2)) == get_all_users(db_session)
+
+    site_groups = get_all_site_groups(session=db_session, limit=2)
+    site_groups += get_all_site_groups(
+        session=db_session, after_name=site_groups[-1].location_group_name
+    )
+    assert [site_group.location_group_name for site_group in site_groups] == [
+        "group_a@test.com",
+        "group_b@test.com",
+        "group_c@test.com",
+    ]
+    assert list(stream_all_site_groups(session=db_session, batch_size=2)) == site_groups
+
+
+def test_get_sites_by_metadata(db_session, sites):
+    sites[0].location_metadata = {"tracking_type": "fixed", "region_name": "South West"}
+    sites[1].location_metadata = {"tracking_type": "single_axis", "region_name": "South East"}
+    sites[2].location_metadata = {"tracking_type": "single_axis", "region_name": "North"}
+    db_session.commit()
+
+    out = get_sites_by_metadata(session=db_session, metadata={"tracking_type": "single_axis"})
+    assert {site.location_uuid for site in out} == {sites[1].location_uuid, sites[2].location_uuid}
+
+    out = get_sites_by_metadata(session=db_session, jsonpath='$.region_name like_regex "^South"')
+    assert {site.location_uuid for site in out} == {sites[0].location_uuid, sites[1].location_uuid}
+
+    out = get_sites_by_metadata(
+        session=db_session,
+        metadata={"tracking_type": "single_axis"},
+        jsonpath='$.region_name like_regex "^South"',
+    )
+    assert [site.location_uuid for site in out] == [sites[1].location_uuid]
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        get_sites_by_metadata(session=db_session)
+
+
 def test_get_site_from_user(db_session, user_with_sites):
     sites = get_sites_from_user(session=db_session, user=user_with_sites)
     assert len(sites) > 0
 
 
+def test_get_site_from_user_load_related(db_session, user_with_sites):
+    model = get_or_create_model(session=db_session, name="test_model", version="0.0.1")
+    for site in user_with_sites.location_group.locations:
+        site.ml_model = model
+        site.inverters = [InverterSQL(), InverterSQL()]
+    db_session.commit()
+
+    statements = []
+
+    def count_statements(*args):
+        statements.append(args)
+
+    def sites_and_related(load_related):
+        db_session.expire_all()
+        db_session.refresh(user_with_sites)
+        statements.clear()
+        sites = get_sites_from_user(
+            session=db_session, user=user_with_sites, load_related=load_related
+        )
+        for site in sites:
+            _ = (site.client, site.ml_model, site.inverters)
+        return sites
+
+    sa.event.listen(db_session.bind, "before_cursor_execute", count_statements)
+    try:
+        sites = sites_and_related(load_related=False)
+        assert len(statements) > len(sites)
+
+        sites = sites_and_related(load_related=True)
+        # sites, clients, ml models and inverters
+        assert len(statements) == 4
+    finally:
+        sa.event.remove(db_session.bind, "before_cursor_execute", count_statements)
+
+    assert len(sites) == 4
+    assert all(site.ml_model.name == "test_model" for site in sites)
+    assert all(len(site.inverters) == 2 for site in sites)
+
+
 def test_get_site_list_max(db_session, user_with_sites):
     # examples sites are at 51,3
     lat_lon = LatitudeLongitudeLimits(latitude_max=50, longitude_max=4)
@@ -182,3 +315,165 @@ class TestGetSitesByClientName:
     def test_raises_error_for_empty_site_list(self, sites, db_session):
         with pytest.raises(Exception, match="Could not find locations from client _"):
             _ = get_sites_by_client_name(session=db_session, client_name="_")
+
+
+def haversine_km(latitude_1, longitude_1, latitude_2, longitude_2):
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(
+        math.radians, [latitude_1, longitude_1, latitude_2, longitude_2]
+    )
+    a = math.sin((latitude_2 - latitude_1) / 2) ** 2 + math.cos(latitude_1) * math.cos(
+        latitude_2
+    ) * math.sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+class TestSpatialQueries:
+    """Tests for the bounding box, radius and nearest site functions."""
+
+    @pytest.fixture
+    def spread_sites(self, db_session):
+        rng = np.random.default_rng(seed=0)
+        sites = []
+        for latitude, longitude in zip(
+            rng.uniform(49.0, 59.0, 50), rng.uniform(-8.0, 2.0, 50), strict=True
+        ):
+            site = make_fake_site(db_session, ml_id=None)
+            site.latitude = float(latitude)
+            site.longitude = float(longitude)
+            sites.append(site)
+        db_session.commit()
+        return sites
+
+    def test_get_sites_in_bounding_box(self, db_session, spread_sites):
+        lat_lon = LatitudeLongitudeLimits(
+            latitude_min=51, latitude_max=55, longitude_min=-4, longitude_max=0
+        )
+        out = get_sites_in_bounding_box(session=db_session, lat_lon_limits=lat_lon)
+
+        expected = [
+            s for s in spread_sites if 51 <= s.latitude <= 55 and -4 <= s.longitude <= 0
+        ]
+        assert len(expected) > 0
+        assert {s.location_uuid for s in out} == {s.location_uuid for s in expected}
+
+    def test_get_sites_in_bounding_box_for_user(self, db_session, user_with_sites, spread_sites):
+        # the user's sites are at 51,3
+        lat_lon = LatitudeLongitudeLimits(latitude_min=50, longitude_min=-10)
+        out = get_sites_in_bounding_box(
+            session=db_session, lat_lon_limits=lat_lon, user=user_with_sites
+        )
+        assert len(out) == 4
+        assert all(s.latitude == 51 and s.longitude == 3 for s in out)
+
+    @pytest.mark.parametrize("radius_km", [0, 50, 200, 2000])
+    def test_get_sites_within_radius(self, db_session, spread_sites, radius_km):
+        out = get_sites_within_radius(
+            session=db_session, latitude=54.0, longitude=-3.0, radius_km=radius_km
+        )
+
+        expected = sorted(
+            (haversine_km(54.0, -3.0, s.latitude, s.longitude), s.location_uuid)
+            for s in spread_sites
+        )
+        expected = [location_uuid for d, location_uuid in expected if d <= radius_km]
+        assert [s.location_uuid for s, _ in out] == expected
+        for site, distance_km in out:
+            assert distance_km == pytest.approx(
+                haversine_km(54.0, -3.0, site.latitude, site.longitude)
+            )
+
+    @pytest.mark.parametrize("k", [0, 1, 5, 100])
+    def test_get_nearest_sites_to_point(self, db_session, spread_sites, k):
+        # far north, where degrees of longitude are much shorter than degrees of latitude
+        out = get_nearest_sites_to_point(session=db_session, latitude=60.0, longitude=-3.0, k=k)
+
+        expected = sorted(
+            (haversine_km(60.0, -3.0, s.latitude, s.longitude), s.location_uuid)
+            for s in spread_sites
+        )
+        assert [s.location_uuid for s, _ in out] == [u for _, u in expected[:k]]
+
+    def test_get_nearest_sites_to_point_for_user(self, db_session, user_with_sites, spread_sites):
+        out = get_nearest_sites_to_point(
+            session=db_session, latitude=54.0, longitude=-3.0, k=2, user=user_with_sites
+        )
+        assert len(out) == 2
+        assert all(s.latitude == 51 and s.longitude == 3 for s, _ in out)
+
+    def test_get_nearest_sites_to_site(self, db_session, spread_sites):
+        origin = spread_sites[0]
+        out = get_nearest_sites(session=db_session, origin=origin.location_uuid, k=3)
+
+        expected = sorted(
+            (
+                haversine_km(origin.latitude, origin.longitude, s.latitude, s.longitude),
+                s.location_uuid,
+            )
+            for s in spread_sites[1:]
+        )
+        assert [s.location_uuid for s, _ in out] == [u for _, u in expected[:3]]
+
+    def test_get_nearest_sites_filters(self, db_session, spread_sites):
+        for site in spread_sites[::2]:
+            site.active = False
+        db_session.commit()
+
+        out = get_nearest_sites(session=db_session, origin=(54.0, -3.0), k=100, active=True)
+        assert {s.location_uuid for s, _ in out} == {
+            s.location_uuid for s in spread_sites[1::2]
+        }
+
+        out = get_nearest_sites(
+            session=db_session, origin=(54.0, -3.0), k=100, asset_type=LocationAssetType.wind
+        )
+        assert out == []
+
+    def test_get_nearest_sites_many(self, db_session, spread_sites):
+        origins = [(60.0, -3.0), spread_sites[5].location_uuid, (50.0, 1.0), str(uuid.uuid4())]
+        with pytest.raises(KeyError):
+            get_nearest_sites_many(session=db_session, origins=origins, k=4)
+
+        origins = origins[:3]
+        out = get_nearest_sites_many(session=db_session, origins=origins, k=4)
+        assert len(out) == 3
+        for origin, nearest in zip(origins, out, strict=True):
+            assert nearest == get_nearest_sites(session=db_session, origin=origin, k=4)
+            assert len(nearest) == 4
+
+    @pytest.mark.parametrize(
+        "read_sites",
+        [
+            lambda session: get_sites_in_bounding_box(
+                session=session,
+                lat_lon_limits=LatitudeLongitudeLimits(
+                    latitude_min=51, latitude_max=55, longitude_min=-4, longitude_max=0
+                ),
+            ),
+            lambda session: get_sites_within_radius(
+                session=session, latitude=54.0, longitude=-3.0, radius_km=200
+            ),
+            lambda session: get_nearest_sites(session=session, origin=(54.0, -3.0), k=5),
+        ],
+        ids=["bounding_box", "within_radius", "nearest"],
+    )
+    def test_queries_use_point_index(self, db_session, spread_sites, read_sites):
+        db_session.execute(sa.text("SET LOCAL enable_seqscan = off"))
+
+        # explain the statements the read function runs that use the location point
+        connection = db_session.connection()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if "<@" in statement or "<->" in statement:
+                statements.append((statement, parameters))
+
+        sa.event.listen(connection, "before_cursor_execute", record)
+        try:
+            read_sites(db_session)
+        finally:
+            sa.event.remove(connection, "before_cursor_execute", record)
+
+        assert len(statements) > 0
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+            assert "ix_locations_point" in str(plan)
@@ -4,8 +4,9 @@ import datetime as dt
 from uuid import uuid4
 
 import pandas as pd
+from sqlalchemy.orm import Session
 
-from pvsite_datamodel.read.model import get_models, get_or_create_model
+from pvsite_datamodel.read.model import get_models, get_or_create_model, get_or_create_model_uuid
 from pvsite_datamodel.sqlmodels import MLModelSQL
 from pvsite_datamodel.write.forecast import insert_forecast_values
 
@@ -93,3 +94,27 @@ def test_get_models_with_datetimes_with_sites(db_session, forecast_valid_input):
         site_uuid=str(uuid4()),
     )
     assert len(models) == 0
+
+
+def test_get_or_create_model_uuid_cached(db_session):
+    model_uuid = get_or_create_model_uuid(session=db_session, name="test_name", version="9.9.9")
+    db_session.commit()
+
+    # the cached uuid is used, even if the model row is not visible
+    db_session.query(MLModelSQL).update({"name": "renamed"})
+    assert (
+        get_or_create_model_uuid(session=db_session, name="test_name", version="9.9.9")
+        == model_uuid
+    )
+
+
+def test_get_or_create_model_uuid_not_cached_on_rollback(engine):
+    with Session(bind=engine) as session:
+        model_uuid = get_or_create_model_uuid(session=session, name="rollback", version="9.9.9")
+        session.rollback()
+
+        # the model was rolled back, so a new one is made
+        new_model_uuid = get_or_create_model_uuid(session=session, name="rollback", version="9.9.9")
+        assert new_model_uuid != model_uuid
+        assert session.query(MLModelSQL).filter(MLModelSQL.name == "rollback").count() == 1
+        session.rollback()
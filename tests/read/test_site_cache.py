@@ -0,0 +1,143 @@
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.read import site_cache as site_cache_module
+from pvsite_datamodel.read.site_cache import SiteCache
+from pvsite_datamodel.sqlmodels import LocationHistorySQL, LocationSQL
+from pvsite_datamodel.write.user_and_site import make_fake_site
+
+
+def test_site_cache(db_session, sites):
+    site_cache = SiteCache()
+    site_cache.warm(db_session)
+    assert len(site_cache) == len(sites)
+
+    # change the site behind the cache's back
+    db_session.execute(
+        sa.update(LocationSQL)
+        .where(LocationSQL.location_uuid == sites[0].location_uuid)
+        .values(capacity_kw=10),
+    )
+    db_session.expunge_all()
+
+    site = site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert site.capacity_kw == 4
+    assert site.client is not None
+
+    site_cache.invalidate(sites[0].location_uuid)
+    db_session.expunge_all()
+    site = site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert site.capacity_kw == 10
+
+
+def test_site_cache_by_client_site_id(db_session, sites):
+    site_cache = SiteCache()
+
+    site = site_cache.get_site_by_client_site_id(
+        db_session,
+        client_name=sites[0].client_location_name,
+        client_site_id=sites[0].client_location_id,
+    )
+    assert site == sites[0]
+    assert len(site_cache) == 1
+
+    site = site_cache.get_site_by_client_site_id(
+        db_session,
+        client_name=sites[0].client_location_name,
+        client_site_id=sites[0].client_location_id,
+    )
+    assert site == sites[0]
+
+
+def test_site_cache_returns_copies(db_session, sites):
+    sites[0].location_metadata = {"a": 1}
+    db_session.commit()
+
+    site_cache = SiteCache()
+    site_cache.warm(db_session)
+    sites[0].location_metadata["a"] = 2
+    db_session.expunge_all()
+
+    site = site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert site.location_metadata == {"a": 1}
+    site.location_metadata["a"] = 3
+    db_session.expunge_all()
+
+    site = site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert site.location_metadata == {"a": 1}
+
+
+def test_site_cache_does_not_store_site_invalidated_while_reading(
+    db_session,
+    sites,
+    monkeypatch,
+):
+    site_cache = SiteCache()
+    get_site_by_uuid = site_cache_module.get_site_by_uuid
+
+    def get_site_by_uuid_then_invalidate(session, site_uuid):
+        # the site changes after it is read, but before it is stored
+        site = get_site_by_uuid(session=session, site_uuid=site_uuid)
+        site_cache.invalidate(site_uuid)
+        return site
+
+    monkeypatch.setattr(site_cache_module, "get_site_by_uuid", get_site_by_uuid_then_invalidate)
+    site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert len(site_cache) == 0
+
+    monkeypatch.setattr(site_cache_module, "get_site_by_uuid", get_site_by_uuid)
+    site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert len(site_cache) == 1
+
+
+def test_site_cache_cleared_when_listener_starts(db_session, engine, sites):
+    # a site cached before the listener started may have changed since
+    site_cache = SiteCache()
+    site_cache.get_site_by_uuid(db_session, sites[0].location_uuid)
+    assert len(site_cache) == 1
+
+    site_cache.start_listener(engine)
+    try:
+        assert site_cache.wait_for_listener(timeout=10)
+        assert len(site_cache) == 0
+    finally:
+        site_cache.stop_listener()
+
+
+def test_site_cache_listener(engine):
+    """The listener needs committed changes, so this uses its own sessions."""
+    with Session(bind=engine) as session:
+        site = make_fake_site(session, ml_id=1000)
+        site_uuid = site.location_uuid
+
+    site_cache = SiteCache()
+    site_cache.start_listener(engine)
+    try:
+        assert site_cache.wait_for_listener(timeout=10)
+        with Session(bind=engine) as session:
+            site_cache.get_site_by_uuid(session, site_uuid)
+            assert len(site_cache) == 1
+
+            session.execute(
+                sa.update(LocationSQL)
+                .where(LocationSQL.location_uuid == site_uuid)
+                .values(capacity_kw=10),
+            )
+            session.commit()
+
+            for _ in range(50):
+                if len(site_cache) == 0:
+                    break
+                time.sleep(0.1)
+            assert len(site_cache) == 0
+    finally:
+        site_cache.stop_listener()
+
+        with Session(bind=engine) as session:
+            session.execute(sa.delete(LocationSQL).where(LocationSQL.location_uuid == site_uuid))
+            session.execute(
+                sa.delete(LocationHistorySQL).where(LocationHistorySQL.location_uuid == site_uuid),
+            )
+            session.commit()
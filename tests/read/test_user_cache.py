@@ -0,0 +1,118 @@
+import importlib
+import time
+
+import pytest
+
+from pvsite_datamodel.read.user_cache import UserCache, user_cache
+from pvsite_datamodel.write.access import rebuild_user_location_access
+from pvsite_datamodel.write.user_and_site import (
+    add_site_to_site_group,
+    create_site_group,
+    delete_site,
+    delete_user,
+    make_fake_site,
+    remove_site_from_site_group,
+    update_user_site_group,
+)
+
+
+@pytest.fixture
+def clear_user_cache():
+    """Start and end with an empty process level cache."""
+    user_cache.clear()
+    yield user_cache
+    user_cache.clear()
+
+
+def test_user_cache(db_session, user_with_sites, sites):
+    cache = UserCache()
+    db_session.commit()
+
+    user_access = cache.get_user_access(db_session, user_with_sites.email)
+    assert user_access.user_uuid == user_with_sites.user_uuid
+    assert user_access.location_group_uuid == user_with_sites.location_group_uuid
+    assert user_access.service_level == 0
+    assert user_access.location_uuids == {site.location_uuid for site in sites}
+    assert user_access.can_access(str(sites[0].location_uuid))
+
+    # cached, so no query
+    assert cache.get_user_access(None, user_with_sites.email) is user_access
+
+    assert cache.get_user_access(db_session, "nobody@test.com") is None
+
+    cache.invalidate(location_uuid=sites[0].location_uuid)
+    assert len(cache) == 0
+
+
+def test_user_cache_expiry_and_size(db_session, user_with_sites):
+    db_session.commit()
+
+    cache = UserCache(ttl_seconds=0.01)
+    user_access = cache.get_user_access(db_session, user_with_sites.email)
+    time.sleep(0.02)
+    assert cache.get_user_access(db_session, user_with_sites.email) is not user_access
+
+    cache = UserCache(max_size=0)
+    cache.get_user_access(db_session, user_with_sites.email)
+    assert len(cache) == 0
+
+
+def test_user_cache_does_not_store_access_invalidated_while_reading(
+    db_session,
+    user_with_sites,
+    monkeypatch,
+):
+    db_session.commit()
+    cache = UserCache()
+    # pvsite_datamodel.read.user_cache is the cache instance, so get the module itself
+    user_cache_module = importlib.import_module("pvsite_datamodel.read.user_cache")
+    read_user_access = user_cache_module._read_user_access
+
+    def read_user_access_then_invalidate(session, email):
+        # the access changes after it is read, but before it is stored
+        user_access = read_user_access(session=session, email=email)
+        cache.invalidate(email=email)
+        return user_access
+
+    monkeypatch.setattr(user_cache_module, "_read_user_access", read_user_access_then_invalidate)
+    assert cache.get_user_access(db_session, user_with_sites.email) is not None
+    assert len(cache) == 0
+
+
+def test_user_cache_invalidated_by_writes(db_session, user_with_sites, sites, clear_user_cache):
+    db_session.commit()
+    email = user_with_sites.email
+    site_group_name = user_with_sites.location_group.location_group_name
+
+    def location_uuids():
+        return user_cache.get_user_access(db_session, email).location_uuids
+
+    assert len(location_uuids()) == len(sites)
+
+    site = make_fake_site(db_session, ml_id=None)
+    add_site_to_site_group(db_session, str(site.location_uuid), site_group_name)
+    assert site.location_uuid in location_uuids()
+
+    remove_site_from_site_group(db_session, str(site.location_uuid), site_group_name)
+    assert site.location_uuid not in location_uuids()
+
+    delete_site(db_session, sites[0].location_uuid)
+    assert sites[0].location_uuid not in location_uuids()
+
+    other_site_group = create_site_group(db_session, site_group_name="other")
+    update_user_site_group(db_session, email=email, site_group_name="other")
+    user_access = user_cache.get_user_access(db_session, email)
+    assert user_access.location_group_uuid == other_site_group.location_group_uuid
+    assert user_access.location_uuids == set()
+
+    delete_user(db_session, email=email)
+    assert user_cache.get_user_access(db_session, email) is None
+
+
+def test_user_cache_invalidated_by_rebuild(db_session, user_with_sites, clear_user_cache):
+    db_session.commit()
+    user_cache.get_user_access(db_session, user_with_sites.email)
+    assert len(user_cache) == 1
+
+    rebuild_user_location_access(db_session)
+    assert len(user_cache) == 0
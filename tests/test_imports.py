@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def test_write_does_not_import_geodata():
+    # run in a new interpreter, as other tests will have imported the geodata packages
+    code = (
+        "import sys; import pvsite_datamodel.write; "
+        "print([m for m in ['geopandas', 'shapely', 'pyproj'] if m in sys.modules])"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_gsp_names_alias():
+    from pvsite_datamodel.write.data import gsp
+
+    with pytest.deprecated_call():
+        gsp_names = gsp.gsp_names
+    assert gsp_names is gsp.get_gsp_names()
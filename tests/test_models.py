@@ -1,3 +1,13 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.sqlmodels import (
+    APIRequestSQL,
+    Base,
+    LocationClosureSQL,
+    UserLastAPIRequestSQL,
+    UserLocationSQL,
+)
 from pvsite_datamodel.write.user_and_site import create_site_group, create_user, make_fake_site
 
 
@@ -129,3 +139,38 @@ def test_three_site_two_user_and_ocf_see_everything(db_session):
     assert len(user_1.location_group.locations) == 2
     assert len(user_2.location_group.locations) == 2
     assert len(user_ocf.location_group.locations) == 3
+
+
+def test_create_all_makes_triggers(engine):
+    """The tables kept in sync by triggers are filled on a database made with create_all."""
+    with engine.connect() as connection, connection.begin() as transaction:
+        connection.execute(sa.text("CREATE SCHEMA create_all_test"))
+        connection.execute(sa.text("SET LOCAL search_path TO create_all_test"))
+        Base.metadata.create_all(connection)
+
+        with Session(bind=connection) as session:
+            site_group = create_site_group(db_session=session)
+            region = make_fake_site(db_session=session, ml_id=1)
+            site = make_fake_site(db_session=session, ml_id=2)
+            user = create_user(
+                session=session,
+                email="test_user@gmail.com",
+                site_group_name=site_group.location_group_name,
+            )
+            site_group.locations.append(site)
+            region.child_locations.append(site)
+            session.add(APIRequestSQL(url="test", user=user))
+            session.commit()
+
+            user_locations = session.query(UserLocationSQL).all()
+            assert [row.location_uuid for row in user_locations] == [site.location_uuid]
+
+            closure = session.query(LocationClosureSQL).all()
+            assert [(row.ancestor_uuid, row.depth) for row in closure] == [
+                (region.location_uuid, 1),
+            ]
+
+            last_api_request = session.get(UserLastAPIRequestSQL, user.user_uuid)
+            assert last_api_request.url == "test"
+
+        transaction.rollback()
@@ -0,0 +1,29 @@
+import sqlalchemy as sa
+
+from pvsite_datamodel.session_events import call_after_transaction
+
+
+def test_call_after_transaction(db_session):
+    calls = []
+
+    call_after_transaction(
+        db_session,
+        on_commit=lambda: calls.append("commit"),
+        on_rollback=lambda: calls.append("rollback"),
+    )
+    db_session.commit()
+    assert calls == ["commit"]
+
+    # the callbacks only run for the transaction they were added in
+    db_session.commit()
+    assert calls == ["commit"]
+
+    db_session.execute(sa.text("SELECT 1"))
+    call_after_transaction(db_session, on_commit=lambda: calls.append("commit"))
+    call_after_transaction(
+        db_session,
+        on_commit=lambda: calls.append("commit"),
+        on_rollback=lambda: calls.append("rollback"),
+    )
+    db_session.rollback()
+    assert calls == ["commit", "rollback"]
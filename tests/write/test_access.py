@@ -0,0 +1,80 @@
+from pvsite_datamodel.sqlmodels import UserLocationSQL
+from pvsite_datamodel.write.access import (
+    rebuild_user_location_access,
+    verify_user_location_access,
+)
+from pvsite_datamodel.write.user_and_site import (
+    add_site_to_site_group,
+    create_site_group,
+    create_user,
+    delete_user,
+    remove_site_from_site_group,
+    update_user_site_group,
+)
+
+
+def _user_location_uuids(db_session, user):
+    rows = db_session.query(UserLocationSQL).filter(UserLocationSQL.user_uuid == user.user_uuid)
+    return {row.location_uuid for row in rows}
+
+
+def test_user_locations_follow_site_group(db_session, sites):
+    site_group = create_site_group(db_session=db_session)
+    user = create_user(
+        session=db_session,
+        email="test_user@test.org",
+        site_group_name=site_group.location_group_name,
+    )
+    assert _user_location_uuids(db_session, user) == set()
+
+    add_site_to_site_group(
+        session=db_session,
+        site_uuid=str(sites[0].location_uuid),
+        site_group_name=site_group.location_group_name,
+    )
+    add_site_to_site_group(
+        session=db_session,
+        site_uuid=str(sites[1].location_uuid),
+        site_group_name=site_group.location_group_name,
+    )
+    assert _user_location_uuids(db_session, user) == {
+        sites[0].location_uuid,
+        sites[1].location_uuid,
+    }
+
+    remove_site_from_site_group(
+        session=db_session,
+        site_uuid=str(sites[0].location_uuid),
+        site_group_name=site_group.location_group_name,
+    )
+    assert _user_location_uuids(db_session, user) == {sites[1].location_uuid}
+
+    # moving the user to another site group swaps their sites
+    site_group_2 = create_site_group(db_session=db_session, site_group_name="test_site_group_2")
+    site_group_2.locations.append(sites[2])
+    db_session.commit()
+    update_user_site_group(
+        session=db_session,
+        email=user.email,
+        site_group_name=site_group_2.location_group_name,
+    )
+    assert _user_location_uuids(db_session, user) == {sites[2].location_uuid}
+
+    user_uuid = user.user_uuid
+    delete_user(session=db_session, email=user.email)
+    assert db_session.query(UserLocationSQL).filter_by(user_uuid=user_uuid).count() == 0
+
+    assert verify_user_location_access(db_session) == {"missing": [], "extra": []}
+
+
+def test_rebuild_user_location_access(db_session, user_with_sites, sites):
+    db_session.query(UserLocationSQL).delete()
+
+    result = verify_user_location_access(db_session)
+    assert len(result["missing"]) == len(sites)
+    assert len(result["extra"]) == 0
+
+    n_rows = rebuild_user_location_access(db_session)
+
+    assert n_rows == len(sites)
+    assert verify_user_location_access(db_session) == {"missing": [], "extra": []}
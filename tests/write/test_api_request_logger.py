@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.read.user import get_user_by_email
+from pvsite_datamodel.sqlmodels import APIRequestSQL
+from pvsite_datamodel.write.api_request_logger import APIRequestLogger
+from pvsite_datamodel.write.database import save_api_call_to_db
+
+
+@pytest.fixture
+def logger_session(engine):
+    """A session on its own connection, for the logger and the test, rolled back afterwards.
+
+    The logger writes from its own thread, so it doesn't share db_session's connection.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+        yield session
+
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def session_factory(logger_session):
+    """Sessions on the logger's connection.
+
+    Their commits and rollbacks are savepoints, so a failed batch doesn't roll back the test.
+    """
+    connection = logger_session.connection()
+    return lambda: Session(bind=connection, join_transaction_mode="create_savepoint")
+
+
+def test_api_request_logger(logger_session, session_factory):
+    user = get_user_by_email(session=logger_session, email="test@test.com")
+    logger_session.commit()
+
+    with APIRequestLogger(session_factory=session_factory, max_batch_seconds=0.1) as logger:
+        for i in range(5):
+            assert logger.log(url=f"test/{i}", user_uuid=user.user_uuid)
+        save_api_call_to_db(url="test/5", session=logger_session, api_request_logger=logger)
+
+    api_requests = logger_session.query(APIRequestSQL).order_by(APIRequestSQL.url).all()
+    assert [api_request.url for api_request in api_requests] == [f"test/{i}" for i in range(6)]
+    assert api_requests[0].user.email == "test@test.com"
+    assert api_requests[5].user.email == "unknown"
+
+    metrics = logger.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["n_written"] == 6
+    assert metrics["n_dropped_queue_full"] == 0
+    assert metrics["n_dropped_errors"] == 0
+
+    # nothing would write it
+    assert not logger.log(url="test/6")
+    assert logger.metrics()["n_dropped_stopped"] == 1
+
+
+def test_api_request_logger_drops_when_full(session_factory):
+    # the logger is not started, so the queue fills up
+    logger = APIRequestLogger(session_factory=session_factory, max_queue_size=2)
+
+    assert [logger.log(url="test") for _ in range(3)] == [True, True, False]
+
+    metrics = logger.metrics()
+    assert metrics["queue_depth"] == 2
+    assert metrics["n_dropped_queue_full"] == 1
+
+
+def test_api_request_logger_error(logger_session, session_factory):
+    user = get_user_by_email(session=logger_session, email="test@test.com")
+    logger_session.commit()
+
+    logger = APIRequestLogger(session_factory=session_factory, max_batch_seconds=0.1)
+    logger.log(url="test/0", user_uuid=user.user_uuid)
+    # no user with this uuid
+    logger.log(url="test/1", user_uuid="00000000-0000-0000-0000-000000000000")
+    logger.log(url="test/2", user_uuid=user.user_uuid)
+    # start after logging, so the requests are written in one batch
+    logger.start()
+    logger.stop()
+
+    # only the bad request is dropped
+    metrics = logger.metrics()
+    assert metrics["n_batches"] == 1
+    assert metrics["n_written"] == 2
+    assert metrics["n_dropped_errors"] == 1
+    api_requests = logger_session.query(APIRequestSQL).order_by(APIRequestSQL.url).all()
+    assert [api_request.url for api_request in api_requests] == ["test/0", "test/2"]
@@ -0,0 +1,121 @@
+import queue
+import threading
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL, GenerationSQL
+from pvsite_datamodel.write.batch_writer import BatchWriter
+
+
+@pytest.fixture
+def session_factory(db_session):
+    """Sessions that share the test's connection, so everything is rolled back.
+
+    Their commits and rollbacks are savepoints, so a failed write doesn't roll back the test.
+    """
+    connection = db_session.connection()
+    return lambda: Session(bind=connection, join_transaction_mode="create_savepoint")
+
+
+def test_batch_writer(db_session, session_factory, generation_valid_site, forecast_valid_input):
+    forecast_meta, forecast_values = forecast_valid_input
+
+    with BatchWriter(session_factory=session_factory, max_batch_seconds=0.1) as writer:
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+        writer.submit_forecast(
+            forecast_meta,
+            pd.DataFrame(forecast_values),
+            ml_model_name="test",
+            ml_model_version="0.0.0",
+        )
+
+    assert db_session.query(GenerationSQL).count() == 10
+    assert db_session.query(ForecastSQL).count() == 1
+    assert db_session.query(ForecastValueSQL).count() == 10
+
+    metrics = writer.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["n_written"] == 2
+    assert metrics["n_dropped_errors"] == 0
+    assert metrics["n_batches"] >= 1
+
+
+def test_batch_writer_backpressure(session_factory, generation_valid_site):
+    # hold up the first write, so the queue fills up
+    writing = threading.Event()
+    release = threading.Event()
+
+    def blocking_session_factory():
+        writing.set()
+        release.wait()
+        return session_factory()
+
+    writer = BatchWriter(
+        session_factory=blocking_session_factory,
+        max_queue_size=1,
+        max_batch_size=1,
+        put_timeout=0.01,
+    )
+    with writer:
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+        assert writing.wait(timeout=10)
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+
+        with pytest.raises(queue.Full):
+            writer.submit_generation(pd.DataFrame(generation_valid_site))
+
+        assert writer.metrics()["queue_depth"] == 1
+        release.set()
+
+    assert writer.metrics()["n_written"] == 2
+
+
+def test_batch_writer_refuses_when_not_running(session_factory, generation_valid_site):
+    writer = BatchWriter(session_factory=session_factory)
+    with pytest.raises(RuntimeError):
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+
+    writer.start()
+    writer.stop()
+    with pytest.raises(RuntimeError):
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+
+    assert writer.metrics()["n_dropped_stopped"] == 2
+
+
+def test_batch_writer_error(session_factory, generation_invalid_dataframe):
+    with BatchWriter(session_factory=session_factory, max_batch_seconds=0.1) as writer:
+        writer.submit_generation(pd.DataFrame(generation_invalid_dataframe))
+
+    assert writer.metrics()["n_dropped_errors"] == 1
+
+
+def test_batch_writer_drops_only_bad_items(
+    db_session,
+    session_factory,
+    sites,
+    generation_valid_site,
+    generation_invalid_dataframe,
+):
+    # generation can use site_uuid or location_uuid
+    generation_location_uuid = pd.DataFrame(generation_valid_site).rename(
+        columns={"site_uuid": "location_uuid"},
+    )
+    generation_location_uuid["location_uuid"] = sites[1].location_uuid
+
+    # the batch is written once all three items are in it
+    with BatchWriter(
+        session_factory=session_factory, max_batch_size=3, max_batch_seconds=10
+    ) as writer:
+        writer.submit_generation(pd.DataFrame(generation_valid_site))
+        writer.submit_generation(pd.DataFrame(generation_invalid_dataframe))
+        writer.submit_generation(generation_location_uuid)
+
+    assert db_session.query(GenerationSQL).count() == 20
+
+    metrics = writer.metrics()
+    assert metrics["n_batches"] == 1
+    assert metrics["n_written"] == 2
+    assert metrics["n_dropped_errors"] == 1
@@ -0,0 +1,98 @@
+import numpy as np
+
+from pvsite_datamodel.write.data.dno import dno_local_file, dno_regions, get_dno, get_dno_many
+from pvsite_datamodel.write.data.grid import BOUNDARY, RegionGrid
+from pvsite_datamodel.write.data.utils import REGION_GRID_DIR_ENV, Regions
+
+
+def test_get_dno():
+    dno = get_dno(latitude=51.5, longitude=-0.1)
+    assert dno["dno_id"] != "999"
+    assert dno["name"] != "unknown"
+
+    # the regions are only read once
+    regions, tree = dno_regions.load()
+    assert dno_regions.load() == (regions, tree)
+
+
+def test_get_dno_outside_regions():
+    dno = get_dno(latitude=0.0, longitude=0.0)
+    assert dno == {"dno_id": "999", "name": "unknown", "long_name": "unknown"}
+
+
+def test_get_dno_matches_get_dno_many():
+    latitudes = np.array([51.5, 55.0, 52.2, 0.0])
+    longitudes = np.array([-0.1, -3.0, 0.1, 0.0])
+
+    dno_df = get_dno_many(latitudes, longitudes)
+    for i, row in dno_df.iterrows():
+        assert get_dno(latitude=latitudes[i], longitude=longitudes[i]) == row.to_dict()
+
+
+def test_get_dno_many_empty():
+    dno_df = get_dno_many(np.array([]), np.array([]))
+    assert len(dno_df) == 0
+    assert list(dno_df.columns) == ["dno_id", "name", "long_name"]
+
+
+def test_region_grid(tmp_path):
+    regions_df, _ = dno_regions.load()
+    grid = RegionGrid.build(regions_df, cell_size=5000)
+    assert (grid.cells == BOUNDARY).any()
+    assert (grid.cells >= 0).any()
+
+    grid_path = str(tmp_path / "dno_grid")
+    grid.save(grid_path)
+    regions = Regions(dno_local_file, grid_path=grid_path)
+    regions.load()
+    assert isinstance(regions._grid.cells, np.memmap)
+
+    # the grid gives the same regions as the polygons
+    rng = np.random.default_rng(seed=0)
+    latitudes = np.append(rng.uniform(49.0, 60.0, 10_000), np.nan)
+    longitudes = np.append(rng.uniform(-8.0, 2.0, 10_000), np.nan)
+    np.testing.assert_array_equal(
+        regions.find_many(latitudes=latitudes, longitudes=longitudes),
+        dno_regions.find_many(latitudes=latitudes, longitudes=longitudes),
+    )
+
+    for latitude, longitude in zip(latitudes[:100], longitudes[:100], strict=True):
+        region = regions.find(latitude=latitude, longitude=longitude)
+        expected = dno_regions.find(latitude=latitude, longitude=longitude)
+        assert (region is None and expected is None) or region.equals(expected)
+
+
+def test_region_grid_not_used_if_regions_changed(tmp_path):
+    regions_df, _ = dno_regions.load()
+    grid = RegionGrid.build(regions_df.iloc[:-1], cell_size=5000)
+
+    grid_path = str(tmp_path / "dno_grid")
+    grid.save(grid_path)
+    regions = Regions(dno_local_file, grid_path=grid_path)
+    regions.load()
+    assert regions._grid is None
+
+
+def test_region_grid_not_used_if_geometries_changed(tmp_path):
+    regions_df, _ = dno_regions.load()
+    # the same number of regions, but one has moved
+    moved = regions_df.copy()
+    moved.loc[moved.index[0], "geometry"] = moved.geometry.iloc[0].buffer(1000)
+    grid = RegionGrid.build(moved, cell_size=5000)
+
+    grid_path = str(tmp_path / "dno_grid")
+    grid.save(grid_path)
+    regions = Regions(dno_local_file, grid_path=grid_path)
+    regions.load()
+    assert regions._grid is None
+
+
+def test_region_grid_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(REGION_GRID_DIR_ENV, str(tmp_path))
+    regions = Regions(dno_local_file)
+    assert regions.grid_path == str(tmp_path / "dno_grid")
+
+    regions_df, _ = dno_regions.load()
+    RegionGrid.build(regions_df, cell_size=5000).save(regions.grid_path)
+    regions.load()
+    assert regions._grid is not None
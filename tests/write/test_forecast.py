@@ -4,10 +4,15 @@ import uuid
 import pandas as pd
 import pandas.api.types as ptypes
 import pytest
+import sqlalchemy as sa
 from sqlalchemy.exc import SQLAlchemyError
 
-from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL
-from pvsite_datamodel.write.forecast import insert_forecast_values
+from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL, MLModelSQL
+from pvsite_datamodel.write.forecast import (
+    backfill_horizon_minutes,
+    insert_forecast_values,
+    insert_forecasts_bulk,
+)
 
 
 class TestInsertForecastValues:
@@ -76,3 +81,108 @@ class TestInsertForecastValues:
             match=r"^'forecast_power_MW' is an invalid keyword argument for ForecastValueSQL.*",
         ):
             insert_forecast_values(db_session, forecast_meta, forecast_values_df)
+
+
+class TestInsertForecastsBulk:
+    """Tests for the insert_forecasts_bulk function."""
+
+    def test_insert_forecasts_for_many_sites(self, db_session, sites, forecast_valid_values_input):
+        forecasts = []
+        for site in sites:
+            forecast_meta = {
+                "site_uuid": site.location_uuid,
+                "timestamp_utc": datetime.datetime.now(tz=datetime.UTC),
+                "forecast_version": "0.0.0",
+            }
+            forecasts.append((forecast_meta, pd.DataFrame(forecast_valid_values_input)))
+
+        insert_forecasts_bulk(
+            db_session,
+            forecasts,
+            ml_model_name="test",
+            ml_model_version="0.0.0",
+        )
+
+        assert db_session.query(ForecastSQL).count() == len(sites)
+        assert db_session.query(ForecastValueSQL).count() == 10 * len(sites)
+        assert db_session.query(MLModelSQL).count() == 1
+
+        for forecast in db_session.query(ForecastSQL).all():
+            forecast_values = (
+                db_session.query(ForecastValueSQL)
+                .filter(ForecastValueSQL.forecast_uuid == forecast.forecast_uuid)
+                .all()
+            )
+            assert len(forecast_values) == 10
+            assert all(fv.ml_model_uuid is not None for fv in forecast_values)
+
+    def test_insert_no_forecasts(self, db_session):
+        insert_forecasts_bulk(db_session, [])
+
+        assert db_session.query(ForecastSQL).count() == 0
+
+
+class TestHorizonMinutes:
+    """Tests for filling in forecast value horizon minutes."""
+
+    def test_insert_computes_missing_horizon_minutes(self, db_session, forecast_valid_input):
+        forecast_meta, forecast_values = forecast_valid_input
+        expected = forecast_values.pop("horizon_minutes")
+
+        insert_forecast_values(db_session, forecast_meta, pd.DataFrame(forecast_values))
+
+        horizon_minutes = (
+            db_session.query(ForecastValueSQL.horizon_minutes)
+            .order_by(ForecastValueSQL.start_utc)
+            .all()
+        )
+        assert [h for (h,) in horizon_minutes] == expected
+
+    def test_backfill_horizon_minutes(self, db_session, forecast_valid_input):
+        forecast_meta, forecast_values = forecast_valid_input
+        expected = forecast_values["horizon_minutes"]
+
+        insert_forecast_values(db_session, forecast_meta, pd.DataFrame(forecast_values))
+        # values saved before the column was nullable have -1, and newer ones null
+        db_session.execute(sa.update(ForecastValueSQL).values(horizon_minutes=-1))
+        db_session.execute(
+            sa.update(ForecastValueSQL)
+            .where(ForecastValueSQL.start_utc == forecast_values["start_utc"][0])
+            .values(horizon_minutes=None)
+        )
+        db_session.commit()
+        forecast_uuid = db_session.query(ForecastSQL.forecast_uuid).scalar()
+
+        # a forecast with a real horizon of -1, which is left alone
+        timestamp_utc = forecast_values["start_utc"][0] + datetime.timedelta(minutes=1)
+        other_expected = [
+            (start_utc - timestamp_utc) // datetime.timedelta(minutes=1)
+            for start_utc in forecast_values["start_utc"]
+        ]
+        assert other_expected[0] == -1
+        insert_forecast_values(
+            db_session,
+            dict(forecast_meta, timestamp_utc=timestamp_utc),
+            pd.DataFrame(dict(forecast_values, horizon_minutes=other_expected)),
+        )
+
+        n_updated = backfill_horizon_minutes(db_session, batch_size=1)
+
+        assert n_updated == len(expected)
+        horizon_minutes = (
+            db_session.query(ForecastValueSQL.horizon_minutes)
+            .filter(ForecastValueSQL.forecast_uuid == forecast_uuid)
+            .order_by(ForecastValueSQL.start_utc)
+            .all()
+        )
+        assert [h for (h,) in horizon_minutes] == expected
+        other_horizon_minutes = (
+            db_session.query(ForecastValueSQL.horizon_minutes)
+            .filter(ForecastValueSQL.forecast_uuid != forecast_uuid)
+            .order_by(ForecastValueSQL.start_utc)
+            .all()
+        )
+        assert [h for (h,) in other_horizon_minutes] == other_expected
+
+        # nothing left to backfill
+        assert backfill_horizon_minutes(db_session) == 0
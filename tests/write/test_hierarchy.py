@@ -0,0 +1,112 @@
+import sqlalchemy as sa
+
+from pvsite_datamodel.read.site import get_ancestor_locations, get_descendant_locations
+from pvsite_datamodel.sqlmodels import LocationClosureSQL, LocationType
+from pvsite_datamodel.write.hierarchy import rebuild_location_closure, verify_location_closure
+from pvsite_datamodel.write.user_and_site import (
+    add_child_location_to_parent_location,
+    delete_site,
+    make_fake_site,
+)
+
+
+def _make_hierarchy(db_session):
+    """Make a national region, with two regions under it, with sites under them.
+
+    Site 1 is in both regions.
+    """
+    national = make_fake_site(db_session, ml_id=None)
+    regions = [make_fake_site(db_session, ml_id=None) for _ in range(2)]
+    sites = [make_fake_site(db_session, ml_id=None) for _ in range(3)]
+    for location in [national, *regions]:
+        location.location_type = LocationType.region
+    db_session.commit()
+
+    for parent, child in [
+        (national, regions[0]),
+        (national, regions[1]),
+        (regions[0], sites[0]),
+        (regions[0], sites[1]),
+        (regions[1], sites[1]),
+        (regions[1], sites[2]),
+    ]:
+        add_child_location_to_parent_location(
+            session=db_session,
+            child_location_uuid=child.location_uuid,
+            parent_location_uuid=parent.location_uuid,
+        )
+
+    return national, regions, sites
+
+
+def _uuids(locations):
+    return [location.location_uuid for location in locations]
+
+
+def test_get_descendant_and_ancestor_locations(db_session):
+    national, regions, sites = _make_hierarchy(db_session)
+
+    descendants = get_descendant_locations(session=db_session, location_uuid=national.location_uuid)
+    assert set(_uuids(descendants[:2])) == set(_uuids(regions))
+    assert set(_uuids(descendants[2:])) == set(_uuids(sites))
+
+    descendants = get_descendant_locations(
+        session=db_session,
+        location_uuid=national.location_uuid,
+        location_type=LocationType.site,
+    )
+    assert set(_uuids(descendants)) == set(_uuids(sites))
+
+    descendants = get_descendant_locations(
+        session=db_session, location_uuid=national.location_uuid, max_depth=1
+    )
+    assert set(_uuids(descendants)) == set(_uuids(regions))
+
+    ancestors = get_ancestor_locations(session=db_session, location_uuid=sites[1].location_uuid)
+    assert set(_uuids(ancestors[:2])) == set(_uuids(regions))
+    assert _uuids(ancestors[2:]) == [national.location_uuid]
+
+    ancestors = get_ancestor_locations(session=db_session, location_uuid=national.location_uuid)
+    assert ancestors == []
+
+    assert verify_location_closure(session=db_session) == {"missing": [], "extra": []}
+
+
+def test_location_closure_follows_removals(db_session):
+    national, regions, sites = _make_hierarchy(db_session)
+
+    # taking region 0 out of national leaves site 0 without a path to national
+    national.child_locations.remove(regions[0])
+    db_session.commit()
+    descendants = get_descendant_locations(
+        session=db_session,
+        location_uuid=national.location_uuid,
+        location_type=LocationType.site,
+    )
+    assert set(_uuids(descendants)) == {sites[1].location_uuid, sites[2].location_uuid}
+
+    # deleting region 1 removes its rows, and its sites from national
+    delete_site(session=db_session, site_uuid=regions[1].location_uuid)
+    assert get_descendant_locations(session=db_session, location_uuid=national.location_uuid) == []
+    ancestors = get_ancestor_locations(session=db_session, location_uuid=sites[1].location_uuid)
+    assert _uuids(ancestors) == [regions[0].location_uuid]
+
+    assert verify_location_closure(session=db_session) == {"missing": [], "extra": []}
+
+
+def test_rebuild_location_closure(db_session):
+    national, regions, sites = _make_hierarchy(db_session)
+
+    db_session.execute(
+        sa.delete(LocationClosureSQL).where(
+            LocationClosureSQL.ancestor_uuid == national.location_uuid
+        )
+    )
+    result = verify_location_closure(session=db_session)
+    assert len(result["missing"]) == 5
+    assert result["extra"] == []
+
+    n_rows = rebuild_location_closure(session=db_session)
+    # 2 national -> region, 3 national -> site and 4 region -> site
+    assert n_rows == 9
+    assert verify_location_closure(session=db_session) == {"missing": [], "extra": []}
@@ -0,0 +1,69 @@
+import logging
+from datetime import UTC, datetime
+
+import sqlalchemy as sa
+
+from pvsite_datamodel.read.user import get_api_requests_for_one_user, get_user_by_email
+from pvsite_datamodel.sqlmodels import APIRequestSQL
+from pvsite_datamodel.write import partitions
+from pvsite_datamodel.write.partitions import (
+    create_api_request_partitions,
+    drop_old_api_request_partitions,
+    get_api_request_partitions,
+)
+
+
+def _count(db_session, table):
+    return db_session.execute(sa.text(f"SELECT count(*) FROM {table}")).scalar()  # noqa: S608
+
+
+def test_api_request_partitions(db_session):
+    user = get_user_by_email(session=db_session, email="test@test.com")
+    now = datetime(2040, 11, 15, tzinfo=UTC)
+
+    # there is no partition for 2040 yet, so this goes in the default partition
+    db_session.add(APIRequestSQL(url="test", user=user, created_utc=datetime(2040, 12, 2)))
+    db_session.commit()
+    assert _count(db_session, "api_request_default") == 1
+
+    created = create_api_request_partitions(session=db_session, months_ahead=2, now=now)
+    assert created == ["api_request_y2040m11", "api_request_y2040m12", "api_request_y2041m01"]
+    assert create_api_request_partitions(session=db_session, months_ahead=2, now=now) == []
+
+    # the row was moved to its month
+    assert _count(db_session, "api_request_default") == 0
+    assert _count(db_session, "api_request_y2040m12") == 1
+    api_requests = get_api_requests_for_one_user(session=db_session, email="test@test.com")
+    assert [api_request.url for api_request in api_requests] == ["test"]
+
+    # keep 1 month before 2041-01, so 2040-11 is dropped
+    dropped = drop_old_api_request_partitions(
+        session=db_session,
+        retention_months=1,
+        now=datetime(2041, 1, 10, tzinfo=UTC),
+    )
+    assert "api_request_y2040m11" in dropped
+    assert "api_request_y2040m12" not in dropped
+    partitions = get_api_request_partitions(session=db_session)
+    assert list(partitions)[-2:] == ["api_request_y2040m12", "api_request_y2041m01"]
+    assert partitions["api_request_y2041m01"] == datetime(2041, 1, 1)
+    assert _count(db_session, "api_request") == 1
+
+
+def test_drop_old_api_request_partitions_counts_requests_without_time(
+    db_session, caplog, monkeypatch
+):
+    # the alembic logging config, run when the database is made, disables existing loggers
+    monkeypatch.setattr(partitions.logger, "disabled", False)
+    user = get_user_by_email(session=db_session, email="test@test.com")
+    # saved without a time, before api_request was partitioned
+    db_session.add(APIRequestSQL(url="no time", user=user, created_utc=datetime(1970, 1, 1)))
+    db_session.commit()
+    assert _count(db_session, "api_request_default") == 1
+
+    with caplog.at_level(logging.WARNING, logger=partitions.logger.name):
+        drop_old_api_request_partitions(session=db_session)
+
+    assert _count(db_session, "api_request_default") == 0
+    assert "Deleted 1 API requests" in caplog.text
+    assert "1 of which were saved without a time" in caplog.text
@@ -1,16 +1,23 @@
+import datetime as dt
+import json
 import uuid
 
+import pandas as pd
 import pytest
+import sqlalchemy as sa
 
 from pvsite_datamodel.pydantic_models import PVSiteEditMetadata
 from pvsite_datamodel.read.user import get_user_by_email
-from pvsite_datamodel.sqlmodels import LocationHistorySQL
+from pvsite_datamodel.sqlmodels import LocationHistorySQL, LocationSQL
 from pvsite_datamodel.write.user_and_site import (
     add_child_location_to_parent_location,
     add_site_to_site_group,
+    advance_ml_id_sequence,
+    allocate_ml_ids,
     assign_model_name_to_site,
     create_site,
     create_site_group,
+    create_sites_bulk,
     edit_site,
     make_fake_site,
     remove_site_from_site_group,
@@ -30,7 +37,7 @@ def test_create_new_site(db_session):
     )
 
     assert site.client_location_name == "test_site_name"
-    assert site.ml_id == 1
+    assert site.ml_id is not None
     assert site.client_location_id == 6932
     assert site.country == "uk"
     assert (
@@ -230,8 +237,8 @@ def test_create_new_site_twice(db_session):
         capacity_kw=1.0,
     )
 
-    assert site_1.ml_id == 1
-    assert site_2.ml_id == 2
+    # ml ids come from a sequence, so only the increment is known
+    assert site_2.ml_id == site_1.ml_id + 1
 
 
 def test_create_new_site_with_invalid_asset_type(db_session):
@@ -376,3 +383,117 @@ def test_add_multiple_child_location_to_parent_location(db_session):
     assert len(location_parent_1.parent_locations) == 0
     assert len(location_parent_2.child_locations) == 1
     assert len(location_parent_2.parent_locations) == 0
+
+
+def test_create_sites_bulk(db_session):
+    site_group = create_site_group(db_session=db_session)
+
+    sites_df = pd.DataFrame(
+        {
+            "client_site_id": [1, 2, 3],
+            "client_site_name": ["site_1", "site_2", "site_3"],
+            "latitude": [51.5, 55.0, 52.2],
+            "longitude": [-0.1, -3.0, 0.1],
+            "capacity_kw": [1.0, 2.0, 3.0],
+            "gsp": ['{"gsp_id": "1", "name": "test"}'] * 3,
+            "tilt": [20, None, None],
+        },
+    )
+
+    sites_df, message = create_sites_bulk(
+        session=db_session,
+        sites_df=sites_df,
+        site_group_name=site_group.location_group_name,
+    )
+
+    assert message == "3 sites created successfully"
+    ml_ids = list(sites_df["ml_id"])
+    assert ml_ids == list(range(ml_ids[0], ml_ids[0] + 3))
+
+    sites = (
+        db_session.query(LocationSQL)
+        .filter(LocationSQL.location_uuid.in_(sites_df["location_uuid"]))
+        .order_by(LocationSQL.ml_id)
+        .all()
+    )
+    assert [site.client_location_name for site in sites] == ["site_1", "site_2", "site_3"]
+    assert [site.tilt for site in sites] == [20, 35, 35]
+    assert sites[1].inverter_capacity_kw == 2.0
+    assert sites[1].country == "uk"
+    assert json.loads(sites[0].dno)["dno_id"] == "12"
+    assert len(site_group.locations) == 3
+
+
+def test_create_sites_bulk_ignores_generated_columns(db_session):
+    # e.g. a dataframe of sites read back from the database
+    sites_df = pd.DataFrame(
+        {
+            "client_site_id": [1],
+            "client_site_name": ["site_1"],
+            "latitude": [51.5],
+            "longitude": [-0.1],
+            "capacity_kw": [1.0],
+            "gsp": ['{"gsp_id": "1", "name": "test"}'],
+            "dno_id": [99],
+            "gsp_id": [99],
+            "created_utc": [dt.datetime(2000, 1, 1)],
+        },
+    )
+
+    sites_df, _ = create_sites_bulk(session=db_session, sites_df=sites_df)
+
+    site = db_session.get(LocationSQL, sites_df["location_uuid"][0])
+    assert site.gsp_id == 1
+    assert site.dno_id == 12
+    assert site.created_utc.year > 2000
+
+
+def test_create_sites_bulk_invalid(db_session):
+    sites_df = pd.DataFrame(
+        {
+            "client_site_id": [1, 2],
+            "client_site_name": ["site_1", "site_2"],
+            "latitude": [51.5, 100],
+            "longitude": [-0.1, -3.0],
+            "capacity_kw": [1.0, 2.0],
+        },
+    )
+
+    with pytest.raises(ValueError, match=r"Invalid sites in rows \[1\]"):
+        create_sites_bulk(session=db_session, sites_df=sites_df)
+
+
+def test_allocate_ml_ids(db_session):
+    ml_ids = allocate_ml_ids(session=db_session, n=3)
+    assert len(set(ml_ids)) == 3
+
+    # ids are never handed out twice
+    assert len(set(ml_ids) & set(allocate_ml_ids(session=db_session, n=3))) == 0
+
+
+def test_explicit_ml_id_advances_sequence(db_session):
+    ml_id = allocate_ml_ids(session=db_session, n=1)[0] + 10
+    site = make_fake_site(db_session=db_session, ml_id=ml_id)
+
+    # the sequence doesn't hand out the explicit id again
+    assert min(allocate_ml_ids(session=db_session, n=20)) > site.ml_id
+
+    # an id below the sequence leaves it where it is
+    next_ml_id = allocate_ml_ids(session=db_session, n=1)[0]
+    advance_ml_id_sequence(session=db_session, ml_id=1)
+    assert allocate_ml_ids(session=db_session, n=1)[0] <= next_ml_id + 2
+
+
+def test_ml_id_server_default(db_session):
+    # inserts that don't go through the models get an ml_id from the sequence too
+    location_uuid = uuid.uuid4()
+    db_session.execute(
+        sa.text(
+            "INSERT INTO locations (location_uuid, client_location_id, client_location_name, "
+            "latitude, longitude, capacity_kw, asset_type, location_type, created_utc) "
+            "VALUES (:location_uuid, 1, 'server default', 51, 0, 1, 'pv', 'site', now())"
+        ),
+        {"location_uuid": location_uuid},
+    )
+    site = db_session.get(LocationSQL, location_uuid)
+    assert site.ml_id is not None